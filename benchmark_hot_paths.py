@@ -0,0 +1,331 @@
+"""
+Scaling benchmark for the ESL tools' hot paths.
+
+Times the screens and exports teachers use most against a database (usually
+one made by generate_synthetic_db.py). It reports latency percentiles and peak
+Python memory per path as JSON. Save the JSON for each commit and pass an older
+file to --compare to see regressions.
+
+Usage:
+    python benchmark_hot_paths.py --db synthetic.db --iterations 50 --output bench.json
+    python benchmark_hot_paths.py --db synthetic.db --compare bench_before.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from rich.console import Console
+
+import homework_master_v104 as homework_master
+from esl_teacher_cli_v1_22 import ESLTeacherCLI
+
+COUNTED_TABLES = [
+    "enrolled_students",
+    "lessons",
+    "blocks",
+    "lesson_records",
+    "block_records",
+]
+
+
+def percentile(sorted_values, pct):
+    """Return the pct-th percentile of an already sorted list (linear interpolation)."""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(timings_ms, peak_bytes):
+    """Build the result entry for one hot path."""
+    values = sorted(timings_ms)
+    return {
+        "calls": len(values),
+        "min_ms": round(values[0], 3),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p90_ms": round(percentile(values, 90), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "peak_memory_kib": round(peak_bytes / 1024, 1),
+    }
+
+
+def pick_samples(conn, count, rng):
+    """
+    Pick random (student, lesson record, block) selections to drive the benchmarks.
+
+    Random ids in the lesson_records id range are looked up one by one, so this
+    stays cheap on a large file.
+    """
+    low, high = conn.execute("SELECT MIN(id), MAX(id) FROM lesson_records").fetchone()
+    if low is None:
+        raise RuntimeError("The database has no lesson_records to benchmark against")
+
+    samples = []
+    attempts = 0
+    while len(samples) < count and attempts < count * 20:
+        attempts += 1
+        row = conn.execute(
+            """
+            SELECT lr.id AS lesson_record_id, lr.student_id, lr.lesson_id, l.unit_id,
+                   (SELECT b.id FROM blocks b WHERE b.lesson_id = lr.lesson_id
+                    ORDER BY b.block_number LIMIT 1) AS block_id
+            FROM lesson_records lr
+            JOIN lessons l ON lr.lesson_id = l.id
+            WHERE lr.id >= ?
+            ORDER BY lr.id
+            LIMIT 1
+            """,
+            (rng.randint(low, high),),
+        ).fetchone()
+        if row and row["block_id"] is not None:
+            samples.append(dict(row))
+    return samples
+
+
+def apply_selection(cli, conn, sample):
+    """Put the CLI in the state it would be in after selecting this sample."""
+    student = conn.execute(
+        """
+        SELECT es.*, c.name as course_name
+        FROM enrolled_students es
+        JOIN courses c ON es.course_id = c.id
+        WHERE es.id = ?
+        """,
+        (sample["student_id"],),
+    ).fetchone()
+    cli.current_student = dict(student)
+    cli.current_course = {"id": student["course_id"], "name": student["course_name"]}
+    cli.current_unit = dict(
+        conn.execute("SELECT * FROM units WHERE id = ?", (sample["unit_id"],)).fetchone()
+    )
+    cli.current_lesson = dict(
+        conn.execute("SELECT * FROM lessons WHERE id = ?", (sample["lesson_id"],)).fetchone()
+    )
+    cli.current_lesson_record = dict(
+        conn.execute(
+            "SELECT * FROM lesson_records WHERE id = ?", (sample["lesson_record_id"],)
+        ).fetchone()
+    )
+    cli.current_block = dict(
+        conn.execute("SELECT * FROM blocks WHERE id = ?", (sample["block_id"],)).fetchone()
+    )
+
+
+def load_homework_inputs(conn, sample):
+    """Load everything generate_homework needs for a sample."""
+    return (
+        homework_master.get_student_info(conn, sample["student_id"]),
+        homework_master.get_lesson_info(conn, sample["lesson_id"]),
+        homework_master.get_student_lesson_record(
+            conn, sample["student_id"], sample["lesson_id"]
+        ),
+    )
+
+
+def build_hot_paths(cli, conn):
+    """
+    Return (name, setup, call) triples for every benchmarked path.
+
+    setup(sample) runs untimed before each call and returns the call's arguments.
+    """
+    manager = cli.student_manager
+
+    def select(sample):
+        apply_selection(cli, conn, sample)
+        return ()
+
+    return [
+        ("ESLTeacherCLI.list_lessons", select, cli.list_lessons),
+        ("ESLTeacherCLI.list_blocks", select, cli.list_blocks),
+        ("ESLTeacherCLI.get_current_context", select, cli.get_current_context),
+        (
+            "StudentManager.get_student_progress",
+            lambda sample: (sample["student_id"],),
+            manager.get_student_progress,
+        ),
+        (
+            "StudentManager.list_available_courses",
+            lambda sample: (),
+            manager.list_available_courses,
+        ),
+        (
+            "homework_master.load_homework_inputs",
+            lambda sample: (conn, sample),
+            load_homework_inputs,
+        ),
+        (
+            "homework_master.generate_homework",
+            lambda sample: load_homework_inputs(conn, sample),
+            homework_master.generate_homework,
+        ),
+        (
+            "homework_master.export_student_records",
+            lambda sample: (conn, sample["student_id"]),
+            homework_master.export_student_records,
+        ),
+    ]
+
+
+def run_benchmarks(cli, conn, samples, iterations, memory_iterations):
+    """Time each hot path over the samples and measure its peak traced memory."""
+    results = {}
+    for name, setup, call in build_hot_paths(cli, conn):
+        # Warm-up call so one-off costs (statement compilation, imports) aren't timed
+        call(*setup(samples[0]))
+
+        timings = []
+        for i in range(iterations):
+            args = setup(samples[i % len(samples)])
+            start = time.perf_counter()
+            call(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        peak = 0
+        for i in range(memory_iterations):
+            args = setup(samples[i % len(samples)])
+            tracemalloc.start()
+            call(*args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        results[name] = summarize(timings, peak)
+        print(f"  {name:<42} p50 {results[name]['p50_ms']:>9.3f} ms", file=sys.stderr)
+    return results
+
+
+def git_commit():
+    """Return the current git commit hash, or None outside a git checkout."""
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print p50/p90 changes against a previous JSON report and return the regressed paths."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\n{'Hot path':<42} {'p50 before':>11} {'p50 after':>11} {'ratio':>7}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"{name:<42} {'-':>11} {current['p50_ms']:>11.3f} {'new':>7}")
+            continue
+        ratio = current["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("inf")
+        flag = " ⚠️" if ratio > threshold else ""
+        print(
+            f"{name:<42} {before['p50_ms']:>11.3f} {current['p50_ms']:>11.3f} {ratio:>7.2f}{flag}"
+        )
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ESL tools' hot paths")
+    parser.add_argument("--db", default="synthetic.db", help="Database to benchmark against")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed calls per path")
+    parser.add_argument(
+        "--memory-iterations", type=int, default=3, help="Calls per path traced for peak memory"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="p50 ratio above which --compare flags a regression",
+    )
+    args = parser.parse_args()
+
+    # Resolve paths before changing into the scratch directory
+    db_path = os.path.abspath(args.db)
+    output_path = os.path.abspath(args.output) if args.output else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    if not os.path.exists(db_path):
+        print(f"❌ Database file {db_path} does not exist!", file=sys.stderr)
+        sys.exit(1)
+
+    # Screens print through rich and exports write into reports/. Send both somewhere harmless.
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    quiet = Console(file=devnull)
+    workdir = tempfile.mkdtemp(prefix="esl_bench_")
+    os.chdir(workdir)
+
+    with contextlib.redirect_stdout(devnull):
+        cli = ESLTeacherCLI(db_path=db_path, prefetch=False)
+    cli.console = quiet
+    cli.clear_screen = lambda: None
+    cli.student_manager.console = quiet
+    homework_master.console = quiet
+    if not cli.connect_db():
+        sys.exit(1)
+    conn = cli.connection
+
+    rng = random.Random(args.seed)
+    samples = pick_samples(conn, max(args.iterations, args.memory_iterations), rng)
+
+    print(f"Benchmarking {db_path} ({args.iterations} iterations)", file=sys.stderr)
+    started = time.perf_counter()
+    results = run_benchmarks(cli, conn, samples, args.iterations, args.memory_iterations)
+
+    report = {
+        "meta": {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "database": db_path,
+            "row_counts": {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in COUNTED_TABLES
+            },
+            "iterations": args.iterations,
+            "python": sys.version.split()[0],
+            "sqlite": sqlite3.sqlite_version,
+            "total_seconds": round(time.perf_counter() - started, 2),
+            "curriculum_cache": cli.curriculum_cache.stats(),
+            "session_cache": cli.session_cache.stats(),
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"✅ Report written to {output_path}", file=sys.stderr)
+    else:
+        print(output)
+
+    if compare_path:
+        regressions = compare(results, compare_path, args.threshold)
+        if regressions:
+            sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
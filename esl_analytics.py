@@ -0,0 +1,406 @@
+"""
+Cohort analytics over lesson records, vectorized with NumPy.
+
+load_cohort() reads students, lessons and lesson records in three bulk
+queries, however many students there are. cohort_report() then computes,
+with array operations over all of them at once:
+
+- per student: score distribution (mean, median, quartiles, range), a
+  rolling average of the latest scores, the score trend per lesson and a
+  declining flag,
+- per course: score distribution and percentiles across its students,
+- per lesson: mean score, completion rate and a difficulty rating,
+- a whole-school summary.
+
+The report is plain dicts and lists, ready for json.dumps (see to_json).
+NumPy is optional: without it these functions raise AnalyticsUnavailable.
+
+Usage (prints the report as JSON):
+    python esl_analytics.py [db_path] [--course ID]
+"""
+
+import datetime
+import json
+import time
+
+DEFAULT_WINDOW = 3  # Scores in each rolling average
+DEFAULT_DECLINE_THRESHOLD = 5.0  # Points the latest window must drop to flag a decline
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# julianday('0001-01-01') is 1721425.5, the day date.fromordinal(1) returns
+_JULIAN_DAY_OFFSET = 1721424.5
+
+
+class AnalyticsUnavailable(Exception):
+    """Raised when NumPy, which the analytics need, is not installed."""
+
+
+def _numpy():
+    """Import NumPy on first use, so the rest of the tools work without it."""
+    try:
+        import numpy
+    except ImportError as e:
+        raise AnalyticsUnavailable(
+            "Cohort analytics need NumPy. Install it with: pip install numpy"
+        ) from e
+    return numpy
+
+
+def load_cohort(conn, course_id=None):
+    """
+    Read everything the report needs into NumPy arrays, in three queries.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        course_id (int, optional): Only this course's students and lessons.
+
+    Returns:
+        dict: Arrays and id/name lists, see cohort_report.
+    """
+    np = _numpy()
+    params = {"course_id": course_id}
+    students = conn.execute(
+        """
+        SELECT id, name, course_id FROM enrolled_students
+        WHERE :course_id IS NULL OR course_id = :course_id
+        ORDER BY id
+        """,
+        params,
+    ).fetchall()
+    lessons = conn.execute(
+        """
+        SELECT l.id, l.title, l.lesson_number, u.unit_number, u.course_id
+        FROM lessons l
+        JOIN units u ON u.id = l.unit_id
+        WHERE :course_id IS NULL OR u.course_id = :course_id
+        ORDER BY l.id
+        """,
+        params,
+    ).fetchall()
+    records = conn.execute(
+        """
+        SELECT lr.id, lr.student_id, lr.lesson_id,
+               CAST(NULLIF(lr.score, '') AS REAL) AS score,
+               julianday(NULLIF(lr.completion_date, '')) AS completion_day
+        FROM lesson_records lr
+        JOIN enrolled_students es ON es.id = lr.student_id
+        WHERE :course_id IS NULL OR es.course_id = :course_id
+        """,
+        params,
+    ).fetchall()
+
+    def column(rows, index, dtype):
+        # None becomes NaN in float columns
+        return np.array([row[index] for row in rows], dtype=dtype)
+
+    return {
+        "student_ids": column(students, 0, np.int64),
+        "student_names": [row[1] for row in students],
+        "student_courses": column(students, 2, np.int64),
+        "lesson_ids": column(lessons, 0, np.int64),
+        "lesson_titles": [row[1] for row in lessons],
+        "lesson_numbers": column(lessons, 2, np.int64),
+        "lesson_units": column(lessons, 3, np.int64),
+        "lesson_courses": column(lessons, 4, np.int64),
+        "record_ids": column(records, 0, np.int64),
+        "record_students": column(records, 1, np.int64),
+        "record_lessons": column(records, 2, np.int64),
+        "scores": column(records, 3, np.float64),
+        "completion_days": column(records, 4, np.float64),
+    }
+
+
+def _dense_index(np, ids, values):
+    """Positions of values in the sorted ids array, -1 where absent."""
+    if len(ids) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(ids, values), len(ids) - 1)
+    return np.where(ids[positions] == values, positions, -1)
+
+
+def _group_percentiles(np, groups, values, group_count, percentiles):
+    """
+    Percentiles of values per group, with numpy.percentile's interpolation.
+
+    NaN values and negative groups (not found) are ignored.
+
+    Returns:
+        numpy.ndarray: Shape (len(percentiles), group_count), NaN for empty groups.
+    """
+    keep = ~np.isnan(values) & (groups >= 0)
+    groups, values = groups[keep], values[keep]
+    order = np.lexsort((values, groups))
+    values = values[order]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full((len(percentiles), group_count), np.nan)
+    filled = counts > 0
+    for row, percentile in enumerate(percentiles):
+        position = starts[filled] + (counts[filled] - 1) * (percentile / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        fraction = position - low
+        result[row, filled] = values[low] * (1 - fraction) + values[high] * fraction
+    return result
+
+
+def _group_stats(np, groups, values, group_count):
+    """Count, mean, std, min and max of values per group, ignoring NaN and negative groups."""
+    keep = ~np.isnan(values) & (groups >= 0)
+    groups, values = groups[keep], values[keep]
+    count = np.bincount(groups, minlength=group_count).astype(np.float64)
+    total = np.bincount(groups, weights=values, minlength=group_count)
+    squares = np.bincount(groups, weights=values * values, minlength=group_count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0))
+    minimum = np.full(group_count, np.inf)
+    maximum = np.full(group_count, -np.inf)
+    np.minimum.at(minimum, groups, values)
+    np.maximum.at(maximum, groups, values)
+    minimum[count == 0] = np.nan
+    maximum[count == 0] = np.nan
+    return count.astype(np.int64), mean, std, minimum, maximum
+
+
+def _trends(np, groups, order_keys, values, group_count, window, decline_threshold):
+    """
+    Rolling averages and trend of each group's values in time order.
+
+    Returns:
+        tuple: (latest rolling average, the window before it, slope per
+            step by least squares, declining flags), one entry per group.
+    """
+    order = np.lexsort(order_keys + (groups,))
+    groups, values = groups[order], values[order]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rows = np.arange(len(values))
+    steps = (rows - starts[groups]).astype(np.float64)
+
+    # Mean of the last `window` values ending at each row, within its group
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    first = np.maximum(rows - window + 1, starts[groups])
+    rolling = (sums[rows + 1] - sums[first]) / (rows + 1 - first)
+
+    latest = np.full(group_count, np.nan)
+    previous = np.full(group_count, np.nan)
+    has_values = counts > 0
+    last_rows = starts + counts - 1
+    latest[has_values] = rolling[last_rows[has_values]]
+    two_windows = counts >= 2 * window
+    previous[two_windows] = rolling[last_rows[two_windows] - window]
+
+    n = counts.astype(np.float64)
+    sum_x = np.bincount(groups, weights=steps, minlength=group_count)
+    sum_y = np.bincount(groups, weights=values, minlength=group_count)
+    sum_xy = np.bincount(groups, weights=steps * values, minlength=group_count)
+    sum_xx = np.bincount(groups, weights=steps * steps, minlength=group_count)
+    denominator = n * sum_xx - sum_x * sum_x
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(denominator > 0, (n * sum_xy - sum_x * sum_y) / denominator, np.nan)
+
+    declining = two_windows & (latest < previous - decline_threshold)
+    return latest, previous, slope, declining
+
+
+def _number(value, digits=1):
+    """A float for JSON, or None for NaN."""
+    value = float(value)
+    return None if value != value else round(value, digits)
+
+
+def _date(julian_day):
+    """ISO date for a SQLite julianday value, or None for NaN."""
+    if julian_day != julian_day:
+        return None
+    return datetime.date.fromordinal(int(julian_day - _JULIAN_DAY_OFFSET)).isoformat()
+
+
+def cohort_report(
+    conn,
+    course_id=None,
+    window=DEFAULT_WINDOW,
+    decline_threshold=DEFAULT_DECLINE_THRESHOLD,
+):
+    """
+    Compute the cohort analytics report.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        course_id (int, optional): Only this course.
+        window (int, optional): Scores in each rolling average.
+        decline_threshold (float, optional): A student is flagged as declining
+            when the average of their latest `window` scores is this many
+            points below the `window` before.
+
+    Returns:
+        dict: "summary", "courses", "students" and "lessons", JSON-ready.
+
+    Raises:
+        AnalyticsUnavailable: If NumPy is not installed.
+    """
+    np = _numpy()
+    started = time.perf_counter()
+    data = load_cohort(conn, course_id)
+    loaded = time.perf_counter()
+
+    student_ids = data["student_ids"]
+    student_count = len(student_ids)
+    lesson_count = len(data["lesson_ids"])
+    scores = data["scores"]
+    days = data["completion_days"]
+    completed = ~np.isnan(days)
+    # load_cohort only returns records of the loaded students, so every
+    # record has a student; a lesson may be outside a course filter (-1)
+    student_of = _dense_index(np, student_ids, data["record_students"])
+    lesson_of = _dense_index(np, data["lesson_ids"], data["record_lessons"])
+    in_lessons = lesson_of >= 0
+
+    # Students
+    records_per_student = np.bincount(student_of, minlength=student_count)
+    completed_per_student = np.bincount(student_of[completed], minlength=student_count)
+    scored, mean, std, low, high = _group_stats(np, student_of, scores, student_count)
+    quartiles = _group_percentiles(np, student_of, scores, student_count, (25, 50, 75))
+    last_day = np.full(student_count, -np.inf)
+    np.maximum.at(last_day, student_of[completed], days[completed])
+    last_day[np.isinf(last_day)] = np.nan
+    timed = completed & ~np.isnan(scores)
+    latest, previous, slope, declining = _trends(
+        np,
+        student_of[timed],
+        (data["record_ids"][timed], days[timed]),
+        scores[timed],
+        student_count,
+        window,
+        decline_threshold,
+    )
+    mean_rank = np.where(np.isnan(mean), -1, mean)
+
+    students = [
+        {
+            "student_id": int(student_ids[i]),
+            "name": data["student_names"][i],
+            "course_id": int(data["student_courses"][i]),
+            "lessons_recorded": int(records_per_student[i]),
+            "lessons_completed": int(completed_per_student[i]),
+            "scored_lessons": int(scored[i]),
+            "mean_score": _number(mean[i]),
+            "median_score": _number(quartiles[1, i]),
+            "score_p25": _number(quartiles[0, i]),
+            "score_p75": _number(quartiles[2, i]),
+            "score_std": _number(std[i]),
+            "min_score": _number(low[i]),
+            "max_score": _number(high[i]),
+            "rolling_average": _number(latest[i]),
+            "previous_rolling_average": _number(previous[i]),
+            "trend_per_lesson": _number(slope[i], 2),
+            "declining": bool(declining[i]),
+            "last_activity": _date(last_day[i]),
+        }
+        for i in np.argsort(-mean_rank, kind="stable")
+    ]
+
+    # Courses, grouped by the course the student is enrolled in
+    course_ids, course_of_student = np.unique(data["student_courses"], return_inverse=True)
+    course_count = len(course_ids)
+    course_of_record = course_of_student[student_of]
+    students_per_course = np.bincount(course_of_student, minlength=course_count)
+    _, course_mean, course_std, _, _ = _group_stats(np, course_of_record, scores, course_count)
+    course_percentiles = _group_percentiles(
+        np, course_of_record, scores, course_count, PERCENTILES
+    )
+    course_mean_student = _group_stats(np, course_of_student, mean, course_count)[1]
+    declining_per_course = np.bincount(
+        course_of_student, weights=declining, minlength=course_count
+    )
+    completed_per_course = np.bincount(course_of_record[completed], minlength=course_count)
+    courses = [
+        {
+            "course_id": int(course_ids[c]),
+            "students": int(students_per_course[c]),
+            "lessons_completed": int(completed_per_course[c]),
+            "mean_score": _number(course_mean[c]),
+            "score_std": _number(course_std[c]),
+            "mean_of_student_means": _number(course_mean_student[c]),
+            "percentiles": {
+                str(p): _number(course_percentiles[row, c])
+                for row, p in enumerate(PERCENTILES)
+            },
+            "declining_students": int(declining_per_course[c]),
+        }
+        for c in range(course_count)
+    ]
+
+    # Lessons: difficulty from mean score and completion rate among the course's students
+    records_per_lesson = np.bincount(lesson_of[in_lessons], minlength=lesson_count)
+    completed_per_lesson = np.bincount(
+        lesson_of[completed & in_lessons], minlength=lesson_count
+    )
+    _, lesson_mean, _, _, _ = _group_stats(np, lesson_of, scores, lesson_count)
+    enrolled = np.zeros(lesson_count)
+    if course_count:
+        lesson_course_index = _dense_index(np, course_ids, data["lesson_courses"])
+        known = lesson_course_index >= 0
+        enrolled[known] = students_per_course[lesson_course_index[known]]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        completion_rate = np.where(enrolled > 0, completed_per_lesson / enrolled, np.nan)
+    # 0 (everyone completes it with full marks) to 1 (nobody completes it, or scores 0)
+    difficulty = 0.5 * (1 - lesson_mean / 100) + 0.5 * (1 - completion_rate)
+    difficulty_rank = np.where(np.isnan(difficulty), -1, difficulty)
+    lessons = [
+        {
+            "lesson_id": int(data["lesson_ids"][i]),
+            "title": data["lesson_titles"][i],
+            "course_id": int(data["lesson_courses"][i]),
+            "unit_number": int(data["lesson_units"][i]),
+            "lesson_number": int(data["lesson_numbers"][i]),
+            "records": int(records_per_lesson[i]),
+            "completed": int(completed_per_lesson[i]),
+            "completion_rate": _number(completion_rate[i], 3),
+            "mean_score": _number(lesson_mean[i]),
+            "difficulty": _number(difficulty[i], 3),
+        }
+        for i in np.argsort(-difficulty_rank, kind="stable")
+    ]
+
+    school_percentiles = (
+        np.nanpercentile(scores, PERCENTILES)
+        if np.any(~np.isnan(scores))
+        else [np.nan] * len(PERCENTILES)
+    )
+    finished = time.perf_counter()
+    summary = {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "course_id": course_id,
+        "students": student_count,
+        "lesson_records": int(len(scores)),
+        "lessons_completed": int(completed.sum()),
+        "mean_score": _number(np.nanmean(scores)) if np.any(~np.isnan(scores)) else None,
+        "percentiles": {
+            str(p): _number(value) for p, value in zip(PERCENTILES, school_percentiles)
+        },
+        "declining_students": int(declining.sum()),
+        "window": window,
+        "decline_threshold": decline_threshold,
+        "load_ms": round((loaded - started) * 1000, 2),
+        "compute_ms": round((finished - loaded) * 1000, 2),
+    }
+    return {"summary": summary, "courses": courses, "students": students, "lessons": lessons}
+
+
+def to_json(report, indent=2):
+    """Serialize a cohort_report() result."""
+    return json.dumps(report, indent=indent, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from esl_db import DEFAULT_DB_PATH, get_connection
+
+    parser = argparse.ArgumentParser(description="Print cohort analytics as JSON")
+    parser.add_argument("db_path", nargs="?", default=DEFAULT_DB_PATH)
+    parser.add_argument("--course", type=int, help="Only this course")
+    args = parser.parse_args()
+    print(to_json(cohort_report(get_connection(args.db_path), course_id=args.course)))
@@ -0,0 +1,272 @@
+"""
+In-process caches for the ESL tools.
+
+RowCache is a read-through LRU cache for a fixed set of tables. Entries are
+keyed by (entity, key). The cache drops everything when:
+
+- PRAGMA data_version shows another connection committed a change, or
+- a local write touches one of its tables (reported through note_write()).
+
+data_version is read at most once per check_interval per connection, so
+lookups and writes normally cost no extra statement.
+
+CurriculumCache covers the curriculum tables (courses, units, lessons, blocks,
+vocabulary, grammar rules, resources), which hardly change during a teaching
+session. SessionCache covers the student's lesson and block records, which do
+change during class, so it also notices writes made on the same connection
+(from its total_changes, without a query). A caller that knows exactly which
+entry its write changed can apply it with write_through() instead of
+invalidating.
+
+Each Database in esl_db owns one of each, so every component using the same
+file shares them.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+CURRICULUM_TABLES = frozenset(
+    [
+        "courses",
+        "units",
+        "lessons",
+        "blocks",
+        "vocabulary",
+        "grammar_rules",
+        "resources",
+        "assessments",
+    ]
+)
+
+SESSION_TABLES = frozenset(["lesson_records", "block_records"])
+
+_WRITE_TARGET = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+[\"`\[]?(\w+)",
+    re.IGNORECASE,
+)
+
+_MISSING = object()
+
+
+class RowCache:
+    """Bounded LRU cache of rows from the tables in `tables`, with data_version based invalidation."""
+
+    tables = frozenset()
+    # Also invalidate when the checking connection itself changed rows outside note_write()
+    track_own_changes = False
+
+    def __init__(self, max_entries=4096, check_interval=1.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int, optional): Entries kept before the least recently
+                used are evicted. Defaults to 4096.
+            check_interval (float, optional): Minimum seconds between
+                PRAGMA data_version checks on a connection. Defaults to 1.0.
+        """
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # id(conn) -> (data_version, total_changes seen, monotonic time data_version was read)
+        self._versions = {}
+        self._generation = 0  # Bumped by invalidate()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, conn, entity, key, loader):
+        """
+        Return the cached value for (entity, key), calling loader() on a miss.
+
+        Cached values are shared between callers; treat them as read-only.
+
+        Args:
+            conn (sqlite3.Connection): Connection used to check data_version.
+            entity (str): Entity name, e.g. "lessons" or "lesson_info".
+            key: Hashable key within the entity, usually an id.
+            loader (callable): Called with no arguments to load the value on a miss.
+        """
+        self._check_data_version(conn)
+        cache_key = (entity, key)
+        with self._lock:
+            value = self._entries.get(cache_key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while loading (e.g. by a write on another thread)
+                return value
+            self._entries[cache_key] = value
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def row(self, conn, table, row_id):
+        """Return one row as a dict (or None), by primary key."""
+        self._require_table(table)
+
+        def load():
+            row = conn.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone()
+            return dict(row) if row else None
+
+        return self.get(conn, table, row_id, load)
+
+    def rows(self, conn, table, parent_column, parent_id, order_by="id"):
+        """Return the rows whose parent_column equals parent_id, as a tuple of dicts."""
+        self._require_table(table)
+
+        def load():
+            return tuple(
+                dict(row)
+                for row in conn.execute(
+                    f"SELECT * FROM {table} WHERE {parent_column} = ? ORDER BY {order_by}",
+                    (parent_id,),
+                )
+            )
+
+        return self.get(conn, table, (parent_column, parent_id, order_by), load)
+
+    def note_write(self, query, conn=None):
+        """
+        Invalidate the cache if the SQL statement writes to one of its tables.
+
+        Pass the connection that ran the statement, and the write is treated as
+        handled: a later check on that connection won't invalidate again for it.
+        """
+        match = _WRITE_TARGET.match(query)
+        if match and match.group(1).lower() in self.tables:
+            self.invalidate()
+        if conn is not None and id(conn) in self._versions:
+            # A commit on conn doesn't change its own data_version, so there is
+            # nothing to read; commits by other connections are still picked
+            # up by the next timed data_version check
+            data_version, _, checked_at = self._versions[id(conn)]
+            self._versions[id(conn)] = (data_version, self._changes_of(conn), checked_at)
+
+    def write_through(self, conn, entity, key, update):
+        """
+        Apply a write just committed on conn to one cached entry, instead of invalidating.
+
+        Only correct when no other cached entry depends on the rows written.
+        Commits by other connections still invalidate the whole cache at the
+        next data_version check, as usual.
+
+        Args:
+            conn (sqlite3.Connection): Connection that ran and committed the write.
+            entity (str): Entity of the entry, e.g. "block_records".
+            key: Key of the entry.
+            update (callable): update(value) returns the new value. It is
+                called with None if the entry isn't cached, and returning
+                None leaves the entry uncached.
+        """
+        cache_key = (entity, key)
+        with self._lock:
+            value = update(self._entries.get(cache_key))
+            if value is None:
+                self._entries.pop(cache_key, None)
+            else:
+                self._entries[cache_key] = value
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            # A load that started before the write must not store its older copy
+            self._generation += 1
+        self.note_write("", conn)
+
+    def invalidate(self):
+        """Drop every cached entry."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _check_data_version(self, conn):
+        """
+        Invalidate if conn changed rows outside note_write(), or another connection committed.
+
+        The first is an attribute read on every call; PRAGMA data_version is
+        only read once check_interval has passed since the last time.
+        """
+        now = time.monotonic()
+        changes = self._changes_of(conn)
+        previous = self._versions.get(id(conn))
+        if previous is None:
+            self._versions[id(conn)] = (self._data_version_of(conn), changes, now)
+            return
+        data_version, seen_changes, checked_at = previous
+        stale = changes != seen_changes
+        if now - checked_at >= self.check_interval:
+            current = self._data_version_of(conn)
+            stale = stale or current != data_version
+            data_version, checked_at = current, now
+        self._versions[id(conn)] = (data_version, changes, checked_at)
+        if stale:
+            self.invalidate()
+
+    def _changes_of(self, conn):
+        """Rows changed through conn so far, or 0 unless own changes are tracked."""
+        return conn.total_changes if self.track_own_changes else 0
+
+    @staticmethod
+    def _data_version_of(conn):
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def forget_connection(self, conn):
+        """Drop bookkeeping for a connection that is being closed."""
+        self._versions.pop(id(conn), None)
+
+    def _require_table(self, table):
+        if table not in self.tables:
+            raise ValueError(f"{table} is not cached by {type(self).__name__}")
+
+
+class CurriculumCache(RowCache):
+    """Cache of curriculum rows, checked for outside changes at most once a second."""
+
+    tables = CURRICULUM_TABLES
+
+
+class SessionCache(RowCache):
+    """
+    Cache of lesson and block records for the screens of the lesson being taught.
+
+    Every lookup compares the connection's total_changes, so writes on the
+    same connection (including StudentManager's, which shares it) are seen at
+    once without a query. Commits from other connections or processes are
+    seen within check_interval, like CurriculumCache.
+    """
+
+    tables = SESSION_TABLES
+    track_own_changes = True
+
+    def __init__(self, max_entries=256, check_interval=1.0):
+        super().__init__(max_entries=max_entries, check_interval=check_interval)
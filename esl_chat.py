@@ -0,0 +1,284 @@
+"""
+Bounded, compacting chat history for the Gemini assistant.
+
+ChatHistory replaces the SDK's chat object, whose history grows without limit
+and is re-sent in full on every message. Each request is built from:
+
+- the context preamble (from ESLTeacherCLI.get_current_context),
+- a rolling summary of older turns,
+- the last keep_turns turns verbatim,
+- the new message.
+
+Once more than keep_turns + fold_batch turns have piled up, or the request
+would exceed token_budget, the oldest turns are folded into the summary. The
+request size therefore stays roughly constant however long the session runs.
+
+Sessions are stored in chat_sessions and chat_turns (migration 5 in
+esl_migrations). A resumed session starts from its summary and recent turns;
+nothing is replayed.
+"""
+
+import sqlite3
+import logging
+
+from esl_gemini import GeminiStream, generate_text
+
+DEFAULT_TOKEN_BUDGET = 6000
+DEFAULT_KEEP_TURNS = 6
+DEFAULT_FOLD_BATCH = 3
+
+SUMMARY_PROMPT = """
+Summarize this conversation between an ESL teacher and their teaching assistant.
+Keep decisions, student-specific details, materials mentioned and open questions.
+Write at most {max_words} words of plain text.
+
+Earlier summary:
+{summary}
+
+New exchanges:
+{exchanges}
+"""
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), without an API call."""
+    return len(text) // 4 + 1
+
+
+def extractive_summary(summary, turns, max_chars=2000):
+    """
+    Summarize without a model: keep the opening of each question and answer.
+
+    Used when no summarizer is configured or the model call fails.
+    """
+    lines = [summary] if summary else []
+    for user_text, model_text in turns:
+        lines.append(f"- Teacher asked: {user_text.strip()[:160]}")
+        lines.append(f"  Assistant: {model_text.strip()[:240]}")
+    text = "\n".join(lines)
+    # Keep the newest material when trimming
+    return text[-max_chars:]
+
+
+def model_summarizer(model, cache=None, max_words=200):
+    """Return a summarizer that asks the model to fold turns into the summary."""
+
+    def summarize(summary, turns):
+        exchanges = "\n\n".join(
+            f"Teacher: {user_text}\nAssistant: {model_text}"
+            for user_text, model_text in turns
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=max_words,
+            summary=summary or "(none)",
+            exchanges=exchanges,
+        )
+        text, _ = generate_text(model, prompt, cache=cache)
+        return text.strip()
+
+    return summarize
+
+
+class ChatHistory:
+    """Token-bounded conversation state: preamble, rolling summary and recent turns."""
+
+    def __init__(
+        self,
+        preamble="",
+        keep_turns=DEFAULT_KEEP_TURNS,
+        token_budget=DEFAULT_TOKEN_BUDGET,
+        fold_batch=DEFAULT_FOLD_BATCH,
+        summarizer=None,
+    ):
+        """
+        Initialize the history.
+
+        Args:
+            preamble (str, optional): Context sent at the start of every request.
+            keep_turns (int, optional): Recent turns always sent verbatim.
+            token_budget (int, optional): Estimated tokens a request may use.
+            fold_batch (int, optional): Extra turns allowed to pile up before
+                folding. Folding several at once means fewer summarizer calls.
+            summarizer (callable, optional): summarizer(summary, turns) returns
+                the new summary. Defaults to extractive_summary.
+        """
+        self.preamble = preamble
+        self.keep_turns = max(1, keep_turns)
+        self.token_budget = token_budget
+        self.fold_batch = fold_batch
+        self.summarizer = summarizer
+        self.summary = ""
+        self.turns = []  # (user_text, model_text), oldest first
+        self.summarized_turns = 0  # Turns folded into the summary so far
+        self.session_id = None
+        self._saved_turns = 0  # Turns already written to chat_turns
+
+    @property
+    def total_turns(self):
+        return self.summarized_turns + len(self.turns)
+
+    def build_contents(self, message):
+        """Return the request for a new message, in Gemini's role/parts format."""
+        contents = []
+        opening = "\n\n".join(
+            part
+            for part in (
+                self.preamble,
+                f"Summary of our conversation so far:\n{self.summary}" if self.summary else "",
+            )
+            if part
+        )
+        if opening:
+            contents.append({"role": "user", "parts": [opening]})
+            contents.append({"role": "model", "parts": ["Understood."]})
+        for user_text, model_text in self.turns:
+            contents.append({"role": "user", "parts": [user_text]})
+            contents.append({"role": "model", "parts": [model_text]})
+        contents.append({"role": "user", "parts": [message]})
+        return contents
+
+    def request_tokens(self, message=""):
+        """Estimated tokens of the request build_contents(message) would produce."""
+        return sum(
+            estimate_tokens(part)
+            for content in self.build_contents(message)
+            for part in content["parts"]
+        )
+
+    def add_turn(self, user_text, model_text):
+        """Record a finished exchange, then compact if needed."""
+        self.turns.append((user_text, model_text))
+        self.compact()
+
+    def compact(self):
+        """Fold the oldest turns into the summary when over the turn or token limit."""
+        if len(self.turns) > self.keep_turns + self.fold_batch:
+            self._fold(len(self.turns) - self.keep_turns)
+        while self.request_tokens() > self.token_budget and len(self.turns) > 1:
+            self._fold(1)
+        if self.request_tokens() > self.token_budget and self.summary:
+            # A single huge turn can still overflow; trim the summary as a last resort
+            spare = self.token_budget - (self.request_tokens() - estimate_tokens(self.summary))
+            self.summary = self.summary[-max(0, spare * 4) :]
+
+    def _fold(self, count):
+        folded, self.turns = self.turns[:count], self.turns[count:]
+        summary = None
+        if self.summarizer:
+            try:
+                summary = self.summarizer(self.summary, folded)
+            except Exception as e:
+                logging.error(f"Chat summarizer failed, using extractive summary: {e}")
+        self.summary = summary or extractive_summary(self.summary, folded)
+        self.summarized_turns += count
+
+    def stream_reply(self, model, message):
+        """Stream the model's reply. The turn is recorded only if the stream finishes."""
+        contents = self.build_contents(message)
+        return GeminiStream(
+            lambda: model.generate_content(contents, stream=True),
+            on_complete=lambda text: self.add_turn(message, text),
+        )
+
+    def reply(self, model, message):
+        """Return the model's complete reply and record the turn."""
+        text = model.generate_content(self.build_contents(message)).text
+        self.add_turn(message, text)
+        return text
+
+
+def save_session(conn, history, student_id=None, lesson_id=None, title=None):
+    """
+    Write a session's summary and any turns not yet saved, in one transaction.
+
+    The first call creates the session row and sets history.session_id.
+    """
+    try:
+        with conn:
+            if history.session_id is None:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO chat_sessions (student_id, lesson_id, title, preamble)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (student_id, lesson_id, title, history.preamble),
+                )
+                history.session_id = cursor.lastrowid
+            conn.execute(
+                """
+                UPDATE chat_sessions
+                SET summary = ?, summarized_turns = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                """,
+                (history.summary, history.summarized_turns, history.session_id),
+            )
+            # Turns folded into the summary before they were saved are kept only there
+            first_position = max(history._saved_turns, history.summarized_turns)
+            offset = history.summarized_turns
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO chat_turns (session_id, position, user_text, model_text)
+                VALUES (?, ?, ?, ?)
+                """,
+                [
+                    (history.session_id, position, *history.turns[position - offset])
+                    for position in range(first_position, history.total_turns)
+                ],
+            )
+        history._saved_turns = history.total_turns
+    except sqlite3.Error as e:
+        logging.error(f"Error saving chat session: {e}")
+        raise
+
+
+def load_session(conn, session_id, **history_options):
+    """
+    Rebuild a ChatHistory from the database without replaying it.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        session_id (int): chat_sessions.id.
+        **history_options: Passed to ChatHistory (keep_turns, summarizer, ...).
+
+    Returns:
+        ChatHistory or None: The session, or None if it doesn't exist.
+    """
+    row = conn.execute(
+        "SELECT preamble, summary, summarized_turns FROM chat_sessions WHERE id = ?",
+        (session_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    history = ChatHistory(preamble=row["preamble"], **history_options)
+    history.session_id = session_id
+    history.summary = row["summary"]
+    history.summarized_turns = row["summarized_turns"]
+    history.turns = [
+        (turn["user_text"], turn["model_text"])
+        for turn in conn.execute(
+            """
+            SELECT user_text, model_text FROM chat_turns
+            WHERE session_id = ? AND position >= ?
+            ORDER BY position
+            """,
+            (session_id, row["summarized_turns"]),
+        )
+    ]
+    history._saved_turns = history.total_turns
+    return history
+
+
+def recent_sessions(conn, student_id=None, limit=5):
+    """Return the most recently used sessions, optionally for one student."""
+    rows = conn.execute(
+        """
+        SELECT cs.id, cs.title, cs.updated_at, cs.summarized_turns,
+               (SELECT COUNT(*) FROM chat_turns ct WHERE ct.session_id = cs.id) AS saved_turns
+        FROM chat_sessions cs
+        WHERE (:student_id IS NULL OR cs.student_id = :student_id)
+        ORDER BY cs.updated_at DESC, cs.id DESC
+        LIMIT :limit
+        """,
+        {"student_id": student_id, "limit": limit},
+    ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,201 @@
+"""
+Shared SQLite data-access layer for the ESL tools.
+
+ESLTeacherCLI, StudentManager and homework_master all get their connections
+from here. Each database file has one Database object per process, and that
+object keeps one tuned connection per thread. Components running on the same
+thread therefore share a single page cache and see each other's writes at once.
+Pending schema migrations (see esl_migrations) run when the first connection
+to a file is opened. Each Database also owns the shared CurriculumCache and
+SessionCache for its file (see esl_cache).
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+from esl_migrations import run_migrations
+from esl_cache import CurriculumCache, SessionCache
+
+DEFAULT_DB_PATH = "esl.db"
+
+# SQL for the current time in block_records.modified_at. Milliseconds, so the
+# optimistic modified_at checks notice two saves made within the same second.
+MODIFIED_AT_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# Pragmas applied to every new connection, in order.
+CONNECTION_PRAGMAS = (
+    ("journal_mode", "WAL"),  # Readers don't block the writer
+    ("synchronous", "NORMAL"),  # Safe with WAL, one fsync per checkpoint
+    ("cache_size", -65536),  # 64 MiB page cache (negative value = KiB)
+    ("mmap_size", 268435456),  # Map up to 256 MiB of the file
+    ("busy_timeout", 5000),  # Wait up to 5 s for a lock instead of failing
+    ("temp_store", "MEMORY"),
+)
+
+
+class Database:
+    """Owns connection setup for one SQLite file, with one connection per thread."""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        """
+        Initialize the Database for a given file.
+
+        Args:
+            db_path (str, optional): Path to the SQLite database. Defaults to "esl.db".
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._migrated = False
+        self._pid = os.getpid()
+        self.curriculum_cache = CurriculumCache()
+        self.session_cache = SessionCache()
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open_connection()
+            with self._lock:
+                if not self._migrated:
+                    # Bring the schema up to date once per process, before first use.
+                    # The connection is only kept once that worked, so a failed
+                    # migration is retried by the next call instead of skipped.
+                    try:
+                        run_migrations(conn)
+                    except BaseException:
+                        conn.close()
+                        raise
+                    self._migrated = True
+                self._connections[threading.get_ident()] = conn
+                _owners[id(conn)] = self
+            self._local.conn = conn
+        return conn
+
+    def cursor(self):
+        """
+        Return a cursor on this thread's connection, reused until the connection closes.
+
+        For classes that keep the old conn/cursor attribute style: each thread
+        gets its own cursor, so fetches on one thread never see another
+        thread's results.
+        """
+        conn = self.connection()
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None or cursor.connection is not conn:
+            cursor = conn.cursor()
+            self._local.cursor = cursor
+        return cursor
+
+    def _open_connection(self):
+        """Open a new connection with row access by name and tuned pragmas."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        for name, value in CONNECTION_PRAGMAS:
+            try:
+                conn.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.Error as e:
+                # A pragma the file or build doesn't support is not fatal
+                logging.error(f"Could not apply PRAGMA {name}: {e}")
+        return conn
+
+    def close(self):
+        """Close this thread's connection. The next call to connection() reopens it."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._forget(conn)
+            conn.close()
+            self._local.conn = None
+            self._local.cursor = None
+            with self._lock:
+                self._connections.pop(threading.get_ident(), None)
+
+    def close_all(self):
+        """Close every connection opened through this Database."""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            self._forget(conn)
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.error(f"Error closing connection: {e}")
+        self._local = threading.local()
+
+    def _reset_after_fork(self):
+        """
+        Drop connections inherited from the parent process.
+
+        SQLite connections must not be used across fork(), so a worker process
+        opens its own. The inherited ones are abandoned, not closed, because
+        closing them could disturb the parent's locks.
+        """
+        with self._lock:
+            for conn in self._connections.values():
+                _owners.pop(id(conn), None)
+            self._connections = {}
+            self._local = threading.local()
+            self._pid = os.getpid()
+            self.curriculum_cache = CurriculumCache()
+            self.session_cache = SessionCache()
+
+    def _forget(self, conn):
+        """Drop the bookkeeping kept for a connection that is about to close."""
+        _owners.pop(id(conn), None)
+        self.curriculum_cache.forget_connection(conn)
+        self.session_cache.forget_connection(conn)
+
+
+_databases = {}
+_owners = {}  # id(connection) -> Database that opened it
+_databases_lock = threading.Lock()
+
+
+def get_database(db_path=DEFAULT_DB_PATH):
+    """
+    Return the process-wide Database for a file, creating it on first use.
+
+    Args:
+        db_path (str, optional): Path to the SQLite database. Defaults to "esl.db".
+
+    Returns:
+        Database: The shared Database for that file.
+    """
+    key = os.path.abspath(db_path)
+    with _databases_lock:
+        database = _databases.get(key)
+        if database is None:
+            database = Database(db_path)
+            _databases[key] = database
+        return database
+
+
+def database_for(conn):
+    """
+    Return the Database that opened a connection, or None if it wasn't opened here.
+
+    Lets functions that are handed a bare connection (such as homework_master's)
+    reach the shared caches.
+    """
+    return _owners.get(id(conn))
+
+
+def curriculum_cache_for(conn):
+    """
+    Return the shared CurriculumCache for a connection's database file.
+
+    A connection not opened through this module gets a fresh, unshared cache,
+    so its rows never mix with another file's.
+    """
+    database = database_for(conn)
+    return database.curriculum_cache if database else CurriculumCache()
+
+
+def get_connection(db_path=DEFAULT_DB_PATH):
+    """Shortcut for get_database(db_path).connection()."""
+    return get_database(db_path).connection()
@@ -0,0 +1,528 @@
+"""
+Gemini helpers shared by the ESL tools.
+
+GeminiResponseCache keeps Gemini responses in the gemini_response_cache table
+(created by migration 4 in esl_migrations). The key is a SHA-256 hash of the
+model name, prompt and generation config, so an identical request is answered
+from disk instead of the API. Entries older than max_age_days, and the least
+recently used entries once the cache grows past max_bytes, are evicted.
+
+generate_text() is the single entry point the CLI uses for one-shot prompts.
+stream_text() returns a GeminiStream, which yields the response in chunks as
+they arrive and records time to first token and total latency.
+generate_many() runs many prompts concurrently, under a concurrency limit and a
+token-bucket rate limit, retrying failures with exponential backoff.
+
+create_model() returns the real Gemini model or, with the "stub" backend, a
+local StubModel that needs no API key or network. Use it for tests and demos.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from esl_db import database_for
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Set ESL_GEMINI_CACHE=0 to bypass the response cache without a command-line flag
+CACHE_ENV_VAR = "ESL_GEMINI_CACHE"
+
+# Set ESL_GEMINI_BACKEND=stub to use StubModel instead of the Gemini API
+BACKEND_ENV_VAR = "ESL_GEMINI_BACKEND"
+BACKENDS = ("gemini", "stub")
+
+# Defaults for generate_many: the free Gemini tier allows about 15 requests a minute
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 15
+DEFAULT_RETRIES = 3
+
+
+def model_name_of(model):
+    """Return a model's name without the "models/" prefix the SDK adds."""
+    name = getattr(model, "model_name", None) or str(model)
+    return name.split("/", 1)[-1]
+
+
+def response_cache_key(model_name, prompt, generation_config=None):
+    """
+    Return the content hash identifying a request.
+
+    Args:
+        model_name (str): Model name, e.g. "gemini-1.5-flash".
+        prompt (str): The full prompt text.
+        generation_config (dict, optional): Generation settings such as
+            temperature. Key order doesn't matter.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    payload = json.dumps(
+        [model_name, prompt, generation_config or {}],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GeminiResponseCache:
+    """Persistent cache of Gemini responses with size- and age-based eviction."""
+
+    def __init__(self, conn, max_bytes=50 * 1024 * 1024, max_age_days=90, enabled=True):
+        """
+        Initialize the cache.
+
+        Args:
+            conn (sqlite3.Connection): Connection to a migrated database. If it
+                was opened through esl_db, each thread uses its own connection
+                to the same file, so the cache works from background tasks.
+            max_bytes (int, optional): Total response size kept before the least
+                recently used entries are evicted. Defaults to 50 MiB.
+            max_age_days (float, optional): Entries older than this are evicted.
+                Defaults to 90.
+            enabled (bool, optional): False turns every lookup into a miss and
+                stores nothing. Defaults to True.
+        """
+        self._conn = conn
+        self._database = database_for(conn)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def conn(self):
+        """The calling thread's connection to the cache's database."""
+        if self._database is not None:
+            return self._database.connection()
+        return self._conn
+
+    def get(self, key):
+        """Return the cached response for a key, or None."""
+        if not self.enabled:
+            return None
+        try:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM gemini_response_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or self._expired(row["created_at"]):
+                self.misses += 1
+                return None
+            self.conn.execute(
+                """
+                UPDATE gemini_response_cache
+                SET last_used_at = ?, hits = hits + 1
+                WHERE key = ?
+                """,
+                (time.time(), key),
+            )
+            self.conn.commit()
+            self.hits += 1
+            return row["response"]
+        except sqlite3.Error as e:
+            # A broken cache must never stop the teacher from getting a response
+            logging.error(f"Gemini cache lookup failed: {e}")
+            return None
+
+    def put(self, key, model_name, response):
+        """Store a response, then evict whatever the limits no longer allow."""
+        if not self.enabled or not response:
+            return
+        now = time.time()
+        try:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO gemini_response_cache
+                    (key, model, response, size, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, model_name, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logging.error(f"Gemini cache store failed: {e}")
+
+    def clear(self):
+        """Delete every cached response."""
+        self.conn.execute("DELETE FROM gemini_response_cache")
+        self.conn.commit()
+
+    def stats(self):
+        """Return entry count, total size and this session's hit/miss counters."""
+        count, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM gemini_response_cache"
+        ).fetchone()
+        return {"entries": count, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def _expired(self, created_at):
+        return time.time() - created_at > self.max_age_days * 86400
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        self.conn.execute(
+            "DELETE FROM gemini_response_cache WHERE created_at < ?",
+            (now - self.max_age_days * 86400,),
+        )
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM gemini_response_cache"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used, collecting keys until enough bytes are freed
+        excess = total - self.max_bytes
+        doomed = []
+        for row in self.conn.execute(
+            "SELECT key, size FROM gemini_response_cache ORDER BY last_used_at"
+        ):
+            doomed.append((row["key"],))
+            excess -= row["size"]
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM gemini_response_cache WHERE key = ?", doomed)
+
+
+def generate_text(model, prompt, cache=None, generation_config=None):
+    """
+    Generate a response for a one-shot prompt, answering from the cache when possible.
+
+    Args:
+        model: A google.generativeai GenerativeModel, or anything with the same
+            generate_content() method and model_name attribute.
+        prompt (str): The prompt.
+        cache (GeminiResponseCache, optional): Response cache to consult and fill.
+        generation_config (dict, optional): Passed to generate_content and
+            included in the cache key.
+
+    Returns:
+        tuple[str, bool]: The response text, and whether it came from the cache.
+    """
+    model_name = model_name_of(model)
+    key = response_cache_key(model_name, prompt, generation_config)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached, True
+
+    if generation_config:
+        response = model.generate_content(prompt, generation_config=generation_config)
+    else:
+        response = model.generate_content(prompt)
+    text = response.text
+
+    if cache is not None:
+        cache.put(key, model_name, text)
+    return text, False
+
+
+class GeminiStream:
+    """
+    Iterable over the text chunks of a streamed response.
+
+    chunks is an iterable of response chunks (or strings), or a callable
+    returning one; a callable is only invoked when iteration starts.
+    Iterating it yields each chunk's text. Afterwards text holds everything
+    received, completed says whether the stream ran to the end, and
+    time_to_first_token and total_seconds hold the measured latencies. The
+    on_complete callback runs with the full text only if the stream finished.
+    """
+
+    def __init__(self, chunks, cached=False, on_complete=None):
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self.cached = cached
+        self.completed = False
+        self.cancelled = False
+        self.time_to_first_token = None
+        self.total_seconds = None
+        self._parts = []
+        self._started = time.perf_counter()
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def __iter__(self):
+        if callable(self._chunks):
+            # Deferred so the request itself also runs inside the caller's Ctrl-C handling
+            self._chunks = self._chunks()
+        for chunk in self._chunks:
+            piece = chunk if isinstance(chunk, str) else chunk.text
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - self._started
+            self._parts.append(piece)
+            yield piece
+        self.total_seconds = time.perf_counter() - self._started
+        self.completed = True
+        if self._on_complete:
+            self._on_complete(self.text)
+
+    def cancel(self):
+        """Stop the stream early, keeping what was received so far."""
+        if self.completed or self.cancelled:
+            return
+        self.cancelled = True
+        self.total_seconds = time.perf_counter() - self._started
+        close = getattr(self._chunks, "close", None)
+        if close:
+            close()
+
+    def timings(self):
+        """Return the latencies in milliseconds, for logging."""
+        return {
+            "time_to_first_token_ms": (
+                round(self.time_to_first_token * 1000, 1)
+                if self.time_to_first_token is not None
+                else None
+            ),
+            "total_ms": (
+                round(self.total_seconds * 1000, 1)
+                if self.total_seconds is not None
+                else None
+            ),
+            "cached": self.cached,
+            "completed": self.completed,
+        }
+
+
+def stream_text(model, prompt, cache=None, generation_config=None):
+    """
+    Stream a response for a one-shot prompt, answering from the cache when possible.
+
+    A cache hit comes back as a single chunk. A fresh response is stored in
+    the cache only if the stream runs to the end.
+
+    Returns:
+        GeminiStream: Iterate it to receive the text.
+    """
+    model_name = model_name_of(model)
+    key = response_cache_key(model_name, prompt, generation_config)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return GeminiStream(iter([cached]), cached=True)
+
+    kwargs = {"stream": True}
+    if generation_config:
+        kwargs["generation_config"] = generation_config
+    on_complete = (
+        (lambda text: cache.put(key, model_name, text)) if cache is not None else None
+    )
+    return GeminiStream(
+        lambda: model.generate_content(prompt, **kwargs), on_complete=on_complete
+    )
+
+
+class StubResponse:
+    """Response object returned by StubModel, with the same text attribute as Gemini's."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """
+    Local stand-in for a Gemini model.
+
+    Returns a deterministic response derived from the prompt, optionally after
+    a delay, so batch, caching and streaming code can be exercised offline.
+    With stream=True the response arrives word by word, spread over the delay.
+    """
+
+    def __init__(self, model_name="stub", delay=0.0):
+        self.model_name = model_name
+        self.delay = delay
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if not isinstance(prompt, str):
+            # A list of {"role", "parts"} messages: answer the last one
+            prompt = "\n".join(prompt[-1]["parts"]) if prompt else ""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        first_line = next((line.strip() for line in prompt.splitlines() if line.strip()), "")
+        text = f"[stub {digest}] Notes for: {first_line[:120]}"
+        if stream:
+            return self._stream(text)
+        if self.delay:
+            time.sleep(self.delay)
+        return StubResponse(text)
+
+    def _stream(self, text):
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                time.sleep(self.delay / len(words))
+            yield StubResponse(word if i == 0 else " " + word)
+
+
+def selected_backend(backend=None):
+    """Return the backend to use: the argument, else ESL_GEMINI_BACKEND, else "gemini"."""
+    backend = (backend or os.getenv(BACKEND_ENV_VAR) or "gemini").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown Gemini backend {backend!r}; choose from {BACKENDS}")
+    return backend
+
+
+def create_model(backend=None, model_name=DEFAULT_MODEL):
+    """
+    Return a model for the selected backend.
+
+    The Gemini backend needs genai.configure() to have been called with an API key.
+    """
+    if selected_backend(backend) == "stub":
+        return StubModel(delay=float(os.getenv("ESL_GEMINI_STUB_DELAY", "0")))
+    import google.generativeai as genai
+
+    return genai.GenerativeModel(model_name)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` calls per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _generate_with_retry(model, prompt, generation_config, bucket, retries, backoff):
+    """Call generate_content under the rate limit, retrying with exponential backoff."""
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            if generation_config:
+                response = model.generate_content(
+                    prompt, generation_config=generation_config
+                )
+            else:
+                response = model.generate_content(prompt)
+            return response.text
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2**attempt) * (0.5 + random.random())
+            logging.error(
+                f"Gemini request failed ({e}); retry {attempt + 1}/{retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+
+def generate_many(
+    model,
+    prompts,
+    cache=None,
+    generation_config=None,
+    max_concurrency=DEFAULT_CONCURRENCY,
+    requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+    retries=DEFAULT_RETRIES,
+    backoff=1.0,
+    progress=None,
+    cancelled=None,
+):
+    """
+    Generate responses for many prompts concurrently.
+
+    Cache lookups and stores happen on the calling thread; only cache misses
+    go to the worker threads. progress and cancelled are also only called on
+    the calling thread.
+
+    Args:
+        model: Model with generate_content() (see create_model).
+        prompts (dict): Maps a caller-chosen key to a prompt.
+        cache (GeminiResponseCache, optional): Response cache.
+        generation_config (dict, optional): Passed to every request.
+        max_concurrency (int, optional): Requests in flight at once.
+        requests_per_minute (float, optional): Rate limit across all threads.
+        retries (int, optional): Retries per prompt after the first failure.
+        backoff (float, optional): Base delay in seconds for retries.
+        progress (callable, optional): Called as progress(done, total) after
+            each prompt finishes.
+        cancelled (callable, optional): Checked after each prompt; once it
+            returns True, prompts not yet sent are dropped and get the error
+            "cancelled".
+
+    Returns:
+        dict: Maps each key to (text, cached, error). text is None if the
+        prompt failed after every retry; error then holds the message.
+    """
+    model_name = model_name_of(model)
+    results = {}
+    pending = {}
+    total = len(prompts)
+    done = 0
+
+    for key, prompt in prompts.items():
+        cache_key = response_cache_key(model_name, prompt, generation_config)
+        cached = cache.get(cache_key) if cache is not None else None
+        if cached is not None:
+            results[key] = (cached, True, None)
+            done += 1
+            if progress:
+                progress(done, total)
+        else:
+            pending[key] = (prompt, cache_key)
+
+    if not pending:
+        return results
+
+    bucket = TokenBucket(requests_per_minute / 60.0, capacity=max_concurrency)
+    stopping = False
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(
+                _generate_with_retry,
+                model,
+                prompt,
+                generation_config,
+                bucket,
+                retries,
+                backoff,
+            ): key
+            for key, (prompt, _) in pending.items()
+        }
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            key = futures[future]
+            try:
+                text = future.result()
+                results[key] = (text, False, None)
+                if cache is not None:
+                    cache.put(pending[key][1], model_name, text)
+            except Exception as e:
+                results[key] = (None, False, str(e))
+            done += 1
+            if progress:
+                progress(done, total)
+            if cancelled and cancelled() and not stopping:
+                # Requests already in flight finish; queued ones never start
+                stopping = True
+                for other in futures:
+                    if other.cancel():
+                        results[futures[other]] = (None, False, "cancelled")
+    return results
@@ -0,0 +1,353 @@
+"""
+Crash-safe write-behind journal for block note edits.
+
+Saving a note in class appends one line to a local JSON-lines file and
+returns; nothing waits on the database. The pending edits are written to
+block_records in one transaction at a time:
+
+- by a background thread every flush_interval seconds,
+- when the lesson is completed and when the CLI exits,
+- on the next start, for edits a crash left behind (replay).
+
+Each entry keeps the modified_at of the block record it was based on, so a
+flush never overwrites notes that were changed elsewhere in the meantime.
+Such edits are held back as conflicts until the teacher decides whether to
+overwrite or discard them; they stay in the journal, so nothing is lost.
+
+The journal lives on local disk (see default_journal_path), so saving stays
+fast when the database file is on a slow or network-mounted drive.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from esl_db import MODIFIED_AT_NOW
+
+DEFAULT_FLUSH_INTERVAL = 10.0
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".esl_teacher", "journal")
+
+NOTE_FIELDS = ("student_speech_notes", "teacher_notes", "student_questions")
+
+
+def default_journal_path(db_path):
+    """Local journal file for a database, unique per database path."""
+    digest = hashlib.sha1(os.path.abspath(db_path).encode("utf-8")).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(JOURNAL_DIR, f"{name}-{digest}.jsonl")
+
+
+class NoteJournal:
+    """Append-only log of note edits, flushed to block_records in batches."""
+
+    def __init__(self, path, database=None, flush_interval=DEFAULT_FLUSH_INTERVAL, fsync=True):
+        """
+        Initialize the journal. Call open() before use.
+
+        Args:
+            path (str): Journal file, created if missing.
+            database (esl_db.Database, optional): Used by the background
+                flusher, which gets its own connection. Without it, edits are
+                only flushed by explicit flush() calls.
+            flush_interval (float, optional): Seconds between background flushes.
+            fsync (bool, optional): Force each entry to disk before returning.
+                Defaults to True.
+        """
+        self.path = path
+        self.database = database
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.entries = []  # Not yet flushed, oldest first
+        self.conflicts = {}  # (lesson_record_id, block_id) -> merged fields held back
+        self._seq = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self):
+        """
+        Load entries left by an earlier run and open the file for appending.
+
+        Returns:
+            int: Number of entries waiting to be replayed.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; everything before it is intact
+                        logging.error(
+                            f"Skipping unreadable journal line {line_number} in {self.path}"
+                        )
+        with self._lock:
+            self.entries = entries
+            self._seq = max((entry["seq"] for entry in entries), default=0)
+            self._file = open(self.path, "a", encoding="utf-8")
+        return len(entries)
+
+    def start(self):
+        """Start the background flusher (needs a database)."""
+        if self.database is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="esl-notes-journal", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.flush_interval):
+                if self.has_pending():
+                    try:
+                        self.flush(self.database.connection())
+                    except sqlite3.Error as e:
+                        # The edits stay in the journal and are retried next time
+                        logging.error(f"Background flush of note edits failed: {e}")
+        finally:
+            self.database.close()
+
+    def close(self, conn=None):
+        """Stop the flusher, flush what is pending on conn if given, and close the file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if conn is not None and self.has_pending():
+            try:
+                self.flush(conn)
+            except sqlite3.Error as e:
+                logging.error(f"Flushing note edits on close failed: {e}")
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def record(self, lesson_record_id, block_id, fields, base_modified_at, existed):
+        """
+        Append an edit to the journal. Returns once it is safely on disk.
+
+        Args:
+            lesson_record_id (int): Lesson record of the block.
+            block_id (int): The block.
+            fields (dict): Note columns and their new text.
+            base_modified_at (str or None): modified_at of the block record the
+                edit was made on.
+            existed (bool): False if the block had no record yet.
+
+        Returns:
+            dict: The journal entry.
+        """
+        with self._lock:
+            key = (lesson_record_id, block_id)
+            earlier = next((e for e in self.entries if _key(e) == key), None)
+            if earlier is not None:
+                # Later edits of a block build on the version its first pending edit saw
+                base_modified_at, existed = earlier["base"], earlier["existed"]
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "lesson_record_id": lesson_record_id,
+                "block_id": block_id,
+                "fields": dict(fields),
+                "base": base_modified_at,
+                "existed": existed,
+                "at": time.time(),
+            }
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.entries.append(entry)
+        return entry
+
+    def has_pending(self):
+        """True if some edits haven't been written to the database yet."""
+        with self._lock:
+            return any(_key(entry) not in self.conflicts for entry in self.entries)
+
+    def pending_lesson_records(self):
+        """Return the ids of lesson records with edits still in the journal, conflicts included."""
+        with self._lock:
+            return {entry["lesson_record_id"] for entry in self.entries}
+
+    def pending_fields(self, lesson_record_id):
+        """Return {block_id: fields} of the unflushed edits of a lesson record."""
+        with self._lock:
+            merged = {}
+            for entry in self.entries:
+                if entry["lesson_record_id"] == lesson_record_id:
+                    merged.setdefault(entry["block_id"], {}).update(entry["fields"])
+            return merged
+
+    def overlay(self, lesson_record_id, records):
+        """
+        Return block records ({block_id: row}) with unflushed edits applied.
+
+        Blocks that only exist in the journal get a row with id and
+        modified_at None.
+        """
+        pending = self.pending_fields(lesson_record_id)
+        if not pending:
+            return records
+        records = dict(records)
+        for block_id, fields in pending.items():
+            row = records.get(block_id) or {
+                "id": None,
+                "lesson_record_id": lesson_record_id,
+                "block_id": block_id,
+                "modified_at": None,
+                **{name: None for name in NOTE_FIELDS},
+            }
+            records[block_id] = {**row, **fields}
+        return records
+
+    def flush(self, conn):
+        """
+        Write pending edits to block_records in one transaction.
+
+        Edits of a block are merged into one statement. A block whose record
+        no longer has the modified_at the edits were based on, or whose lesson
+        record has been deleted, is skipped and added to conflicts.
+
+        Args:
+            conn (sqlite3.Connection): Connection to write with.
+
+        Returns:
+            tuple: (blocks written, list of new conflict keys).
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = [e for e in self.entries if _key(e) not in self.conflicts]
+            if not batch:
+                return 0, []
+
+            groups = {}
+            for entry in batch:
+                group = groups.setdefault(
+                    _key(entry),
+                    {"fields": {}, "base": entry["base"], "existed": entry["existed"]},
+                )
+                group["fields"].update(entry["fields"])
+
+            written = {}  # key -> new modified_at
+            conflicts = []
+            with conn:
+                for key, group in groups.items():
+                    modified_at = _write_block(conn, key, group)
+                    if modified_at is None:
+                        conflicts.append(key)
+                    else:
+                        written[key] = modified_at
+
+            flushed = {entry["seq"] for entry in batch if _key(entry) in written}
+            with self._lock:
+                for key in conflicts:
+                    self.conflicts[key] = groups[key]["fields"]
+                remaining = []
+                for entry in self.entries:
+                    if entry["seq"] in flushed:
+                        continue
+                    if _key(entry) in written:
+                        # Saved while this flush ran; now based on the version just written
+                        entry["base"], entry["existed"] = written[_key(entry)], True
+                    remaining.append(entry)
+                self.entries = remaining
+                self._rewrite()
+            return len(written), conflicts
+
+    def resolve(self, key, overwrite, conn):
+        """
+        Settle a conflict: overwrite the record with the held-back edits, or drop them.
+
+        Args:
+            key (tuple): (lesson_record_id, block_id) from conflicts.
+            overwrite (bool): True to save the edits over the current record.
+            conn (sqlite3.Connection): Connection to write with.
+        """
+        if overwrite:
+            row = conn.execute(
+                "SELECT modified_at FROM block_records WHERE lesson_record_id = ? AND block_id = ?",
+                key,
+            ).fetchone()
+        with self._lock:
+            if overwrite:
+                for entry in self.entries:
+                    if _key(entry) == key:
+                        entry["base"] = row["modified_at"] if row else None
+                        entry["existed"] = row is not None
+            else:
+                self.entries = [e for e in self.entries if _key(e) != key]
+            self.conflicts.pop(key, None)
+            self._rewrite()
+        if overwrite:
+            self.flush(conn)
+
+    def _rewrite(self):
+        """Replace the file with the remaining entries. Caller holds _lock."""
+        if self._file is None:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+
+def _key(entry):
+    return entry["lesson_record_id"], entry["block_id"]
+
+
+def _write_block(conn, key, group):
+    """Apply one block's merged edits. Returns the new modified_at, or None on conflict."""
+    lesson_record_id, block_id = key
+    fields = {name: group["fields"][name] for name in NOTE_FIELDS if name in group["fields"]}
+    if group["existed"]:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        rows = conn.execute(
+            f"""
+            UPDATE block_records
+            SET {assignments}, modified_at = {MODIFIED_AT_NOW}
+            WHERE lesson_record_id = ? AND block_id = ? AND modified_at IS ?
+            RETURNING modified_at
+            """,
+            (*fields.values(), lesson_record_id, block_id, group["base"]),
+        ).fetchall()
+    else:
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        # Only while the lesson record exists; it may have been deleted since the edit
+        rows = conn.execute(
+            f"""
+            INSERT INTO block_records (lesson_record_id, block_id, {columns}, modified_at)
+            SELECT ?, ?, {placeholders}, {MODIFIED_AT_NOW}
+            WHERE EXISTS (SELECT 1 FROM lesson_records WHERE id = ?)
+            ON CONFLICT(lesson_record_id, block_id) DO NOTHING
+            RETURNING modified_at
+            """,
+            (lesson_record_id, block_id, *fields.values(), lesson_record_id),
+        ).fetchall()
+        if not rows and not conn.execute(
+            "SELECT 1 FROM lesson_records WHERE id = ?", (lesson_record_id,)
+        ).fetchone():
+            logging.error(
+                f"Lesson record {lesson_record_id} no longer exists; "
+                f"holding back the note edits of block {block_id}"
+            )
+    return rows[0][0] if rows else None
@@ -0,0 +1,111 @@
+"""
+Content-hash manifests for generated files.
+
+A Manifest remembers, per artifact, the hash of the input it was generated
+from and the file it was written to. A regeneration run hashes each
+artifact's input first and skips the ones whose hash and file are unchanged,
+so re-running "everything" only costs the artifacts whose data changed.
+
+The manifest is a JSON file inside the output folder (homeworks/manifest.json,
+reports/manifest.json), so it always describes the files next to it, even
+when several machines share one database. Only the process that owns the
+Manifest writes it; worker processes return hashes to it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+MANIFEST_NAME = "manifest.json"
+
+
+def content_hash(*parts):
+    """
+    Return a stable hex digest of JSON-compatible parts.
+
+    Dict keys are sorted and other values (dates, sqlite3 rows as tuples)
+    are hashed by their str(), so equal data always gives the same hash.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(
+            json.dumps(part, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8")
+        )
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RowHasher:
+    """Incremental hash of query rows, for inputs too large to collect first."""
+
+    def __init__(self, *header):
+        self._digest = hashlib.sha256(content_hash(*header).encode("ascii"))
+
+    def update(self, row):
+        """Add one row (any sequence of column values)."""
+        self._digest.update(repr(tuple(row)).encode("utf-8"))
+        self._digest.update(b"\n")
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+class Manifest:
+    """Input hashes and output paths of the artifacts in one folder."""
+
+    def __init__(self, directory, name=MANIFEST_NAME):
+        """
+        Load the manifest of a folder, starting empty if there is none yet.
+
+        Args:
+            directory (str): Folder the artifacts are written to.
+            name (str, optional): Manifest file name. Defaults to "manifest.json".
+        """
+        self.path = os.path.join(directory, name)
+        self.entries = {}
+        self.changed = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            # A damaged manifest only costs one full regeneration
+            logging.error(f"Ignoring unreadable manifest {self.path}: {e}")
+
+    def unchanged(self, key, digest):
+        """
+        Return the path of an artifact whose input hash is still digest, else None.
+
+        An artifact whose file has been deleted or moved counts as changed.
+        """
+        entry = self.entries.get(key)
+        if entry and entry["hash"] == digest and os.path.exists(entry["path"]):
+            return entry["path"]
+        return None
+
+    def record(self, key, digest, path, **details):
+        """
+        Remember that the artifact key was written to path from input digest.
+
+        details are kept in the entry too, e.g. a cheap signature of the
+        input that lets a caller skip even hashing it.
+        """
+        self.entries[key] = {"hash": digest, "path": path, **details}
+        self.changed = True
+
+    def get(self, key):
+        """Return the entry ({"hash", "path"} and any details) of an artifact, or None."""
+        return self.entries.get(key)
+
+    def save(self):
+        """Write the manifest if it changed, replacing the old file atomically."""
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=0, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self.changed = False
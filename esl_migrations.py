@@ -0,0 +1,964 @@
+"""
+Versioned schema migrations for esl.db.
+
+Each migration is a (version, description, step) entry in MIGRATIONS. The
+schema_version table records which versions have been applied. run_migrations()
+applies the missing ones in order, each inside its own write transaction. It is
+called by esl_db the first time a process opens a database file. Steps must be
+idempotent so that a half-migrated file from an older build can be re-run safely.
+
+Usage (migrates the file if needed, then prints its version):
+    python esl_migrations.py [db_path]
+"""
+
+import sqlite3
+import sys
+import logging
+
+
+def _merge_duplicate_lesson_records(conn):
+    """Collapse duplicate (student_id, lesson_id) lesson records into the oldest one."""
+    groups = conn.execute(
+        """
+        SELECT student_id, lesson_id
+        FROM lesson_records
+        GROUP BY student_id, lesson_id
+        HAVING COUNT(*) > 1
+        """
+    ).fetchall()
+
+    for student_id, lesson_id in groups:
+        rows = conn.execute(
+            """
+            SELECT id, completion_date, score, feedback
+            FROM lesson_records
+            WHERE student_id = ? AND lesson_id = ?
+            ORDER BY id
+            """,
+            (student_id, lesson_id),
+        ).fetchall()
+        keep_id = rows[0][0]
+        duplicate_ids = [row[0] for row in rows[1:]]
+
+        # Newest non-empty value wins for each field
+        completion_date = max((r[1] for r in rows if r[1]), default=None)
+        score = next((r[2] for r in reversed(rows) if r[2] is not None), None)
+        feedback = next((r[3] for r in reversed(rows) if r[3]), None)
+
+        conn.execute(
+            "UPDATE lesson_records SET completion_date = ?, score = ?, feedback = ? WHERE id = ?",
+            (completion_date, score, feedback, keep_id),
+        )
+        placeholders = ", ".join("?" for _ in duplicate_ids)
+        conn.execute(
+            f"UPDATE block_records SET lesson_record_id = ? WHERE lesson_record_id IN ({placeholders})",
+            [keep_id, *duplicate_ids],
+        )
+        conn.execute(
+            f"DELETE FROM lesson_records WHERE id IN ({placeholders})", duplicate_ids
+        )
+
+
+def _merge_duplicate_block_records(conn):
+    """Collapse duplicate (lesson_record_id, block_id) block records into the oldest one."""
+    groups = conn.execute(
+        """
+        SELECT lesson_record_id, block_id
+        FROM block_records
+        GROUP BY lesson_record_id, block_id
+        HAVING COUNT(*) > 1
+        """
+    ).fetchall()
+
+    for lesson_record_id, block_id in groups:
+        rows = conn.execute(
+            """
+            SELECT id, student_speech_notes, teacher_notes, student_questions,
+                   created_at, modified_at
+            FROM block_records
+            WHERE lesson_record_id = ? AND block_id = ?
+            ORDER BY id
+            """,
+            (lesson_record_id, block_id),
+        ).fetchall()
+        keep_id = rows[0][0]
+        duplicate_ids = [row[0] for row in rows[1:]]
+
+        speech_notes = next((r[1] for r in reversed(rows) if r[1]), None)
+        teacher_notes = next((r[2] for r in reversed(rows) if r[2]), None)
+        questions = next((r[3] for r in reversed(rows) if r[3]), None)
+        created_at = min(r[4] for r in rows)
+        modified_at = max((r[5] for r in rows if r[5]), default=None)
+
+        conn.execute(
+            """
+            UPDATE block_records
+            SET student_speech_notes = ?, teacher_notes = ?, student_questions = ?,
+                created_at = ?, modified_at = ?
+            WHERE id = ?
+            """,
+            (speech_notes, teacher_notes, questions, created_at, modified_at, keep_id),
+        )
+        placeholders = ", ".join("?" for _ in duplicate_ids)
+        conn.execute(
+            f"DELETE FROM block_records WHERE id IN ({placeholders})", duplicate_ids
+        )
+
+
+def _add_lookup_indexes(conn):
+    """Index every foreign key the CLI filters on, and make session records unique."""
+    _merge_duplicate_lesson_records(conn)
+    _merge_duplicate_block_records(conn)
+
+    # Plain execute() calls: executescript() would commit the migration's
+    # transaction half-way through.
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_units_course ON units(course_id, unit_number)",
+        "CREATE INDEX IF NOT EXISTS idx_lessons_unit ON lessons(unit_id, lesson_number)",
+        "CREATE INDEX IF NOT EXISTS idx_blocks_lesson ON blocks(lesson_id, block_number)",
+        "CREATE INDEX IF NOT EXISTS idx_vocabulary_lesson ON vocabulary(lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_grammar_rules_lesson ON grammar_rules(lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_resources_lesson ON resources(lesson_id)",
+        "CREATE INDEX IF NOT EXISTS idx_enrolled_students_course ON enrolled_students(course_id)",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_lesson_records_student_lesson
+            ON lesson_records(student_id, lesson_id)""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_block_records_record_block
+            ON block_records(lesson_record_id, block_id)""",
+    ):
+        conn.execute(statement)
+
+
+# rowid of a curriculum_fts row is (source id * 8 + entity code), so triggers can
+# find the row for a source record without scanning the index.
+CURRICULUM_FTS_ENTITIES = {
+    "lesson": 1,
+    "unit": 2,
+    "block": 3,
+    "vocabulary": 4,
+    "grammar": 5,
+}
+
+# (entity, table, lesson_id expression, unit_id expression, title expression, body expression)
+# {r} in an expression is replaced by the row reference: the table name when
+# backfilling, NEW inside a trigger.
+CURRICULUM_FTS_SOURCES = [
+    (
+        "lesson",
+        "lessons",
+        "{r}.id",
+        "{r}.unit_id",
+        "{r}.title",
+        "coalesce({r}.context, '') || ' ' || coalesce({r}.grammar_focus, '') || ' ' || coalesce({r}.vocabulary_focus, '')",
+    ),
+    (
+        "unit",
+        "units",
+        "NULL",
+        "{r}.id",
+        "{r}.title",
+        "coalesce({r}.description, '')",
+    ),
+    (
+        "block",
+        "blocks",
+        "{r}.lesson_id",
+        "NULL",
+        "{r}.title",
+        "coalesce({r}.description, '') || ' ' || coalesce({r}.content, '')",
+    ),
+    (
+        "vocabulary",
+        "vocabulary",
+        "{r}.lesson_id",
+        "NULL",
+        "{r}.word_or_phrase",
+        "coalesce({r}.definition, '') || ' ' || coalesce({r}.example_usage, '')",
+    ),
+    (
+        "grammar",
+        "grammar_rules",
+        "{r}.lesson_id",
+        "NULL",
+        "{r}.rule",
+        "coalesce({r}.example, '')",
+    ),
+]
+
+
+def _add_curriculum_search(conn):
+    """Create the FTS5 curriculum index, its sync triggers, and the student name index."""
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS curriculum_fts USING fts5(
+            entity UNINDEXED,
+            entity_id UNINDEXED,
+            lesson_id UNINDEXED,
+            unit_id UNINDEXED,
+            title,
+            body,
+            tokenize = 'porter unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """
+    )
+
+    for entity, table, lesson_expr, unit_expr, title_expr, body_expr in CURRICULUM_FTS_SOURCES:
+        code = CURRICULUM_FTS_ENTITIES[entity]
+
+        def columns(ref):
+            return (
+                f"{ref}.id * 8 + {code}, '{entity}', {ref}.id, "
+                f"{lesson_expr.format(r=ref)}, {unit_expr.format(r=ref)}, "
+                f"{title_expr.format(r=ref)}, {body_expr.format(r=ref)}"
+            )
+
+        insert = (
+            "INSERT INTO curriculum_fts (rowid, entity, entity_id, lesson_id, unit_id, title, body) "
+            "SELECT {cols}"
+        )
+        conn.execute(f"DELETE FROM curriculum_fts WHERE entity = '{entity}'")
+        conn.execute(insert.format(cols=columns(table)) + f" FROM {table}")
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                {insert.format(cols=columns("NEW"))};
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE ON {table} BEGIN
+                DELETE FROM curriculum_fts WHERE rowid = OLD.id * 8 + {code};
+                {insert.format(cols=columns("NEW"))};
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM curriculum_fts WHERE rowid = OLD.id * 8 + {code};
+            END
+            """
+        )
+
+    # Trigram tokens keep the old substring semantics of "name LIKE '%term%'"
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+            name, email, content = 'enrolled_students', content_rowid = 'id',
+            tokenize = 'trigram'
+        )
+        """
+    )
+    conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+    for statement in (
+        """
+        CREATE TRIGGER IF NOT EXISTS enrolled_students_fts_insert
+        AFTER INSERT ON enrolled_students BEGIN
+            INSERT INTO students_fts (rowid, name, email) VALUES (NEW.id, NEW.name, NEW.email);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS enrolled_students_fts_update
+        AFTER UPDATE OF name, email ON enrolled_students BEGIN
+            INSERT INTO students_fts (students_fts, rowid, name, email)
+            VALUES ('delete', OLD.id, OLD.name, OLD.email);
+            INSERT INTO students_fts (rowid, name, email) VALUES (NEW.id, NEW.name, NEW.email);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS enrolled_students_fts_delete
+        AFTER DELETE ON enrolled_students BEGIN
+            INSERT INTO students_fts (students_fts, rowid, name, email)
+            VALUES ('delete', OLD.id, OLD.name, OLD.email);
+        END
+        """,
+    ):
+        conn.execute(statement)
+
+
+def _add_session_notes_search(conn):
+    """Create the FTS5 index over session notes and lesson feedback, with sync triggers."""
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS session_notes_fts USING fts5(
+            source UNINDEXED,
+            record_id UNINDEXED,
+            lesson_record_id UNINDEXED,
+            block_id UNINDEXED,
+            student_speech_notes,
+            teacher_notes,
+            student_questions,
+            feedback,
+            tokenize = 'porter unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """
+    )
+
+    # rowid = block_records.id * 2 for block notes, lesson_records.id * 2 + 1 for feedback.
+    # Rows with nothing to search are not indexed.
+    block_insert = """
+        INSERT INTO session_notes_fts (rowid, source, record_id, lesson_record_id, block_id,
+                                       student_speech_notes, teacher_notes, student_questions)
+        SELECT {r}.id * 2, 'block', {r}.id, {r}.lesson_record_id, {r}.block_id,
+               {r}.student_speech_notes, {r}.teacher_notes, {r}.student_questions
+        {source}
+        WHERE coalesce({r}.student_speech_notes, {r}.teacher_notes, {r}.student_questions) IS NOT NULL
+    """
+    feedback_insert = """
+        INSERT INTO session_notes_fts (rowid, source, record_id, lesson_record_id, feedback)
+        SELECT {r}.id * 2 + 1, 'lesson', {r}.id, {r}.id, {r}.feedback
+        {source}
+        WHERE {r}.feedback IS NOT NULL AND {r}.feedback != ''
+    """
+
+    conn.execute("DELETE FROM session_notes_fts")
+    conn.execute(block_insert.format(r="block_records", source="FROM block_records"))
+    conn.execute(feedback_insert.format(r="lesson_records", source="FROM lesson_records"))
+
+    for statement in (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS block_records_notes_fts_insert
+        AFTER INSERT ON block_records BEGIN
+            {block_insert.format(r="NEW", source="")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS block_records_notes_fts_update
+        AFTER UPDATE OF student_speech_notes, teacher_notes, student_questions, lesson_record_id
+        ON block_records BEGIN
+            DELETE FROM session_notes_fts WHERE rowid = OLD.id * 2;
+            {block_insert.format(r="NEW", source="")};
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS block_records_notes_fts_delete
+        AFTER DELETE ON block_records BEGIN
+            DELETE FROM session_notes_fts WHERE rowid = OLD.id * 2;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_feedback_fts_insert
+        AFTER INSERT ON lesson_records BEGIN
+            {feedback_insert.format(r="NEW", source="")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_feedback_fts_update
+        AFTER UPDATE OF feedback ON lesson_records BEGIN
+            DELETE FROM session_notes_fts WHERE rowid = OLD.id * 2 + 1;
+            {feedback_insert.format(r="NEW", source="")};
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS lesson_records_feedback_fts_delete
+        AFTER DELETE ON lesson_records BEGIN
+            DELETE FROM session_notes_fts WHERE rowid = OLD.id * 2 + 1;
+        END
+        """,
+    ):
+        conn.execute(statement)
+
+
+def _add_gemini_response_cache(conn):
+    """Create the table esl_gemini uses to cache Gemini responses by content hash."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS gemini_response_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_gemini_response_cache_last_used
+        ON gemini_response_cache (last_used_at)
+        """
+    )
+
+
+def _add_chat_sessions(conn):
+    """Create the tables esl_chat uses to persist Gemini assistant sessions."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER,
+            lesson_id INTEGER,
+            title TEXT,
+            preamble TEXT NOT NULL DEFAULT '',
+            summary TEXT NOT NULL DEFAULT '',
+            summarized_turns INTEGER NOT NULL DEFAULT 0,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_id) REFERENCES enrolled_students(id),
+            FOREIGN KEY (lesson_id) REFERENCES lessons(id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_turns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            user_text TEXT NOT NULL,
+            model_text TEXT NOT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_sessions(id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_turns_session_position
+        ON chat_turns (session_id, position)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_student
+        ON chat_sessions (student_id, updated_at)
+        """
+    )
+
+
+def _rebuild_student_progress(conn):
+    """
+    Recompute every student_progress row from lesson_records.
+
+    An empty score or completion_date (the sample data has both) counts as
+    not set, like NULL, here and in the triggers.
+    """
+    conn.execute("DELETE FROM student_progress")
+    conn.execute(
+        """
+        INSERT INTO student_progress
+            (student_id, completed_count, score_sum, score_count, last_activity)
+        SELECT student_id, COUNT(NULLIF(completion_date, '')),
+               coalesce(SUM(NULLIF(score, '')), 0), COUNT(NULLIF(score, '')),
+               MAX(NULLIF(completion_date, ''))
+        FROM lesson_records
+        GROUP BY student_id
+        """
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO student_progress (student_id) SELECT id FROM enrolled_students"
+    )
+
+
+def _create_lesson_record_progress_triggers(conn):
+    """Create the triggers that keep student_progress current with lesson_records."""
+
+    # Add (sign=+) or remove (sign=-) one lesson record's contribution
+    def apply_record(r, sign):
+        score = f"NULLIF({r}.score, '')"
+        completion_date = f"NULLIF({r}.completion_date, '')"
+        return f"""
+            INSERT OR IGNORE INTO student_progress (student_id) VALUES ({r}.student_id);
+            UPDATE student_progress
+            SET completed_count = completed_count {sign} ({completion_date} IS NOT NULL),
+                score_sum = score_sum {sign} coalesce({score}, 0),
+                score_count = score_count {sign} ({score} IS NOT NULL),
+                last_activity = (
+                    SELECT MAX(NULLIF(completion_date, '')) FROM lesson_records
+                    WHERE student_id = {r}.student_id
+                )
+            WHERE student_id = {r}.student_id;
+        """
+
+    for statement in (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_progress_insert
+        AFTER INSERT ON lesson_records BEGIN
+            {apply_record("NEW", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_progress_update
+        AFTER UPDATE OF student_id, completion_date, score ON lesson_records BEGIN
+            {apply_record("OLD", "-")}
+            {apply_record("NEW", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_progress_delete
+        AFTER DELETE ON lesson_records BEGIN
+            {apply_record("OLD", "-")}
+        END
+        """,
+    ):
+        conn.execute(statement)
+
+
+def _add_progress_aggregates(conn):
+    """
+    Create student_progress and course_stats, kept current by triggers.
+
+    student_progress: per student, completed lessons, score sum and count
+    (over every record with a score) and the latest completion date.
+    course_stats: per course, its units, lessons and enrolled students.
+    Progress reports and course listings read one row instead of counting.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS student_progress (
+            student_id INTEGER PRIMARY KEY,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            score_sum INTEGER NOT NULL DEFAULT 0,
+            score_count INTEGER NOT NULL DEFAULT 0,
+            last_activity DATE
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS course_stats (
+            course_id INTEGER PRIMARY KEY,
+            unit_count INTEGER NOT NULL DEFAULT 0,
+            lesson_count INTEGER NOT NULL DEFAULT 0,
+            student_count INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    # Keeps last_activity and "most recent lessons" an index lookup per student
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_lesson_records_student_completion
+        ON lesson_records (student_id, completion_date)
+        """
+    )
+
+    # Rebuild from scratch, so a re-run after a partial migration is safe
+    _rebuild_student_progress(conn)
+    conn.execute("DELETE FROM course_stats")
+    conn.execute(
+        """
+        INSERT INTO course_stats (course_id, unit_count, lesson_count, student_count)
+        SELECT c.id,
+               (SELECT COUNT(*) FROM units u WHERE u.course_id = c.id),
+               (SELECT COUNT(*) FROM lessons l JOIN units u ON u.id = l.unit_id
+                WHERE u.course_id = c.id),
+               (SELECT COUNT(*) FROM enrolled_students es WHERE es.course_id = c.id)
+        FROM courses c
+        """
+    )
+
+    def move_lessons(course, count, sign):
+        return f"""
+            UPDATE course_stats SET lesson_count = lesson_count {sign} ({count})
+            WHERE course_id = ({course});
+        """
+
+    _create_lesson_record_progress_triggers(conn)
+    for statement in (
+        """
+        CREATE TRIGGER IF NOT EXISTS enrolled_students_progress_insert
+        AFTER INSERT ON enrolled_students BEGIN
+            INSERT OR IGNORE INTO student_progress (student_id) VALUES (NEW.id);
+            UPDATE course_stats SET student_count = student_count + 1
+            WHERE course_id = NEW.course_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS enrolled_students_progress_update
+        AFTER UPDATE OF course_id ON enrolled_students BEGIN
+            UPDATE course_stats SET student_count = student_count - 1
+            WHERE course_id = OLD.course_id;
+            UPDATE course_stats SET student_count = student_count + 1
+            WHERE course_id = NEW.course_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS enrolled_students_progress_delete
+        AFTER DELETE ON enrolled_students BEGIN
+            DELETE FROM student_progress WHERE student_id = OLD.id;
+            UPDATE course_stats SET student_count = student_count - 1
+            WHERE course_id = OLD.course_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS courses_stats_insert
+        AFTER INSERT ON courses BEGIN
+            INSERT OR IGNORE INTO course_stats (course_id) VALUES (NEW.id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS courses_stats_delete
+        AFTER DELETE ON courses BEGIN
+            DELETE FROM course_stats WHERE course_id = OLD.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS units_stats_insert
+        AFTER INSERT ON units BEGIN
+            UPDATE course_stats SET unit_count = unit_count + 1
+            WHERE course_id = NEW.course_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS units_stats_update
+        AFTER UPDATE OF course_id ON units BEGIN
+            UPDATE course_stats SET unit_count = unit_count - 1
+            WHERE course_id = OLD.course_id;
+            UPDATE course_stats SET unit_count = unit_count + 1
+            WHERE course_id = NEW.course_id;
+            {move_lessons("OLD.course_id", "SELECT COUNT(*) FROM lessons WHERE unit_id = OLD.id", "-")}
+            {move_lessons("NEW.course_id", "SELECT COUNT(*) FROM lessons WHERE unit_id = NEW.id", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS units_stats_delete
+        AFTER DELETE ON units BEGIN
+            UPDATE course_stats SET unit_count = unit_count - 1
+            WHERE course_id = OLD.course_id;
+            {move_lessons("OLD.course_id", "SELECT COUNT(*) FROM lessons WHERE unit_id = OLD.id", "-")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lessons_stats_insert
+        AFTER INSERT ON lessons BEGIN
+            {move_lessons("SELECT course_id FROM units WHERE id = NEW.unit_id", "1", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lessons_stats_update
+        AFTER UPDATE OF unit_id ON lessons BEGIN
+            {move_lessons("SELECT course_id FROM units WHERE id = OLD.unit_id", "1", "-")}
+            {move_lessons("SELECT course_id FROM units WHERE id = NEW.unit_id", "1", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lessons_stats_delete
+        AFTER DELETE ON lessons BEGIN
+            {move_lessons("SELECT course_id FROM units WHERE id = OLD.unit_id", "1", "-")}
+        END
+        """,
+    ):
+        conn.execute(statement)
+
+
+def _ignore_empty_progress_values(conn):
+    """
+    Stop counting empty scores and completion dates in student_progress.
+
+    Migration 6 counted a record with completion_date = '' as completed and
+    added 0 to the score average for score = ''. Recreate its lesson_records
+    triggers, which now use NULLIF, and rebuild the affected rows.
+    """
+    for name in (
+        "lesson_records_progress_insert",
+        "lesson_records_progress_update",
+        "lesson_records_progress_delete",
+    ):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    _create_lesson_record_progress_triggers(conn)
+    _rebuild_student_progress(conn)
+
+
+def _add_review_queue(conn):
+    """
+    Create review_items, the spaced-repetition state esl_review schedules from.
+
+    One row per student and vocabulary item or grammar rule of a lesson the
+    student has a record for, with its ease, interval and due date. Triggers
+    queue the items of a lesson when its first record is created and follow
+    curriculum edits. Picking what to review is a range scan of the
+    (student_id, due_at) index.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS review_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            item_type TEXT NOT NULL CHECK (item_type IN ('vocabulary', 'grammar')),
+            item_id INTEGER NOT NULL,
+            ease REAL NOT NULL DEFAULT 2.5,
+            interval_days REAL NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            due_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_reviewed_at DATETIME,
+            FOREIGN KEY (student_id) REFERENCES enrolled_students(id),
+            UNIQUE (student_id, item_type, item_id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_review_items_student_due
+        ON review_items (student_id, due_at)
+        """
+    )
+
+    # Queue everything already taught; items with review state are kept
+    for item_type, table in (("vocabulary", "vocabulary"), ("grammar", "grammar_rules")):
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO review_items (student_id, item_type, item_id)
+            SELECT DISTINCT lr.student_id, '{item_type}', t.id
+            FROM lesson_records lr
+            JOIN {table} t ON t.lesson_id = lr.lesson_id
+            """
+        )
+
+    for item_type, table in (("vocabulary", "vocabulary"), ("grammar", "grammar_rules")):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS lesson_records_review_{item_type}_insert
+            AFTER INSERT ON lesson_records BEGIN
+                INSERT OR IGNORE INTO review_items (student_id, item_type, item_id)
+                SELECT NEW.student_id, '{item_type}', id FROM {table}
+                WHERE lesson_id = NEW.lesson_id;
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_review_insert
+            AFTER INSERT ON {table} BEGIN
+                INSERT OR IGNORE INTO review_items (student_id, item_type, item_id)
+                SELECT DISTINCT student_id, '{item_type}', NEW.id FROM lesson_records
+                WHERE lesson_id = NEW.lesson_id;
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_review_delete
+            AFTER DELETE ON {table} BEGIN
+                DELETE FROM review_items
+                WHERE item_type = '{item_type}' AND item_id = OLD.id;
+            END
+            """
+        )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS lesson_records_review_delete
+        AFTER DELETE ON lesson_records BEGIN
+            -- Items never reviewed belonged only to this (e.g. empty) record
+            DELETE FROM review_items
+            WHERE student_id = OLD.student_id AND last_reviewed_at IS NULL
+              AND (
+                  (item_type = 'vocabulary' AND item_id IN
+                      (SELECT id FROM vocabulary WHERE lesson_id = OLD.lesson_id))
+                  OR (item_type = 'grammar' AND item_id IN
+                      (SELECT id FROM grammar_rules WHERE lesson_id = OLD.lesson_id))
+              );
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS enrolled_students_review_delete
+        AFTER DELETE ON enrolled_students BEGIN
+            DELETE FROM review_items WHERE student_id = OLD.id;
+        END
+        """
+    )
+
+
+# (version, description, step). Append new entries; never renumber or edit applied ones.
+def _add_change_versions(conn):
+    """
+    Add version counters that triggers bump on every change to the data reports show.
+
+    student_progress.records_version: any insert, update or delete of one of
+    the student's lesson_records or block_records.
+    course_stats.curriculum_version: any change to the course or its units,
+    lessons or blocks.
+    The report export compares them with the manifest to tell a report is
+    unchanged from one row instead of reading the records and curriculum.
+    """
+    conn.execute(
+        "ALTER TABLE student_progress ADD COLUMN records_version INTEGER NOT NULL DEFAULT 0"
+    )
+    conn.execute(
+        "ALTER TABLE course_stats ADD COLUMN curriculum_version INTEGER NOT NULL DEFAULT 0"
+    )
+
+    def bump(student_id):
+        return f"""
+            INSERT OR IGNORE INTO student_progress (student_id) VALUES ({student_id});
+            UPDATE student_progress SET records_version = records_version + 1
+            WHERE student_id = {student_id};
+        """
+
+    def block_student(r):
+        return f"(SELECT student_id FROM lesson_records WHERE id = {r}.lesson_record_id)"
+
+    for statement in (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_version_insert
+        AFTER INSERT ON lesson_records BEGIN
+            {bump("NEW.student_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_version_update
+        AFTER UPDATE ON lesson_records BEGIN
+            {bump("OLD.student_id")}
+            UPDATE student_progress SET records_version = records_version + 1
+            WHERE student_id = NEW.student_id AND NEW.student_id != OLD.student_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lesson_records_version_delete
+        AFTER DELETE ON lesson_records BEGIN
+            {bump("OLD.student_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS block_records_version_insert
+        AFTER INSERT ON block_records BEGIN
+            UPDATE student_progress SET records_version = records_version + 1
+            WHERE student_id = {block_student("NEW")};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS block_records_version_update
+        AFTER UPDATE ON block_records BEGIN
+            UPDATE student_progress SET records_version = records_version + 1
+            WHERE student_id IN ({block_student("OLD")}, {block_student("NEW")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS block_records_version_delete
+        AFTER DELETE ON block_records BEGIN
+            UPDATE student_progress SET records_version = records_version + 1
+            WHERE student_id = {block_student("OLD")};
+        END
+        """,
+    ):
+        conn.execute(statement)
+
+    # Course of a unit, lesson or block row
+    course_of = {
+        "units": lambda r: f"{r}.course_id",
+        "lessons": lambda r: f"(SELECT course_id FROM units WHERE id = {r}.unit_id)",
+        "blocks": lambda r: f"""(
+            SELECT u.course_id FROM lessons l JOIN units u ON u.id = l.unit_id
+            WHERE l.id = {r}.lesson_id
+        )""",
+    }
+    bump_courses = """
+        UPDATE course_stats SET curriculum_version = curriculum_version + 1
+        WHERE course_id IN ({});
+    """
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS courses_curriculum_version_update
+        AFTER UPDATE ON courses BEGIN
+            {bump_courses.format("OLD.id, NEW.id")}
+        END
+        """
+    )
+    for table, course in course_of.items():
+        for event, courses in (
+            ("INSERT", course("NEW")),
+            ("UPDATE", f"{course('OLD')}, {course('NEW')}"),
+            ("DELETE", course("OLD")),
+        ):
+            conn.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_curriculum_version_{event.lower()}
+                AFTER {event} ON {table} BEGIN
+                    {bump_courses.format(courses)}
+                END
+                """
+            )
+
+
+MIGRATIONS = [
+    (1, "Add foreign-key and uniqueness indexes", _add_lookup_indexes),
+    (2, "Add FTS5 curriculum and student search indexes", _add_curriculum_search),
+    (3, "Add FTS5 session notes index", _add_session_notes_search),
+    (4, "Add Gemini response cache", _add_gemini_response_cache),
+    (5, "Add Gemini assistant chat sessions", _add_chat_sessions),
+    (6, "Add trigger-maintained progress and course aggregates", _add_progress_aggregates),
+    (7, "Add spaced-repetition review queue", _add_review_queue),
+    (
+        8,
+        "Ignore empty scores and completion dates in progress aggregates",
+        _ignore_empty_progress_values,
+    ),
+    (9, "Add records and curriculum change versions", _add_change_versions),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version, or 0 for an unmigrated file."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+    return version or 0
+
+
+def run_migrations(conn):
+    """
+    Apply every pending migration to a connection.
+
+    Args:
+        conn (sqlite3.Connection): An open connection to the database.
+
+    Returns:
+        list: The versions applied by this call (empty if already up to date).
+
+    Raises:
+        Exception: Whatever a failing migration raised (usually sqlite3.Error).
+            That migration is rolled back.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.commit()
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        try:
+            # IMMEDIATE takes the write lock up front; re-check in case another
+            # process migrated the file while we were waiting for it.
+            conn.execute("BEGIN IMMEDIATE")
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            step(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description),
+            )
+            conn.commit()
+            applied.append(version)
+        except Exception as e:
+            # Not only sqlite3.Error: a Python error in a step must not leave
+            # the BEGIN IMMEDIATE transaction open either
+            conn.rollback()
+            logging.error(f"Migration {version} ({description}) failed: {e}")
+            raise
+    return applied
+
+
+if __name__ == "__main__":
+    from esl_db import DEFAULT_DB_PATH, get_connection
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH
+    conn = get_connection(db_path)
+    print(f"{db_path}: schema version {get_schema_version(conn)}")
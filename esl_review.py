@@ -0,0 +1,208 @@
+"""
+Spaced-repetition review of vocabulary and grammar rules.
+
+Every vocabulary item and grammar rule of a lesson a student has a record for
+gets a row in review_items (migration 7 in esl_migrations), holding its ease,
+interval and due date. Reviews are graded, and the grade moves the due date
+with an SM-2 style schedule:
+
+- again: relearn; due again in a few minutes and the ease drops,
+- hard: the interval grows a little and the ease drops slightly,
+- good: the interval grows by the ease,
+- easy: the interval grows by more than the ease and the ease rises.
+
+Picking what to review reads the (student_id, due_at) index from the
+oldest due item on, so it stays a short range scan however many items a
+student has collected.
+
+Times are UTC text ("YYYY-MM-DD HH:MM:SS"), like SQLite's CURRENT_TIMESTAMP.
+"""
+
+import datetime
+
+AGAIN, HARD, GOOD, EASY = 0, 1, 2, 3
+GRADES = {AGAIN: "Again", HARD: "Hard", GOOD: "Good", EASY: "Easy"}
+
+MIN_EASE = 1.3
+RELEARN_MINUTES = 10
+DEFAULT_LIMIT = 20
+
+_ITEMS_QUERY = """
+    SELECT r.id, r.student_id, r.item_type, r.item_id, r.ease, r.interval_days,
+           r.repetitions, r.lapses, r.due_at, r.last_reviewed_at,
+           coalesce(v.lesson_id, g.lesson_id) AS lesson_id,
+           coalesce(v.word_or_phrase, g.rule) AS prompt,
+           v.definition AS answer,
+           coalesce(v.example_usage, g.example) AS example
+    FROM review_items r
+    LEFT JOIN vocabulary v ON r.item_type = 'vocabulary' AND v.id = r.item_id
+    LEFT JOIN grammar_rules g ON r.item_type = 'grammar' AND g.id = r.item_id
+"""
+
+
+def utc_now():
+    """Current time in review_items format."""
+    return _format(datetime.datetime.now(datetime.timezone.utc))
+
+
+def _format(moment):
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _parse(text):
+    return datetime.datetime.strptime(text[:19], "%Y-%m-%d %H:%M:%S").replace(
+        tzinfo=datetime.timezone.utc
+    )
+
+
+def schedule(ease, interval_days, repetitions, grade):
+    """
+    Work out the next review of an item.
+
+    Args:
+        ease (float): Current ease factor.
+        interval_days (float): Current interval.
+        repetitions (int): Successful reviews in a row.
+        grade (int): AGAIN, HARD, GOOD or EASY.
+
+    Returns:
+        tuple: (ease, interval_days, repetitions, lapsed). An interval of 0
+        means relearning, due again after RELEARN_MINUTES.
+    """
+    if grade not in GRADES:
+        raise ValueError(f"Unknown grade: {grade}")
+    if grade == AGAIN:
+        return max(MIN_EASE, ease - 0.2), 0.0, 0, True
+
+    if grade == HARD:
+        ease = max(MIN_EASE, ease - 0.15)
+        # At least a day more than last time, but well short of a good review
+        interval = max(interval_days * 1.2, interval_days + 1.0)
+    elif repetitions == 0:
+        interval = 1.0
+    elif repetitions == 1:
+        interval = 3.0
+    else:
+        interval = interval_days * ease
+
+    if grade == EASY:
+        ease += 0.15
+        interval *= 1.3
+    return ease, round(interval, 2), repetitions + 1, False
+
+
+def due_items(conn, student_id, item_type=None, limit=DEFAULT_LIMIT, now=None):
+    """
+    Return a student's items that are due, most overdue first.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        student_id (int): The student.
+        item_type (str, optional): "vocabulary" or "grammar". Defaults to both.
+        limit (int, optional): Maximum number of items. Defaults to 20.
+        now (str, optional): Review time, UTC. Defaults to the current time.
+
+    Returns:
+        list[dict]: Review state plus lesson_id, prompt (word or rule),
+        answer (definition, None for grammar) and example.
+    """
+    params = [student_id, now or utc_now()]
+    type_condition = ""
+    if item_type:
+        type_condition = "AND r.item_type = ?"
+        params.append(item_type)
+    rows = conn.execute(
+        f"""
+        {_ITEMS_QUERY}
+        WHERE r.student_id = ? AND r.due_at <= ? {type_condition}
+        ORDER BY r.due_at
+        LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def due_items_for_students(conn, student_ids, item_type=None, limit=DEFAULT_LIMIT, now=None):
+    """
+    due_items for many students in one query per chunk, for batch homework.
+
+    Returns:
+        dict: student_id -> list of items, only for students with items due.
+    """
+    now = now or utc_now()
+    items = {}
+    student_ids = sorted(set(student_ids))
+    for start in range(0, len(student_ids), 500):
+        chunk = student_ids[start : start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        params = [*chunk, now]
+        type_condition = ""
+        if item_type:
+            type_condition = "AND r.item_type = ?"
+            params.append(item_type)
+        for row in conn.execute(
+            f"""
+            {_ITEMS_QUERY}
+            WHERE r.student_id IN ({placeholders}) AND r.due_at <= ? {type_condition}
+            ORDER BY r.student_id, r.due_at
+            """,
+            params,
+        ):
+            student_items = items.setdefault(row["student_id"], [])
+            if len(student_items) < limit:
+                student_items.append(dict(row))
+    return items
+
+
+def record_review(conn, review_id, grade, now=None):
+    """
+    Save the outcome of one review and schedule the next.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        review_id (int): review_items id.
+        grade (int): AGAIN, HARD, GOOD or EASY.
+        now (str, optional): Review time, UTC. Defaults to the current time.
+
+    Returns:
+        str or None: The new due_at, or None if the item no longer exists.
+    """
+    now = now or utc_now()
+    with conn:
+        row = conn.execute(
+            "SELECT ease, interval_days, repetitions FROM review_items WHERE id = ?",
+            (review_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        ease, interval_days, repetitions, lapsed = schedule(
+            row["ease"], row["interval_days"], row["repetitions"], grade
+        )
+        if interval_days:
+            delta = datetime.timedelta(days=interval_days)
+        else:
+            delta = datetime.timedelta(minutes=RELEARN_MINUTES)
+        due_at = _format(_parse(now) + delta)
+        conn.execute(
+            """
+            UPDATE review_items
+            SET ease = ?, interval_days = ?, repetitions = ?, lapses = lapses + ?,
+                due_at = ?, last_reviewed_at = ?
+            WHERE id = ?
+            """,
+            (ease, interval_days, repetitions, int(lapsed), due_at, now, review_id),
+        )
+    return due_at
+
+
+def review_counts(conn, student_id, now=None):
+    """Return (items due now, items queued) for a student."""
+    row = conn.execute(
+        """
+        SELECT COUNT(*) FILTER (WHERE due_at <= ?), COUNT(*)
+        FROM review_items WHERE student_id = ?
+        """,
+        (now or utc_now(), student_id),
+    ).fetchone()
+    return row[0], row[1]
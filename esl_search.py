@@ -0,0 +1,279 @@
+"""
+Full-text search over curriculum content, student names and session notes.
+
+Queries the FTS5 indexes created by migrations 2 and 3 in esl_migrations.
+Triggers keep those indexes in sync with lessons, units, blocks, vocabulary,
+grammar_rules, enrolled_students, block_records and lesson_records. Results
+are ranked with BM25, and curriculum and notes matches carry a highlighted
+snippet.
+"""
+
+import re
+import sqlite3
+import logging
+
+# Markers put around matched terms in snippets. Display code swaps them for styling.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+# BM25 weights for curriculum_fts columns: entity, entity_id, lesson_id, unit_id, title, body
+CURRICULUM_WEIGHTS = "0.0, 0.0, 0.0, 0.0, 10.0, 1.0"
+
+ENTITY_LABELS = {
+    "lesson": "Lesson",
+    "unit": "Unit",
+    "block": "Block",
+    "vocabulary": "Vocabulary",
+    "grammar": "Grammar",
+}
+
+
+def build_match_query(text, operator="AND"):
+    """
+    Turn free text into a safe FTS5 prefix query.
+
+    Every word becomes a quoted prefix term, so FTS5 syntax characters typed by
+    the user can't break the query. "phrasal verb" becomes '"phrasal"* AND "verb"*'.
+
+    Returns:
+        str or None: The MATCH expression, or None if the text has no words.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    return f" {operator} ".join(f'"{word}"*' for word in words)
+
+
+def search_curriculum(conn, text, limit=20):
+    """
+    Search lessons, units, blocks, vocabulary and grammar rules.
+
+    All words must match. If nothing matches, any word may match instead.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        text (str): What the user typed.
+        limit (int, optional): Maximum number of hits. Defaults to 20.
+
+    Returns:
+        list[dict]: Hits ordered best first, with entity, entity_id, lesson_id,
+        unit_id, title, snippet and score (lower is better, as in bm25()).
+    """
+    for operator in ("AND", "OR"):
+        match = build_match_query(text, operator)
+        if not match:
+            return []
+        rows = conn.execute(
+            f"""
+            SELECT entity, entity_id, lesson_id, unit_id, title,
+                   snippet(curriculum_fts, -1, ?, ?, '…', 16) AS snippet,
+                   bm25(curriculum_fts, {CURRICULUM_WEIGHTS}) AS score
+            FROM curriculum_fts
+            WHERE curriculum_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+            """,
+            (HIGHLIGHT_START, HIGHLIGHT_END, match, limit),
+        ).fetchall()
+        if rows:
+            return [dict(row) for row in rows]
+    return []
+
+
+def search_lessons(conn, text, limit=20):
+    """
+    Rank lessons by how well their own text and their content match the search.
+
+    A lesson's score is its best-scoring hit. A unit hit counts for every
+    lesson in that unit.
+
+    Returns:
+        list[dict]: Lessons with id, title, unit_number, unit_title,
+        course_name, matched_in (entity label of the best hit), snippet and score.
+    """
+    hits = search_curriculum(conn, text, limit=limit * 10)
+    if not hits:
+        return []
+
+    unit_ids = {hit["unit_id"] for hit in hits if hit["entity"] == "unit"}
+    unit_lessons = {}
+    if unit_ids:
+        placeholders = ", ".join("?" for _ in unit_ids)
+        for row in conn.execute(
+            f"SELECT id, unit_id FROM lessons WHERE unit_id IN ({placeholders})",
+            list(unit_ids),
+        ):
+            unit_lessons.setdefault(row["unit_id"], []).append(row["id"])
+
+    best = {}
+    for hit in hits:
+        if hit["entity"] == "unit":
+            lesson_ids = unit_lessons.get(hit["unit_id"], [])
+        else:
+            lesson_ids = [hit["lesson_id"]]
+        for lesson_id in lesson_ids:
+            # Hits arrive best first, so the first one seen for a lesson is its best
+            if lesson_id is not None and lesson_id not in best:
+                best[lesson_id] = hit
+
+    ranked_ids = list(best)[:limit]
+    placeholders = ", ".join("?" for _ in ranked_ids)
+    rows = conn.execute(
+        f"""
+        SELECT les.id, les.title, u.unit_number, u.title as unit_title, c.name as course_name
+        FROM lessons les
+        JOIN units u ON les.unit_id = u.id
+        JOIN courses c ON u.course_id = c.id
+        WHERE les.id IN ({placeholders})
+        """,
+        ranked_ids,
+    ).fetchall()
+    lessons = {row["id"]: dict(row) for row in rows}
+
+    results = []
+    for lesson_id in ranked_ids:
+        if lesson_id not in lessons:
+            continue
+        hit = best[lesson_id]
+        lesson = lessons[lesson_id]
+        lesson["matched_in"] = ENTITY_LABELS.get(hit["entity"], hit["entity"])
+        lesson["snippet"] = hit["snippet"]
+        lesson["score"] = hit["score"]
+        results.append(lesson)
+    return results
+
+
+def search_students(conn, text, limit=50):
+    """
+    Find students whose name or email contains the text.
+
+    Uses the trigram index for terms of three or more characters. Shorter terms
+    fall back to LIKE, because trigram indexes can't match them.
+
+    Returns:
+        list[dict]: Students with id, name, email and course_id.
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    if len(text) < 3:
+        rows = conn.execute(
+            """
+            SELECT id, name, email, course_id
+            FROM enrolled_students
+            WHERE name LIKE ? OR email LIKE ?
+            ORDER BY name
+            LIMIT ?
+            """,
+            (f"%{text}%", f"%{text}%", limit),
+        ).fetchall()
+    else:
+        phrase = '"' + text.replace('"', '""') + '"'
+        rows = conn.execute(
+            """
+            SELECT s.id, s.name, s.email, s.course_id
+            FROM students_fts f
+            JOIN enrolled_students s ON s.id = f.rowid
+            WHERE students_fts MATCH ?
+            ORDER BY bm25(students_fts)
+            LIMIT ?
+            """,
+            (phrase, limit),
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def search_session_notes(
+    conn,
+    text,
+    student_id=None,
+    course_id=None,
+    date_from=None,
+    date_to=None,
+    limit=50,
+):
+    """
+    Search student speech notes, teacher notes, student questions and lesson feedback.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        text (str): What the user typed. All words must match.
+        student_id (int, optional): Only this student's sessions.
+        course_id (int, optional): Only sessions of lessons in this course.
+        date_from (str, optional): Earliest session date, as YYYY-MM-DD.
+        date_to (str, optional): Latest session date, as YYYY-MM-DD.
+        limit (int, optional): Maximum number of hits. Defaults to 50.
+
+    Returns:
+        list[dict]: Hits ordered best first, with source ("block" or "lesson"),
+        student_id, student_name, course_name, lesson_id, lesson_title,
+        block_title, session_date, snippet and score.
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+
+    rows = conn.execute(
+        """
+        SELECT * FROM (
+            SELECT f.source, lr.student_id, s.name AS student_name,
+                   c.id AS course_id, c.name AS course_name,
+                   l.id AS lesson_id, l.title AS lesson_title, b.title AS block_title,
+                   CASE f.source
+                       WHEN 'block' THEN date(coalesce(br.modified_at, br.created_at))
+                       ELSE lr.completion_date
+                   END AS session_date,
+                   snippet(session_notes_fts, -1, :hl_start, :hl_end, '…', 20) AS snippet,
+                   bm25(session_notes_fts) AS score
+            FROM session_notes_fts f
+            JOIN lesson_records lr ON lr.id = f.lesson_record_id
+            JOIN enrolled_students s ON s.id = lr.student_id
+            JOIN lessons l ON l.id = lr.lesson_id
+            JOIN units u ON u.id = l.unit_id
+            JOIN courses c ON c.id = u.course_id
+            LEFT JOIN block_records br ON f.source = 'block' AND br.id = f.record_id
+            LEFT JOIN blocks b ON b.id = f.block_id
+            WHERE session_notes_fts MATCH :match
+              AND (:student_id IS NULL OR lr.student_id = :student_id)
+              AND (:course_id IS NULL OR u.course_id = :course_id)
+        )
+        WHERE (:date_from IS NULL OR session_date >= :date_from)
+          AND (:date_to IS NULL OR session_date <= :date_to)
+        ORDER BY score
+        LIMIT :limit
+        """,
+        {
+            "hl_start": HIGHLIGHT_START,
+            "hl_end": HIGHLIGHT_END,
+            "match": match,
+            "student_id": student_id,
+            "course_id": course_id,
+            "date_from": date_from,
+            "date_to": date_to,
+            "limit": limit,
+        },
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def highlight_markup(snippet, style="bold yellow"):
+    """Escape a snippet for rich and turn the highlight markers into style tags."""
+    from rich.markup import escape
+
+    return (
+        escape(snippet or "")
+        .replace(HIGHLIGHT_START, f"[{style}]")
+        .replace(HIGHLIGHT_END, f"[/{style}]")
+    )
+
+
+def rebuild_search_indexes(conn):
+    """Rebuild the student index and merge FTS segments. Use after bulk imports."""
+    try:
+        conn.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO curriculum_fts (curriculum_fts) VALUES ('optimize')")
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error rebuilding search indexes: {e}")
+        raise
@@ -0,0 +1,273 @@
+"""
+Background tasks for the ESL tools.
+
+TaskExecutor runs long operations on a small thread pool so the interactive
+loop never waits on them: Gemini requests, report exports and large queries.
+A task function receives its Task as the first argument, and uses it to:
+
+- report progress with task.update(completed, total, description),
+- stop early once task.cancelled is set (task.check_cancelled() raises
+  TaskCancelled for convenience).
+
+Finished tasks are queued. The UI loop collects them with
+TaskExecutor.finished() and handles each one on its own thread, so result
+handlers may print and prompt freely.
+
+SQLite connections must not be shared between threads. Inside a task, go
+through esl_db (get_database(path).connection()), which gives each worker
+thread its own connection.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task function to stop after a cancel request."""
+
+
+class Task:
+    """One background operation: its progress, cancel flag and outcome."""
+
+    def __init__(self, task_id, name, on_done=None):
+        """
+        Initialize the task.
+
+        Args:
+            task_id (int): Number shown to the user.
+            name (str): Short description, e.g. "Teacher notes for block 3".
+            on_done (callable, optional): Called as on_done(task) on the UI
+                thread once the task has finished successfully. Failed and
+                cancelled tasks are only reported, not passed to it.
+        """
+        self.id = task_id
+        self.name = name
+        self.on_done = on_done
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.completed = 0
+        self.total = None
+        self.description = name
+        self.detached = False  # The UI stopped waiting and left it in the background
+        self.submitted_at = time.perf_counter()
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._claimed = False
+        self._lock = threading.Lock()
+
+    def update(self, completed=None, total=None, description=None):
+        """Report progress. Safe to call from the task's thread."""
+        with self._lock:
+            if completed is not None:
+                self.completed = completed
+            if total is not None:
+                self.total = total
+            if description is not None:
+                self.description = description
+
+    def progress(self):
+        """Return (completed, total, description) as one consistent reading."""
+        with self._lock:
+            return self.completed, self.total, self.description
+
+    @property
+    def cancelled(self):
+        """True once cancel() has been called."""
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """Raise TaskCancelled if a cancel was requested."""
+        if self._cancel.is_set():
+            raise TaskCancelled(self.name)
+
+    def cancel(self):
+        """
+        Ask the task to stop.
+
+        A task that hasn't started never runs. A running one stops at its next
+        cancel check, so this returns before it has actually finished.
+        """
+        self._cancel.set()
+
+    @property
+    def done(self):
+        """True once the task has finished, failed or been cancelled."""
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the task to end. Returns done."""
+        return self._finished.wait(timeout)
+
+    @property
+    def elapsed(self):
+        """Seconds since submission, or until the task ended."""
+        return (self.finished_at or time.perf_counter()) - self.submitted_at
+
+    def claim(self):
+        """Return True the first time it is called, so a result is handled only once."""
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+
+class TaskExecutor:
+    """Thread pool for Task functions, with a queue of finished tasks for the UI loop."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        """
+        Initialize the executor. Threads are only started when the first task arrives.
+
+        Args:
+            max_workers (int, optional): Tasks running at once. Defaults to 4.
+        """
+        self.max_workers = max_workers
+        self._pool = None
+        self._ids = itertools.count(1)
+        self._tasks = {}
+        self._finished = queue.Queue()
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, on_done=None, silent=False, **kwargs):
+        """
+        Run fn(task, *args, **kwargs) in the background.
+
+        Args:
+            name (str): Short description shown in progress displays.
+            fn (callable): The task function. Its return value becomes task.result.
+            on_done (callable, optional): Result handler, see Task.
+            silent (bool, optional): For housekeeping such as prefetching. A
+                silent task is not listed by active() and never queued for
+                the UI loop.
+
+        Returns:
+            Task: Handle for progress, cancelling and the result.
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="esl-task"
+                )
+            task = Task(next(self._ids), name, on_done=on_done)
+            if not silent:
+                self._tasks[task.id] = task
+        self._pool.submit(self._run, task, fn, args, kwargs, silent)
+        return task
+
+    def _run(self, task, fn, args, kwargs, silent=False):
+        status = CANCELLED
+        try:
+            if not task.cancelled:
+                task.status = RUNNING
+                task.result = fn(task, *args, **kwargs)
+                # A function that noticed the cancel may still return what it has
+                status = CANCELLED if task.cancelled else DONE
+        except TaskCancelled:
+            status = CANCELLED
+        except Exception as e:
+            logging.error(f"Background task '{task.name}' failed: {e}")
+            task.error = e
+            status = FAILED
+        finally:
+            task.status = status
+            task.finished_at = time.perf_counter()
+            task._finished.set()
+            if not silent:
+                self._finished.put(task)
+
+    def active(self):
+        """Return the tasks that haven't finished yet, oldest first."""
+        with self._lock:
+            return [task for task in self._tasks.values() if not task.done]
+
+    def finished(self):
+        """
+        Return the tasks that ended since the last call and haven't been claimed.
+
+        Call from the UI loop; the caller is responsible for running on_done.
+        """
+        tasks = []
+        while True:
+            try:
+                task = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._tasks.pop(task.id, None)
+            if task.claim():
+                tasks.append(task)
+        return tasks
+
+    def shutdown(self, cancel=True, wait=False):
+        """Stop accepting tasks, optionally cancelling the ones still running."""
+        if cancel:
+            for task in self.active():
+                task.cancel()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=cancel)
+
+
+def follow(task, console, interval=0.1, show_after=0.15):
+    """
+    Show a task's progress until it ends or the user presses Ctrl-C.
+
+    Nothing is drawn for tasks that finish within show_after seconds, so quick
+    operations don't flicker a progress bar.
+
+    Args:
+        task (Task): Task to follow.
+        console (rich.console.Console): Where to draw.
+        interval (float, optional): Seconds between redraws.
+        show_after (float, optional): Grace period before drawing.
+
+    Returns:
+        bool: True if the task ended, False if the user stopped following it.
+    """
+    from rich.progress import (
+        BarColumn,
+        MofNCompleteColumn,
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        TimeElapsedColumn,
+    )
+
+    try:
+        if task.wait(show_after):
+            return True
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            TextColumn("[dim](Ctrl-C for options)"),
+            console=console,
+            transient=True,
+        ) as progress:
+            bar = progress.add_task(task.description, total=task.total)
+            while not task.wait(interval):
+                completed, total, description = task.progress()
+                progress.update(
+                    bar, completed=completed, total=total, description=description
+                )
+        return True
+    except KeyboardInterrupt:
+        return task.done
@@ -27,24 +27,37 @@ Run the script to start the ESL Teacher Assistant CLI. Follow the on-screen prom
 and generate teaching notes.
 """
 
-import google.generativeai as genai
+import time
+
+# Measured for --startup-profile
+_IMPORT_STARTED = time.perf_counter()
+
 import os
-from dotenv import load_dotenv
 import webbrowser
 import urllib.parse
 import sys
 import sqlite3
 import argparse
-import time
 import shutil
-from prompt_toolkit import prompt
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
 from rich.text import Text
+from rich.markup import escape
 from rich.box import ROUNDED, DOUBLE, HEAVY
-from student_manager_v100 import StudentManager
+from esl_db import MODIFIED_AT_NOW, get_database
+import esl_search
+import esl_gemini
+import esl_chat
+import esl_tasks
+import esl_journal
+import esl_review
+
+# google.generativeai, dotenv, prompt_toolkit, rich.live and student_manager_v100
+# are imported on first use. The Gemini SDK alone takes most of a second to import.
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 
 # Define color schemes
@@ -70,6 +83,13 @@ COLOR_SCHEMES = {
 }
 
 
+def prompt(message):
+    """Read a line with prompt_toolkit, which is imported on first use."""
+    from prompt_toolkit import prompt as toolkit_prompt
+
+    return toolkit_prompt(message)
+
+
 def select_theme(theme_name):
     """
     Selects a color scheme based on the theme name.
@@ -96,23 +116,89 @@ class ESLTeacherCLI:
     [Student]: [concise "Expected response"]
     """
 
-    def __init__(self, db_path="esl.db", theme="default"):
+    # Columns loaded for each level of the selection path by get_context_snapshot
+    CONTEXT_COLUMNS = {
+        "student": ("id", "name", "email", "enrollment_date"),
+        "course": (
+            "id",
+            "name",
+            "focus",
+            "themes",
+            "grammar_overview",
+            "vocabulary_overview",
+        ),
+        "unit": ("id", "unit_number", "title", "description"),
+        "lesson": (
+            "id",
+            "lesson_number",
+            "title",
+            "context",
+            "grammar_focus",
+            "vocabulary_focus",
+        ),
+        "block": (
+            "id",
+            "block_number",
+            "title",
+            "description",
+            "activity_type",
+            "content",
+        ),
+    }
+    # Shown for blocks that have no block_records row yet
+    EMPTY_BLOCK_RECORD = {
+        "student_speech_notes": None,
+        "teacher_notes": None,
+        "student_questions": None,
+    }
+    CONTEXT_TABLES = {
+        "student": "enrolled_students",
+        "course": "courses",
+        "unit": "units",
+        "lesson": "lessons",
+        "block": "blocks",
+    }
+
+    def __init__(
+        self,
+        db_path="esl.db",
+        theme="default",
+        gemini_cache=True,
+        gemini_backend=None,
+        gemini_stream=True,
+        prefetch=True,
+        journal_path=None,
+    ):
         """Initialize the CLI with database connection and theme"""
         self.db_path = db_path
-        self.connection = None
-        self.cursor = None
+        # Local file note edits are saved to first, see esl_journal
+        self.journal_path = journal_path or esl_journal.default_journal_path(db_path)
+        self.journal = None
+        self._database = None  # Set by connect_db; see connection and cursor
+        self.curriculum_cache = None
+        self.session_cache = None
+        self.gemini_cache = None
+        self.gemini_cache_enabled = (
+            gemini_cache and os.getenv(esl_gemini.CACHE_ENV_VAR, "1") != "0"
+        )
+        self.gemini_backend = esl_gemini.selected_backend(gemini_backend)
+        self.gemini_stream = gemini_stream
+        self.gemini_timings = []  # GeminiStream.timings() of each streamed response
+        self.startup_timings = []  # (step, seconds) recorded during startup
         self.current_student = None
         self.current_course = None
         self.current_unit = None
         self.current_lesson = None
         self.current_block = None
         self.current_lesson_record = None
-
-        # Initialize StudentManager
-        self.student_manager = StudentManager(db_path=self.db_path)
-
-        # Set up rich console and theme
-        self.update_theme(theme)
+        self._context_snapshot = None  # (cache key, snapshot) of the last selection
+        self._student_manager = None  # Created on first use, see student_manager
+        self.tasks = esl_tasks.TaskExecutor()  # Gemini calls and other slow work
+        self.prefetch_enabled = prefetch
+        self._prefetch_task = None  # Warms the caches for the likely next screen
+
+        # Set up rich console and theme. update_theme() would also redraw the menu.
+        self.theme = select_theme(theme)
         self.console = Console()
 
         # Get terminal size for better UI formatting
@@ -125,6 +211,30 @@ class ESLTeacherCLI:
         }
         self.ASSETS_DIR = "./assets"  # Change this path if needed
 
+    @property
+    def connection(self):
+        """
+        The calling thread's connection, or None when not connected.
+
+        esl_db gives each thread its own connection, so methods that use this
+        (and execute_query) are safe to call from background tasks.
+        """
+        return self._database.connection() if self._database else None
+
+    @property
+    def cursor(self):
+        """The calling thread's cursor, or None when not connected."""
+        return self._database.cursor() if self._database else None
+
+    @property
+    def student_manager(self):
+        """The StudentManager, imported, created and connected on first use."""
+        if self._student_manager is None:
+            from student_manager_v100 import StudentManager
+
+            self._student_manager = StudentManager(db_path=self.db_path)
+        return self._student_manager
+
     def update_theme(self, theme_name):
         """
         Update the theme dynamically and refresh the console.
@@ -147,30 +257,229 @@ class ESLTeacherCLI:
     def connect_db(self):
         """Establish database connection"""
         try:
-            self.connection = sqlite3.connect(
-                self.db_path
-            )  # Connect using the full path
-            self.connection.row_factory = sqlite3.Row
-            self.cursor = self.connection.cursor()
-            return True
+            # Shares the connection StudentManager already opened on this thread
+            database = get_database(self.db_path)
+            database.connection()
+            self._database = database
+            self.curriculum_cache = database.curriculum_cache
+            self.session_cache = database.session_cache
+            self.gemini_cache = esl_gemini.GeminiResponseCache(
+                self.connection, enabled=self.gemini_cache_enabled
+            )
         except sqlite3.Error as e:
             self.print_error(f"Database connection error: {e}")
             return False
+        self.open_journal()
+        return True
+
+    def open_journal(self):
+        """Open the note journal, replay edits an earlier run left unsaved, and start flushing."""
+        journal = esl_journal.NoteJournal(self.journal_path, database=self._database)
+        try:
+            replay = journal.open()
+        except OSError as e:
+            # Notes are then written to the database directly
+            self.print_error(f"Could not open the note journal {self.journal_path}: {e}")
+            return
+        self.journal = journal
+        if replay:
+            written = self.flush_notes()
+            if written:
+                self.print_success(f"Recovered {written} unsaved note edits from the journal.")
+        journal.start()
+
+    def flush_notes(self):
+        """
+        Write journaled note edits to the database now, e.g. at the end of a lesson.
+
+        Returns:
+            int: Blocks written. Edits that conflict with changes made elsewhere
+                are left for handle_note_conflicts.
+        """
+        if not self.journal:
+            return 0
+        try:
+            written, _ = self.journal.flush(self.connection)
+        except sqlite3.Error as e:
+            self.print_error(f"Could not save note edits yet; they are kept in the journal: {e}")
+            return 0
+        return written
 
     def close_db(self):
-        """Close database connection"""
-        if self.connection:
-            self.connection.close()
+        """Cancel background tasks and close the database connection"""
+        if self._prefetch_task:
+            self._prefetch_task.cancel()
+        self.tasks.shutdown(cancel=True)
+        if self.journal:
+            self.journal.close(self.connection)
+            self.journal = None
+        if self._database:
+            self._database.close()
+            self._database = None
 
     def get_block_details(self, block_id):
-        """Fetch block details from the database."""
-        query = """
-        SELECT title, activity_type
-        FROM blocks
-        WHERE id = ?
+        """Fetch block details through the curriculum cache."""
+        return self.curriculum_cache.row(self.connection, "blocks", block_id)
+
+    def units_for_course(self, course_id):
+        """A course's units in unit order, through the curriculum cache."""
+        return self.curriculum_cache.rows(
+            self.connection, "units", "course_id", course_id, "unit_number"
+        )
+
+    def lessons_for_unit(self, unit_id):
+        """A unit's lessons in lesson order, through the curriculum cache."""
+        return self.curriculum_cache.rows(
+            self.connection, "lessons", "unit_id", unit_id, "lesson_number"
+        )
+
+    def blocks_for_lesson(self, lesson_id):
+        """A lesson's blocks in block order, through the curriculum cache."""
+        return self.curriculum_cache.rows(
+            self.connection, "blocks", "lesson_id", lesson_id, "block_number"
+        )
+
+    def lesson_materials(self, lesson_id):
+        """A lesson's (grammar_rules, vocabulary, resources), through the curriculum cache."""
+        return tuple(
+            self.curriculum_cache.rows(self.connection, table, "lesson_id", lesson_id)
+            for table in ("grammar_rules", "vocabulary", "resources")
+        )
+
+    def started_lesson_ids(self, student_id, unit_id):
+        """IDs of the unit's lessons the student has a lesson record for, through the session cache."""
+        conn = self.connection
+
+        def load():
+            return frozenset(
+                row["lesson_id"]
+                for row in conn.execute(
+                    """
+                    SELECT lr.lesson_id
+                    FROM lesson_records lr
+                    JOIN lessons l ON l.id = lr.lesson_id
+                    WHERE lr.student_id = ? AND l.unit_id = ?
+                    """,
+                    (student_id, unit_id),
+                )
+            )
+
+        return self.session_cache.get(
+            conn, "started_lessons", (student_id, unit_id), load
+        )
+
+    def block_records_for(self, lesson_record_id):
+        """
+        A lesson record's block records as {block_id: row}, through the session cache.
+
+        Edits still waiting in the journal are included.
+        """
+        conn = self.connection
+
+        def load():
+            records = {
+                row["block_id"]: dict(row)
+                for row in conn.execute(
+                    "SELECT * FROM block_records WHERE lesson_record_id = ?",
+                    (lesson_record_id,),
+                )
+            }
+            return self.journal.overlay(lesson_record_id, records) if self.journal else records
+
+        return self.session_cache.get(conn, "block_records", lesson_record_id, load)
+
+    def current_block_records(self):
+        """Block records of the current lesson record; {} until its first save."""
+        if not self.current_lesson_record:
+            return {}
+        return self.block_records_for(self.current_lesson_record["id"])
+
+    def ensure_lesson_record(self, student_id=None, lesson_id=None):
+        """
+        Return the lesson record for a student and lesson, creating it if needed.
+
+        Called when notes, scores or feedback are saved, so browsing lessons
+        never writes. Defaults to the current student and lesson; the current
+        lesson record is updated when it is the one created.
+
+        Returns:
+            dict or None: The lesson record, or None if nothing is selected.
         """
-        block_details = self.execute_query(query, (block_id,), "one")
-        return block_details
+        if student_id is None:
+            if self.current_lesson_record:
+                return self.current_lesson_record
+            if not self.current_student or not self.current_lesson:
+                self.print_error("No lesson selected. Please select a lesson first.")
+                return None
+            student_id = self.current_student["id"]
+            lesson_id = self.current_lesson["id"]
+
+        rows = self.execute_query(
+            """
+            INSERT INTO lesson_records (student_id, lesson_id)
+            VALUES (?, ?)
+            ON CONFLICT(student_id, lesson_id) DO NOTHING
+            RETURNING *
+            """,
+            (student_id, lesson_id),
+            "returning",
+        )
+        if rows:
+            record = dict(rows[0])
+            # A new lesson record has no block records; saves go straight to the cache
+            self.session_cache.write_through(
+                self.connection, "block_records", record["id"], lambda _: {}
+            )
+        else:
+            # It already existed, e.g. created by StudentManager since the lesson was selected
+            record = dict(
+                self.execute_query(
+                    "SELECT * FROM lesson_records WHERE student_id = ? AND lesson_id = ?",
+                    (student_id, lesson_id),
+                    "one",
+                )
+            )
+        if (
+            self.current_student
+            and self.current_lesson
+            and self.current_student["id"] == student_id
+            and self.current_lesson["id"] == lesson_id
+        ):
+            self.current_lesson_record = record
+        return record
+
+    def reload_lesson_record(self):
+        """Re-read the current lesson record after it may have been created or deleted."""
+        if not self.current_student or not self.current_lesson:
+            return
+        lesson_record = self.execute_query(
+            "SELECT * FROM lesson_records WHERE student_id = ? AND lesson_id = ?",
+            (self.current_student["id"], self.current_lesson["id"]),
+            "one",
+        )
+        self.current_lesson_record = dict(lesson_record) if lesson_record else None
+
+    def prefetch(self, *loads):
+        """
+        Warm the caches for the screen the teacher will most likely open next.
+
+        Runs in the background and replaces any prefetch still running, so
+        only the latest selection is prefetched.
+
+        Args:
+            *loads: (method, *args) tuples, such as (self.units_for_course, 3).
+        """
+        if not self.prefetch_enabled or self._database is None:
+            return
+        if self._prefetch_task:
+            self._prefetch_task.cancel()
+
+        def warm(task):
+            for method, *args in loads:
+                task.check_cancelled()
+                method(*args)
+
+        self._prefetch_task = self.tasks.submit("Prefetch", warm, silent=True)
 
     def prepare_gemini_prompt(self):
         """Prepare the prompt for Gemini using the template and current context."""
@@ -184,37 +493,50 @@ class ESLTeacherCLI:
             )
             return None
 
-        # Fetch block details
-        block_details = self.get_block_details(self.current_block["id"])
-        if not block_details:
+        # Lesson and block details come from the context snapshot shared with the footer
+        snapshot = self.get_context_snapshot()
+        block_details = snapshot["block"]
+        if not block_details or not snapshot["lesson"]:
             self.print_error("Block details not found.")
             return None
 
-        # Fetch additional details if needed
-        student_level = self.current_student.get(
-            "level", "Unknown Level"
-        )  # Assuming 'level' is stored in the student record
-        lesson_topic = self.current_lesson["title"]
-        block_title = block_details["title"]
-        block_number = self.current_block["block_number"]
-        block_id = self.current_block["id"]
-        block_activity_type = block_details["activity_type"]
-
-        # Populate the template
-        prompt = self.TEACHER_NOTES_TEMPLATE.format(
-            lesson_topic=lesson_topic,
-            student_name=self.current_student["name"],
-            student_level=student_level,
-            block_title=block_title,
-            block_number=block_number,
-            block_id=block_id,
-            block_activity_type=block_activity_type,
+        return self.build_teacher_notes_prompt(
+            self.current_student, snapshot["lesson"]["title"], block_details
         )
 
-        return prompt
+    def build_teacher_notes_prompt(self, student, lesson_title, block):
+        """
+        Fill TEACHER_NOTES_TEMPLATE for one block.
+
+        Args:
+            student (dict): Student row, with at least "name".
+            lesson_title (str): Title of the block's lesson.
+            block (dict): Block row with id, block_number, title and activity_type.
+
+        Returns:
+            str: The prompt.
+        """
+        # 'level' isn't stored on students yet, so this normally falls back
+        student_level = student.get("level", "Unknown Level")
+        return self.TEACHER_NOTES_TEMPLATE.format(
+            lesson_topic=lesson_title,
+            student_name=student["name"],
+            student_level=student_level,
+            block_title=block["title"],
+            block_number=block["block_number"],
+            block_id=block["id"],
+            block_activity_type=block["activity_type"],
+        )
 
     def generate_teacher_notes_with_gemini(self):
-        """Generate teacher notes using Gemini AI."""
+        """
+        Generate teacher notes for the current block using Gemini AI.
+
+        The request runs as a background task. While it streams, Ctrl-C offers
+        to cancel it or leave it running so the teacher can move on; the notes
+        are then offered for saving, to the block they were generated for, once
+        they arrive.
+        """
         if not self.current_block:
             self.print_error("No block selected. Please select a block first.")
             return
@@ -231,46 +553,531 @@ class ESLTeacherCLI:
                 return
 
             # Initialize the model
-            model = genai.GenerativeModel("gemini-1.5-flash")
-
-            # Generate the response
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                transient=True,
-            ) as progress:
-                task = progress.add_task(
-                    "[cyan]Generating teacher notes...", total=None
+            model = esl_gemini.create_model(self.gemini_backend)
+
+            # Captured now: the teacher may have moved to another block when the notes arrive
+            student_id = self.current_student["id"]
+            lesson_id = self.current_lesson["id"]
+            block = dict(self.current_block)
+            name = f"Teacher notes for block {block['block_number']}: {block['title']}"
+
+            # Identical prompts (same block, same level) are answered from the cache
+            if self.gemini_stream:
+                stream = esl_gemini.stream_text(model, prompt, cache=self.gemini_cache)
+                task = self.tasks.submit(
+                    name,
+                    self.consume_stream,
+                    stream,
+                    on_done=lambda task: self.offer_generated_notes(
+                        task, student_id, lesson_id, block, shown=not task.detached
+                    ),
                 )
-                response = model.generate_content(prompt)
+                self.render_stream(
+                    stream,
+                    "Generated Teacher Notes" + (" (cached)" if stream.cached else ""),
+                    task=task,
+                )
+                self.wait_for_task(task, ask_first=not task.done)
+            else:
+                self.run_task(
+                    name,
+                    lambda task: esl_gemini.generate_text(
+                        model, prompt, cache=self.gemini_cache
+                    ),
+                    on_done=lambda task: self.offer_generated_notes(
+                        task, student_id, lesson_id, block
+                    ),
+                )
+
+        except Exception as e:
+            self.print_error(f"Error generating teacher notes: {str(e)}")
+
+        input("\nPress Enter to continue...")  # Pause for user to read output
+
+    def consume_stream(self, task, stream):
+        """
+        Task function: read a GeminiStream to the end, stopping early if cancelled.
+
+        Returns:
+            tuple: (text, cached), like esl_gemini.generate_text.
+        """
+        for _ in stream:
+            if task.cancelled:
+                stream.cancel()
+                break
+            task.update(description=f"{task.name} ({len(stream.text)} characters)")
+        self.gemini_timings.append(stream.timings())
+        return stream.text, stream.cached
 
-            # Display the generated notes
+    def offer_generated_notes(self, task, student_id, lesson_id, block, shown=False):
+        """
+        Show generated notes (unless they were already streamed) and offer to save them.
+
+        Args:
+            task (esl_tasks.Task): Finished task whose result is (notes, cached).
+            student_id (int): The student the notes were generated for.
+            lesson_id (int): The lesson the block belongs to.
+            block (dict): The block the notes were generated for.
+            shown (bool, optional): True if the teacher already watched the
+                notes arrive.
+        """
+        notes, cached = task.result
+        if not shown:
             self.console.print(
                 Panel(
-                    response.text,
+                    notes,
                     box=ROUNDED,
                     border_style=self.theme["success"],
-                    title="Generated Teacher Notes",
+                    title=f"Teacher notes for block {block['block_number']}: "
+                    f"{escape(block['title'])}"
+                    + (" (cached)" if cached else ""),
                 )
             )
 
-            # Ask if the user wants to save the generated notes
-            save_choice = (
-                input("\nDo you want to save these notes? (y/n): ").strip().lower()
-            )
-            if save_choice == "y":
-                self.update_block_notes(teacher_notes=response.text)
+        # Ask if the user wants to save the generated notes
+        save_choice = input("\nDo you want to save these notes? (y/n): ").strip().lower()
+        if save_choice == "y":
+            lesson_record = self.ensure_lesson_record(student_id, lesson_id)
+            # update_block_notes reports a conflict itself and then saves nothing
+            if lesson_record and self.update_block_notes(
+                teacher_notes=notes,
+                lesson_record_id=lesson_record["id"],
+                block_id=block["id"],
+            ):
                 self.print_success("Teacher notes saved successfully.")
+        else:
+            self.print_success("Teacher notes were not saved.")
+
+    def batch_generate_teacher_notes(self, scope="lesson"):
+        """
+        Generate teacher notes for every block of the selected lesson, unit or course.
+
+        Notes are generated for the blocks of the current lesson and of lessons
+        the current student has started. Requests run concurrently under
+        esl_gemini's concurrency and rate limits, and the results are saved in
+        one transaction after the teacher confirms, creating the session
+        records they need.
+
+        Args:
+            scope (str): "lesson", "unit" or "course".
+        """
+        if not self.current_student or not self.current_lesson:
+            self.print_error("Select a student and a lesson first.")
+            return
+        scope_filters = {
+            "lesson": ("l.id = ?", self.current_lesson and self.current_lesson["id"]),
+            "unit": ("l.unit_id = ?", self.current_unit and self.current_unit["id"]),
+            "course": ("u.course_id = ?", self.current_course and self.current_course["id"]),
+        }
+        if scope not in scope_filters or scope_filters[scope][1] is None:
+            self.print_error(f"No {scope} selected.")
+            return
+        condition, scope_id = scope_filters[scope]
+        # Decide on blocks with the notes as they are now, journaled edits included
+        self.flush_notes()
+
+        overwrite = (
+            input("Overwrite blocks that already have teacher notes? (y/n): ")
+            .strip()
+            .lower()
+            == "y"
+        )
+        blocks = self.execute_query(
+            f"""
+            SELECT b.id, b.block_number, b.title, b.activity_type,
+                   l.id AS lesson_id, l.title AS lesson_title, l.lesson_number,
+                   br.teacher_notes
+            FROM blocks b
+            JOIN lessons l ON l.id = b.lesson_id
+            JOIN units u ON u.id = l.unit_id
+            LEFT JOIN lesson_records lr ON lr.lesson_id = l.id AND lr.student_id = ?
+            LEFT JOIN block_records br ON br.lesson_record_id = lr.id AND br.block_id = b.id
+            WHERE {condition} AND (lr.id IS NOT NULL OR l.id = ?)
+            ORDER BY u.unit_number, l.lesson_number, b.block_number
+            """,
+            (self.current_student["id"], scope_id, self.current_lesson["id"]),
+        )
+        blocks = [
+            dict(block) for block in blocks if overwrite or not block["teacher_notes"]
+        ]
+        if not blocks:
+            self.print_error("No blocks need teacher notes in this selection.")
+            return
+
+        if not self.setup_gemini_api():
+            return
+
+        prompts = {
+            (block["lesson_id"], block["id"]): self.build_teacher_notes_prompt(
+                self.current_student, block["lesson_title"], block
+            )
+            for block in blocks
+        }
+        model = esl_gemini.create_model(self.gemini_backend)
+        student = dict(self.current_student)
+
+        def generate(task):
+            task.update(total=len(prompts))
+            return esl_gemini.generate_many(
+                model,
+                prompts,
+                cache=self.gemini_cache,
+                progress=lambda done, total: task.update(completed=done),
+                cancelled=lambda: task.cancelled,
+            )
+
+        self.run_task(
+            f"Teacher notes for {len(prompts)} blocks",
+            generate,
+            on_done=lambda task: self.review_batch_notes(task, student, blocks),
+        )
+
+    def review_batch_notes(self, task, student, blocks):
+        """
+        Show the results of batch_generate_teacher_notes and save them on confirmation.
+
+        Args:
+            task (esl_tasks.Task): Finished task whose result is generate_many's.
+            student (dict): The student the notes were generated for.
+            blocks (list[dict]): The blocks, with their lesson_id.
+        """
+        results = task.result
+        table = Table(
+            show_header=True,
+            header_style=f"bold {self.theme['primary']}",
+            title=f"Teacher notes for {escape(student['name'])} ({task.elapsed:.1f}s)",
+            box=ROUNDED,
+            border_style=self.theme["primary"],
+        )
+        table.add_column("Lesson", justify="right")
+        table.add_column("Block")
+        table.add_column("Result")
+        table.add_column("Notes")
+        for block in blocks:
+            text, cached, error = results[(block["lesson_id"], block["id"])]
+            status = (
+                f"[{self.theme['error']}]failed[/]"
+                if error
+                else ("cached" if cached else "generated")
+            )
+            preview = escape(error or text or "")
+            table.add_row(
+                str(block["lesson_number"]),
+                f"{block['block_number']}: {escape(block['title'])}",
+                status,
+                preview[:80] + ("…" if len(preview) > 80 else ""),
+            )
+        self.console.print(table)
+
+        generated = [
+            (lesson_id, block_id, text)
+            for (lesson_id, block_id), (text, _, error) in results.items()
+            if not error
+        ]
+        if not generated:
+            self.print_error("No notes were generated.")
+            return
+        save_choice = (
+            input(f"\nSave {len(generated)} generated notes? (y/n): ").strip().lower()
+        )
+        if save_choice != "y":
+            self.print_success("Teacher notes were not saved.")
+            return
+
+        # One transaction for the whole batch: create the missing lesson records,
+        # then upsert the block records like update_block_notes does
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    """
+                    INSERT INTO lesson_records (student_id, lesson_id)
+                    VALUES (?, ?)
+                    ON CONFLICT(student_id, lesson_id) DO NOTHING
+                    """,
+                    sorted({(student["id"], lesson_id) for lesson_id, _, _ in generated}),
+                )
+                self.connection.executemany(
+                    f"""
+                    INSERT INTO block_records (lesson_record_id, block_id, teacher_notes, modified_at)
+                    SELECT lr.id, ?, ?, {MODIFIED_AT_NOW}
+                    FROM lesson_records lr
+                    WHERE lr.student_id = ? AND lr.lesson_id = ?
+                    ON CONFLICT(lesson_record_id, block_id) DO UPDATE
+                    SET teacher_notes = excluded.teacher_notes,
+                        modified_at = excluded.modified_at
+                    """,
+                    [
+                        (block_id, text, student["id"], lesson_id)
+                        for lesson_id, block_id, text in generated
+                    ],
+                )
+        except sqlite3.Error as e:
+            self.print_error(f"Error saving teacher notes: {e}")
+            return
+        if self.current_student and self.current_student["id"] == student["id"]:
+            # The current lesson may just have got its record
+            self.reload_lesson_record()
+        self.print_success(f"Saved teacher notes for {len(generated)} blocks.")
+
+    def render_stream(self, stream, title, task=None):
+        """
+        Show a streamed Gemini response in a panel that grows as chunks arrive.
+
+        Without a task, this reads the stream itself and Ctrl-C stops it but
+        keeps the CLI running. With a task (see consume_stream), the stream is
+        read in the background and this only draws it; Ctrl-C stops drawing
+        and leaves the task for wait_for_task to deal with. The panel subtitle
+        shows time to first token and total latency, and the timings are kept
+        in self.gemini_timings.
+
+        Args:
+            stream (esl_gemini.GeminiStream): The response to render.
+            title (str): Panel title.
+            task (esl_tasks.Task, optional): Task consuming the stream.
+
+        Returns:
+            str: The text received, complete or not.
+        """
+
+        from rich.live import Live
+
+        def panel(subtitle):
+            return Panel(
+                stream.text or "…",
+                box=ROUNDED,
+                border_style=self.theme["success"],
+                title=title,
+                subtitle=subtitle,
+            )
+
+        with Live(
+            panel("waiting for first token… (Ctrl-C to stop)"),
+            console=self.console,
+            refresh_per_second=12,
+        ) as live:
+            try:
+                if task is None:
+                    for _ in stream:
+                        live.update(panel("streaming… (Ctrl-C to stop)"))
+                else:
+                    while not task.wait(1 / 12):
+                        if stream.text:
+                            live.update(panel("streaming… (Ctrl-C for options)"))
+            except KeyboardInterrupt:
+                if task is None:
+                    stream.cancel()
+
+            if task is not None and not task.done:
+                live.update(panel("still generating in the background"))
+                return stream.text
+
+            timings = stream.timings()
+            if task is None:
+                # consume_stream records the timings of background streams
+                self.gemini_timings.append(timings)
+            if timings["time_to_first_token_ms"] is None:
+                summary = "no response"
             else:
-                self.print_success("Teacher notes were not saved.")
+                summary = (
+                    f"first token {timings['time_to_first_token_ms'] / 1000:.2f}s · "
+                    f"total {timings['total_ms'] / 1000:.2f}s"
+                )
+            if stream.cancelled:
+                summary = f"cancelled · {summary}"
+            live.update(panel(summary))
+        return stream.text
 
-        except Exception as e:
-            self.print_error(f"Error generating teacher notes: {str(e)}")
+    def run_task(self, name, fn, *args, on_done=None, **kwargs):
+        """
+        Run fn(task, *args, **kwargs) as a background task and wait for it.
 
-        input("\nPress Enter to continue...")  # Pause for user to read output
+        See wait_for_task for what the teacher can do while it runs.
+
+        Args:
+            name (str): Shown in progress displays and notifications.
+            fn (callable): Task function (see esl_tasks).
+            on_done (callable, optional): Called as on_done(task) on this
+                thread once the task completes successfully.
+
+        Returns:
+            esl_tasks.Task: The task; still running if it was left in the background.
+        """
+        task = self.tasks.submit(name, fn, *args, on_done=on_done, **kwargs)
+        self.wait_for_task(task)
+        return task
+
+    def wait_for_task(self, task, ask_first=False):
+        """
+        Show a task's progress until it ends, then handle its result.
+
+        Ctrl-C asks whether to cancel the task, keep waiting or leave it
+        running in the background. A background task's result is handled by
+        handle_finished_tasks from the menu loop.
+
+        Args:
+            task (esl_tasks.Task): Task to wait for.
+            ask_first (bool, optional): Ask straight away instead of showing
+                progress first, for callers that already caught Ctrl-C.
+
+        Returns:
+            bool: True if the task ended and its result was handled here.
+        """
+        while ask_first or not esl_tasks.follow(task, self.console):
+            ask_first = False
+            if task.done:
+                break
+            choice = (
+                input(
+                    f"\n'{task.name}' is still running. "
+                    "[c]ancel, [w]ait or continue in the [b]ackground? [b]: "
+                )
+                .strip()
+                .lower()
+            )
+            if choice == "c":
+                task.cancel()
+                self.console.print("Cancelling…", style=self.theme["warning"])
+            elif choice != "w":
+                task.detached = True
+                self.print_success(
+                    f"'{task.name}' continues in the background. "
+                    "You'll see the result in the menu when it's ready."
+                )
+                return False
+        if task.claim():
+            self.finish_task(task)
+        return True
+
+    def finish_task(self, task):
+        """Report a finished task, and pass a successful one to its on_done handler."""
+        if task.status == esl_tasks.FAILED:
+            self.print_error(f"'{task.name}' failed: {task.error}")
+        elif task.status == esl_tasks.CANCELLED:
+            self.print_error(f"'{task.name}' was cancelled; nothing was saved.")
+        elif task.on_done:
+            try:
+                task.on_done(task)
+            except sqlite3.Error as e:
+                self.print_error(f"Database error while handling '{task.name}': {e}")
+
+    def handle_finished_tasks(self):
+        """Deliver the results of tasks that finished in the background. Called from the menu loop."""
+        for task in self.tasks.finished():
+            self.console.print(
+                Panel(
+                    f"{escape(task.name)} — {task.status} after {task.elapsed:.1f}s",
+                    box=ROUNDED,
+                    border_style=self.theme["info"],
+                    title="Background task",
+                )
+            )
+            self.finish_task(task)
+
+    def handle_note_conflicts(self):
+        """
+        Ask what to do with journaled edits of notes that were changed elsewhere.
+
+        Called from the menu loop. The teacher's version can overwrite the
+        current one or be discarded; until then it stays in the journal.
+        """
+        if not self.journal:
+            return
+        for key, fields in list(self.journal.conflicts.items()):
+            lesson_record_id, block_id = key
+            block = self.get_block_details(block_id)
+            current = self.execute_query(
+                "SELECT * FROM block_records WHERE lesson_record_id = ? AND block_id = ?",
+                key,
+                "one",
+            )
+            table = Table(
+                show_header=True,
+                header_style=f"bold {self.theme['primary']}",
+                box=ROUNDED,
+                border_style=self.theme["warning"],
+                expand=True,
+            )
+            table.add_column("Field")
+            table.add_column("Your unsaved edit")
+            table.add_column("Now in the database")
+            for name, text in fields.items():
+                table.add_row(
+                    name.replace("_", " ").capitalize(),
+                    escape(text or ""),
+                    escape((current[name] if current else None) or "(no record)"),
+                )
+            self.console.print(
+                Panel(
+                    table,
+                    box=ROUNDED,
+                    border_style=self.theme["warning"],
+                    title=f"Notes for block {block['block_number']}: {escape(block['title'])} "
+                    "were changed elsewhere"
+                    if block
+                    else f"Notes for block {block_id} were changed elsewhere",
+                )
+            )
+            choice = input("Keep [y]our version or the [d]atabase version? [y]: ")
+            try:
+                self.journal.resolve(
+                    key, overwrite=choice.strip().lower() != "d", conn=self.connection
+                )
+            except sqlite3.Error as e:
+                self.print_error(f"Could not save your version yet; it is kept in the journal: {e}")
+
+    def show_background_tasks(self):
+        """List running background tasks and let the teacher wait for or cancel one."""
+        tasks = self.tasks.active()
+        if not tasks:
+            self.print_success("No background tasks are running.")
+            return
+
+        table = Table(
+            show_header=True,
+            header_style=f"bold {self.theme['primary']}",
+            box=ROUNDED,
+            border_style=self.theme["primary"],
+            expand=True,
+        )
+        table.add_column("ID", justify="right")
+        table.add_column("Task")
+        table.add_column("Status")
+        table.add_column("Progress", justify="right")
+        table.add_column("Time", justify="right")
+        for task in tasks:
+            completed, total, description = task.progress()
+            table.add_row(
+                str(task.id),
+                escape(description),
+                "cancelling" if task.cancelled else task.status,
+                f"{completed}/{total}" if total else "",
+                f"{task.elapsed:.1f}s",
+            )
+        self.console.print(table)
+
+        choice = input(
+            "\nEnter a task ID to wait for it, c<ID> to cancel it, or press Enter to go back: "
+        ).strip().lower()
+        cancel = choice.startswith("c")
+        task_id = choice[1:] if cancel else choice
+        task = next((t for t in tasks if str(t.id) == task_id), None)
+        if task is None:
+            if choice:
+                self.print_error("No running task with that ID.")
+            return
+        if cancel:
+            task.cancel()
+            self.print_success(f"Cancelling '{task.name}'.")
+        else:
+            self.wait_for_task(task)
 
     def setup_gemini_api(self):
         """Setup the Gemini API with your key"""
+        if self.gemini_backend == "stub":
+            return True  # The local stub needs no key
+        from dotenv import load_dotenv
+        import google.generativeai as genai
+
         load_dotenv()  # Load API key from .env file
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
@@ -283,101 +1090,132 @@ class ESLTeacherCLI:
             self.print_error(f"Error setting up Gemini API: {str(e)}")
             return False
 
+    def get_context_snapshot(self):
+        """
+        Resolve the current selection path in one query and memoise the result.
+
+        The student, course, unit, lesson and block rows are fetched with a
+        single LEFT JOIN from the selected ids. The result is reused until the
+        selection changes or the database changes. Changes are detected with
+        total_changes (writes on this connection, including StudentManager's)
+        and PRAGMA data_version (commits from other connections).
+
+        Returns:
+            dict: Maps "student", "course", "unit", "lesson" and "block" to a
+            row dict, or None where nothing is selected or the row is gone.
+        """
+        selection = {
+            "student": self.current_student,
+            "course": self.current_course,
+            "unit": self.current_unit,
+            "lesson": self.current_lesson,
+            "block": self.current_block,
+        }
+        ids = tuple(row["id"] if row else None for row in selection.values())
+        if not any(ids) or self.connection is None:
+            return dict.fromkeys(selection)
+
+        data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        key = (ids, self.connection.total_changes, data_version)
+        if self._context_snapshot and self._context_snapshot[0] == key:
+            return self._context_snapshot[1]
+
+        columns = []
+        joins = []
+        for level, table in self.CONTEXT_TABLES.items():
+            columns.extend(
+                f"{level}.{column} AS {level}__{column}"
+                for column in self.CONTEXT_COLUMNS[level]
+            )
+            joins.append(f"LEFT JOIN {table} {level} ON {level}.id = :{level}_id")
+        query = f"""
+        SELECT {", ".join(columns)}
+        FROM (SELECT 1) selection
+        {" ".join(joins)}
+        """
+        try:
+            row = self.connection.execute(
+                query, {f"{level}_id": row_id for level, row_id in zip(selection, ids)}
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.print_error(f"Error loading the current context: {e}")
+            return dict.fromkeys(selection)
+
+        snapshot = {}
+        for level in selection:
+            values = {
+                column: row[f"{level}__{column}"]
+                for column in self.CONTEXT_COLUMNS[level]
+            }
+            snapshot[level] = values if values["id"] is not None else None
+        self._context_snapshot = (key, snapshot)
+        return snapshot
+
     def get_current_context(self):
         """Get context information based on what's currently selected"""
+        snapshot = self.get_context_snapshot()
         context_parts = []
 
         # Add student context if selected
-        if self.current_student:
-            student_info = self.execute_query(
-                "SELECT name, email, enrollment_date FROM enrolled_students WHERE id = ?",
-                (self.current_student["id"],),
-                "one",
-            )
-            if student_info:
-                context_parts.append(f"Student: {student_info['name']}")
-                context_parts.append(f"Email: {student_info['email']}")
-                context_parts.append(
-                    f"Enrollment Date: {student_info['enrollment_date']}"
-                )
+        student_info = snapshot["student"]
+        if student_info:
+            context_parts.append(f"Student: {student_info['name']}")
+            context_parts.append(f"Email: {student_info['email']}")
+            context_parts.append(f"Enrollment Date: {student_info['enrollment_date']}")
 
         # Add course context if selected
-        if self.current_course:
-            course_info = self.execute_query(
-                "SELECT name, focus, themes, grammar_overview, vocabulary_overview FROM courses WHERE id = ?",
-                (self.current_course["id"],),
-                "one",
-            )
-            if course_info:
-                context_parts.append(f"Course: {course_info['name']}")
-                if course_info["focus"]:
-                    context_parts.append(f"Focus: {course_info['focus']}")
-                if course_info["themes"]:
-                    context_parts.append(f"Themes: {course_info['themes']}")
-                if course_info["grammar_overview"]:
-                    context_parts.append(
-                        f"Grammar Overview: {course_info['grammar_overview']}"
-                    )
-                if course_info["vocabulary_overview"]:
-                    context_parts.append(
-                        f"Vocabulary Overview: {course_info['vocabulary_overview']}"
-                    )
+        course_info = snapshot["course"]
+        if course_info:
+            context_parts.append(f"Course: {course_info['name']}")
+            if course_info["focus"]:
+                context_parts.append(f"Focus: {course_info['focus']}")
+            if course_info["themes"]:
+                context_parts.append(f"Themes: {course_info['themes']}")
+            if course_info["grammar_overview"]:
+                context_parts.append(
+                    f"Grammar Overview: {course_info['grammar_overview']}"
+                )
+            if course_info["vocabulary_overview"]:
+                context_parts.append(
+                    f"Vocabulary Overview: {course_info['vocabulary_overview']}"
+                )
 
         # Add unit context if selected
-        if self.current_unit:
-            unit_info = self.execute_query(
-                "SELECT unit_number, title, description FROM units WHERE id = ?",
-                (self.current_unit["id"],),
-                "one",
+        unit_info = snapshot["unit"]
+        if unit_info:
+            context_parts.append(
+                f"Unit: {unit_info['unit_number']} - {unit_info['title']}"
             )
-            if unit_info:
-                context_parts.append(
-                    f"Unit: {unit_info['unit_number']} - {unit_info['title']}"
-                )
-                if unit_info["description"]:
-                    context_parts.append(f"Description: {unit_info['description']}")
+            if unit_info["description"]:
+                context_parts.append(f"Description: {unit_info['description']}")
 
         # Add lesson context if selected
-        if self.current_lesson:
-            lesson_info = self.execute_query(
-                "SELECT lesson_number, title, context, grammar_focus, vocabulary_focus FROM lessons WHERE id = ?",
-                (self.current_lesson["id"],),
-                "one",
+        lesson_info = snapshot["lesson"]
+        if lesson_info:
+            context_parts.append(
+                f"Lesson: {lesson_info['lesson_number']} - {lesson_info['title']}"
             )
-            if lesson_info:
+            if lesson_info["context"]:
+                context_parts.append(f"Context: {lesson_info['context']}")
+            if lesson_info["grammar_focus"]:
+                context_parts.append(f"Grammar Focus: {lesson_info['grammar_focus']}")
+            if lesson_info["vocabulary_focus"]:
                 context_parts.append(
-                    f"Lesson: {lesson_info['lesson_number']} - {lesson_info['title']}"
+                    f"Vocabulary Focus: {lesson_info['vocabulary_focus']}"
                 )
-                if lesson_info["context"]:
-                    context_parts.append(f"Context: {lesson_info['context']}")
-                if lesson_info["grammar_focus"]:
-                    context_parts.append(
-                        f"Grammar Focus: {lesson_info['grammar_focus']}"
-                    )
-                if lesson_info["vocabulary_focus"]:
-                    context_parts.append(
-                        f"Vocabulary Focus: {lesson_info['vocabulary_focus']}"
-                    )
 
         # Add block context if selected
-        if self.current_block:
-            block_info = self.execute_query(
-                "SELECT block_number, title, description, activity_type, content FROM blocks WHERE id = ?",
-                (self.current_block["id"],),
-                "one",
+        block_info = snapshot["block"]
+        if block_info:
+            context_parts.append(
+                f"Block: {block_info['block_number']} - {block_info['title']}"
             )
-            if block_info:
-                context_parts.append(
-                    f"Block: {block_info['block_number']} - {block_info['title']}"
-                )
-                if block_info["description"]:
-                    context_parts.append(f"Description: {block_info['description']}")
-                if block_info["activity_type"]:
-                    context_parts.append(
-                        f"Activity Type: {block_info['activity_type']}"
-                    )
-                if block_info["content"]:
-                    context_parts.append(f"Content: {block_info['content']}")
+            if block_info["description"]:
+                context_parts.append(f"Description: {block_info['description']}")
+            if block_info["activity_type"]:
+                context_parts.append(f"Activity Type: {block_info['activity_type']}")
+            if block_info["content"]:
+                context_parts.append(f"Content: {block_info['content']}")
 
         return "\n".join(context_parts) if context_parts else "No context available."
 
@@ -405,14 +1243,123 @@ class ESLTeacherCLI:
         else:
             self.print_error("No matching files found.")
 
-    def execute_query(self, query, params=(), fetch_mode="all"):
+    def search_curriculum(self):
+        """Full-text search across lessons, units, blocks, vocabulary and grammar rules."""
+        query = prompt("Search curriculum (e.g. phrasal verbs): ")
+        if not query.strip():
+            return
+
+        try:
+            lessons = esl_search.search_lessons(self.connection, query)
+        except sqlite3.Error as e:
+            self.print_error(f"Search error: {e}")
+            return
+
+        if not lessons:
+            self.print_error("No matching lessons found.")
+            return
+
+        table = Table(
+            show_header=True,
+            header_style=f"bold {self.theme['primary']}",
+            title=f"Lessons matching '{escape(query)}'",
+            box=ROUNDED,
+            border_style=self.theme["primary"],
+            expand=True,
+        )
+        table.add_column("ID", style="dim", justify="right")
+        table.add_column("Lesson", style=self.theme["secondary"])
+        table.add_column("Unit", style=self.theme["primary"])
+        table.add_column("Course", style=self.theme["success"])
+        table.add_column("Match", style=self.theme["secondary"], max_width=50)
+
+        for lesson in lessons:
+            table.add_row(
+                str(lesson["id"]),
+                lesson["title"],
+                f"{lesson['unit_number']}: {lesson['unit_title']}",
+                lesson["course_name"],
+                f"[{self.theme['info']}]{lesson['matched_in']}:[/{self.theme['info']}] "
+                + esl_search.highlight_markup(lesson["snippet"]),
+            )
+
+        self.console.print(table)
+
+    def search_session_notes(self):
+        """Full-text search of session notes and feedback, with optional filters."""
+        query = prompt("Search session notes (e.g. present perfect): ")
+        if not query.strip():
+            return
+
+        default_student = self.current_student["id"] if self.current_student else None
+        student_id = prompt(
+            f"Student ID (Enter for {'current student' if default_student else 'all'}, '*' for all): "
+        ).strip()
+        if student_id == "*":
+            student_id = None
+        elif student_id:
+            student_id = int(student_id)
+        else:
+            student_id = default_student
+        course_id = prompt("Course ID (Enter for all): ").strip()
+        course_id = int(course_id) if course_id else None
+        date_from = prompt("From date YYYY-MM-DD (Enter for any): ").strip() or None
+        date_to = prompt("To date YYYY-MM-DD (Enter for any): ").strip() or None
+
+        try:
+            hits = esl_search.search_session_notes(
+                self.connection,
+                query,
+                student_id=student_id,
+                course_id=course_id,
+                date_from=date_from,
+                date_to=date_to,
+            )
+        except sqlite3.Error as e:
+            self.print_error(f"Search error: {e}")
+            return
+
+        if not hits:
+            self.print_error("No matching session notes found.")
+            return
+
+        table = Table(
+            show_header=True,
+            header_style=f"bold {self.theme['primary']}",
+            title=f"Session notes matching '{escape(query)}'",
+            box=ROUNDED,
+            border_style=self.theme["primary"],
+            expand=True,
+        )
+        table.add_column("Date", style="dim")
+        table.add_column("Student", style=self.theme["secondary"])
+        table.add_column("Lesson", style=self.theme["primary"])
+        table.add_column("Block", style=self.theme["warning"])
+        table.add_column("Match", style=self.theme["secondary"], max_width=50)
+
+        for hit in hits:
+            table.add_row(
+                hit["session_date"] or "N/A",
+                hit["student_name"],
+                f"{hit['lesson_id']}: {hit['lesson_title']}",
+                hit["block_title"] if hit["source"] == "block" else "Lesson feedback",
+                esl_search.highlight_markup(hit["snippet"]),
+            )
+
+        self.console.print(table)
+
+    def execute_query(self, query, params=(), fetch_mode="all", write_through=None):
         """
         Execute SQL query and return results based on fetch_mode.
 
         Args:
             query (str): The SQL query to execute.
             params (tuple): Parameters for the query.
-            fetch_mode (str): Determines the return type ("all", "one", or None for commit).
+            fetch_mode (str): Determines the return type ("all", "one", "returning"
+                for a write whose RETURNING rows are wanted, or None for commit).
+            write_through (callable, optional): For writes to session records.
+                Called with the returned rows, it returns (entity, key, update)
+                for SessionCache.write_through, which then replaces invalidation.
 
         Returns:
             list or dict or None: Query results based on fetch_mode.
@@ -421,15 +1368,26 @@ class ESLTeacherCLI:
             sqlite3.Error: If there is an error executing the query.
         """
         try:
-            self.cursor.execute(query, params)
+            # The calling thread's cursor, so background tasks can use this too
+            cursor = self.cursor
+            cursor.execute(query, params)
 
             if fetch_mode == "all":
-                return self.cursor.fetchall()
+                return cursor.fetchall()
             elif fetch_mode == "one":
-                return self.cursor.fetchone()
+                return cursor.fetchone()
             else:
-                self.connection.commit()
-                return None
+                # RETURNING rows must be fetched before the commit
+                rows = cursor.fetchall() if fetch_mode == "returning" else None
+                cursor.connection.commit()
+                self.curriculum_cache.note_write(query, cursor.connection)
+                if write_through is None:
+                    self.session_cache.note_write(query, cursor.connection)
+                else:
+                    self.session_cache.write_through(
+                        cursor.connection, *write_through(rows)
+                    )
+                return rows
         except sqlite3.Error as e:
             self.print_error(f"Query execution error: {e}")
             self.print_error(f"Query: {query}")
@@ -463,22 +1421,28 @@ class ESLTeacherCLI:
 
     def print_footer(self):
         """Print a formatted footer"""
+        snapshot = self.get_context_snapshot()
         footer_parts = []
-        if self.current_student:
+        if snapshot["student"]:
+            footer_parts.append(
+                f"[bold {self.theme['primary']}]Student:[/bold {self.theme['primary']}] {snapshot['student']['name']}"
+            )
+        if snapshot["course"]:
             footer_parts.append(
-                f"[bold {self.theme['primary']}]Student:[/bold {self.theme['primary']}] {self.current_student['name']}"
+                f"[bold {self.theme['primary']}]Course:[/bold {self.theme['primary']}] {snapshot['course']['name']}"
             )
-        if self.current_course:
+        if snapshot["unit"]:
             footer_parts.append(
-                f"[bold {self.theme['primary']}]Course:[/bold {self.theme['primary']}] {self.current_course['name']}"
+                f"[bold {self.theme['primary']}]Unit:[/bold {self.theme['primary']}] {snapshot['unit']['unit_number']}"
             )
-        if self.current_unit:
+        if snapshot["lesson"]:
             footer_parts.append(
-                f"[bold {self.theme['primary']}]Unit:[/bold {self.theme['primary']}] {self.current_unit['unit_number']}"
+                f"[bold {self.theme['primary']}]Lesson:[/bold {self.theme['primary']}] {snapshot['lesson']['lesson_number']}"
             )
-        if self.current_lesson:
+        running = len(self.tasks.active())
+        if running:
             footer_parts.append(
-                f"[bold {self.theme['primary']}]Lesson:[/bold {self.theme['primary']}] {self.current_lesson['lesson_number']}"
+                f"[bold {self.theme['warning']}]⏳ {running} running[/bold {self.theme['warning']}]"
             )
 
         if footer_parts:
@@ -516,8 +1480,33 @@ class ESLTeacherCLI:
         )
         self.console.print(success_panel)
 
+    def print_startup_profile(self):
+        """Print how long imports and each startup step took (--startup-profile)."""
+        table = Table(
+            show_header=True,
+            header_style=f"bold {self.theme['primary']}",
+            title="Startup Profile",
+            box=ROUNDED,
+            border_style=self.theme["primary"],
+        )
+        table.add_column("Phase")
+        table.add_column("ms", justify="right")
+        table.add_row("Import esl_teacher_cli_v1_22", f"{_IMPORT_SECONDS * 1000:.1f}")
+        for step, seconds in self.startup_timings:
+            table.add_row(step, f"{seconds * 1000:.1f}")
+        table.add_row(
+            "[bold]Import start to first menu[/bold]",
+            f"[bold]{(time.perf_counter() - _IMPORT_STARTED) * 1000:.1f}[/bold]",
+        )
+        self.console.print(table)
+
     def display_splash_screen(self):
-        """Display a splash screen with ASCII art"""
+        """
+        Display a splash screen with ASCII art while the CLI warms up.
+
+        Returns:
+            bool: False if the database could not be opened.
+        """
         self.clear_screen()
         splash = """
         ███████╗███████╗██╗         ████████╗███████╗ █████╗  ██████╗██╗  ██╗███████╗██████╗ 
@@ -556,23 +1545,48 @@ class ESLTeacherCLI:
             justify="center",
         )
 
-        # Animated loading bar with rich
+        # The loading bar tracks the real warm-up steps
+        steps = [
+            ("Opening database", self.connect_db),
+            ("Priming curriculum cache", self.prime_caches),
+        ]
         with Progress(
             SpinnerColumn(),
-            TextColumn("[cyan]Loading...[/cyan]"),
+            TextColumn("[cyan]{task.description}[/cyan]"),
             BarColumn(
                 bar_width=None, complete_style="cyan", finished_style="bright_cyan"
             ),
             expand=True,
         ) as progress:
-            task = progress.add_task("[cyan]Starting up...", total=200)
+            task = progress.add_task("Starting up...", total=len(steps))
+            for description, step in steps:
+                progress.update(task, description=description)
+                started = time.perf_counter()
+                ok = step()
+                self.startup_timings.append(
+                    (description, time.perf_counter() - started)
+                )
+                if ok is False:
+                    return False
+                progress.advance(task)
+        return True
 
-            for i in range(101):
-                progress.update(task, completed=i)
-                time.sleep(0.02)
+    def prime_caches(self):
+        """Load every course and its units into the curriculum cache."""
+        try:
+            for course in self.connection.execute("SELECT id FROM courses"):
+                self.curriculum_cache.row(self.connection, "courses", course["id"])
+                self.curriculum_cache.rows(
+                    self.connection, "units", "course_id", course["id"], "unit_number"
+                )
+            return True
+        except sqlite3.Error as e:
+            self.print_error(f"Could not prime caches: {e}")
+            return True  # A cold cache is slower, not broken
 
     def print_breadcrumbs(self):
         """Print breadcrumb navigation showing the current path"""
+        snapshot = self.get_context_snapshot()
         breadcrumb_parts = []
 
         # Always start with Home
@@ -581,47 +1595,47 @@ class ESLTeacherCLI:
         )
 
         # Add subsequent levels based on what's selected
-        if self.current_student:
+        if snapshot["student"]:
             breadcrumb_parts.append((" > ", None))
             breadcrumb_parts.append(
                 (
-                    f"[bold cyan]Student:[/bold cyan] {self.current_student['name']}",
+                    f"[bold cyan]Student:[/bold cyan] {snapshot['student']['name']}",
                     "student",
                 )
             )
 
-        if self.current_course:
+        if snapshot["course"]:
             breadcrumb_parts.append((" > ", None))
             breadcrumb_parts.append(
                 (
-                    f"[bold cyan]Course:[/bold cyan] {self.current_course['name']}",
+                    f"[bold cyan]Course:[/bold cyan] {snapshot['course']['name']}",
                     "course",
                 )
             )
 
-        if self.current_unit:
+        if snapshot["unit"]:
             breadcrumb_parts.append((" > ", None))
             breadcrumb_parts.append(
                 (
-                    f"[bold cyan]Unit:[/bold cyan] {self.current_unit['unit_number']}: {self.current_unit['title']}",
+                    f"[bold cyan]Unit:[/bold cyan] {snapshot['unit']['unit_number']}: {snapshot['unit']['title']}",
                     "unit",
                 )
             )
 
-        if self.current_lesson:
+        if snapshot["lesson"]:
             breadcrumb_parts.append((" > ", None))
             breadcrumb_parts.append(
                 (
-                    f"[bold cyan]Lesson:[/bold cyan] {self.current_lesson['lesson_number']}: {self.current_lesson['title']}",
+                    f"[bold cyan]Lesson:[/bold cyan] {snapshot['lesson']['lesson_number']}: {snapshot['lesson']['title']}",
                     "lesson",
                 )
             )
 
-        if self.current_block:
+        if snapshot["block"]:
             breadcrumb_parts.append((" > ", None))
             breadcrumb_parts.append(
                 (
-                    f"[bold cyan]Block:[/bold cyan] {self.current_block['block_number']}: {self.current_block['title']}",
+                    f"[bold cyan]Block:[/bold cyan] {snapshot['block']['block_number']}: {snapshot['block']['title']}",
                     "block",
                 )
             )
@@ -680,8 +1694,9 @@ class ESLTeacherCLI:
             self.console.print("7. List Available Courses")
             self.console.print("8. List Students by Course")
             self.console.print("9. Back to Main Menu")
+            self.console.print("10. Remove Empty Session Records")
 
-            choice = input("\nEnter your choice (1-9): ").strip()
+            choice = input("\nEnter your choice (1-10): ").strip()
 
             if choice == "1":
                 # Add new student
@@ -787,6 +1802,18 @@ class ESLTeacherCLI:
                 # Return to main menu
                 break
 
+            elif choice == "10":
+                # Clean up records left by browsing in older versions. Journaled
+                # notes go in first, and records still holding some are kept,
+                # so a note saved on a new lesson record isn't orphaned.
+                self.flush_notes()
+                result = self.student_manager.remove_empty_session_records(
+                    self.journal.pending_lesson_records() if self.journal else ()
+                )
+                self.console.print(f"\n{result}")
+                # The selected lesson's record may have been one of them
+                self.reload_lesson_record()
+
             else:
                 self.print_error("Invalid choice. Please try again.")
 
@@ -851,6 +1878,8 @@ class ESLTeacherCLI:
         self.print_success(
             f"Selected student: {self.current_student['name']} (Course: {self.current_course['name']})"
         )
+        # Next is almost always the unit list
+        self.prefetch((self.units_for_course, self.current_course["id"]))
         return True
 
     def list_units(self):
@@ -861,13 +1890,7 @@ class ESLTeacherCLI:
 
         self.print_header(f"UNITS FOR {self.current_course['name'].upper()}")
 
-        query = """
-        SELECT id, unit_number, title, description
-        FROM units
-        WHERE course_id = ?
-        ORDER BY unit_number
-        """
-        units = self.execute_query(query, (self.current_course["id"],))
+        units = self.units_for_course(self.current_course["id"])
 
         if not units:
             self.console.print(
@@ -904,8 +1927,7 @@ class ESLTeacherCLI:
 
     def select_unit(self, unit_id):
         """Select a unit to work with"""
-        query = "SELECT * FROM units WHERE id = ?"
-        unit = self.execute_query(query, (unit_id,), "one")
+        unit = self.curriculum_cache.row(self.connection, "units", unit_id)
 
         if not unit:
             self.print_error(f"No unit found with ID {unit_id}")
@@ -915,6 +1937,11 @@ class ESLTeacherCLI:
         self.print_success(
             f"Selected unit: {self.current_unit['title']} (Unit {self.current_unit['unit_number']})"
         )
+        # Next is almost always the lesson list
+        loads = [(self.lessons_for_unit, unit_id)]
+        if self.current_student:
+            loads.append((self.started_lesson_ids, self.current_student["id"], unit_id))
+        self.prefetch(*loads)
         return True
 
     def list_lessons(self):
@@ -927,17 +1954,14 @@ class ESLTeacherCLI:
             f"LESSONS FOR UNIT {self.current_unit['unit_number']}: {self.current_unit['title'].upper()}"
         )
 
-        query = """
-        SELECT l.id, l.lesson_number, l.title, l.grammar_focus, l.vocabulary_focus,
-               CASE WHEN lr.id IS NOT NULL THEN 'Completed' ELSE 'Not Started' END as status
-        FROM lessons l
-        LEFT JOIN lesson_records lr ON l.id = lr.lesson_id AND lr.student_id = ?
-        WHERE l.unit_id = ?
-        ORDER BY l.lesson_number
-        """
-        lessons = self.execute_query(
-            query, (self.current_student["id"], self.current_unit["id"])
+        # Both usually prefetched by select_unit
+        started = self.started_lesson_ids(
+            self.current_student["id"], self.current_unit["id"]
         )
+        lessons = [
+            dict(lesson, status="Completed" if lesson["id"] in started else "Not Started")
+            for lesson in self.lessons_for_unit(self.current_unit["id"])
+        ]
 
         if not lessons:
             self.console.print(
@@ -994,8 +2018,7 @@ class ESLTeacherCLI:
 
     def select_lesson(self, lesson_id):
         """Select a lesson to work with"""
-        query = "SELECT * FROM lessons WHERE id = ?"
-        lesson = self.execute_query(query, (lesson_id,), "one")
+        lesson = self.curriculum_cache.row(self.connection, "lessons", lesson_id)
 
         if not lesson:
             self.print_error(f"No lesson found with ID {lesson_id}")
@@ -1018,25 +2041,17 @@ class ESLTeacherCLI:
                 f"Selected lesson: {self.current_lesson['title']} (Status: Previously started)"
             )
         else:
-            # Create a new lesson_record
-            query = """
-            INSERT INTO lesson_records (student_id, lesson_id)
-            VALUES (?, ?)
-            """
-            self.execute_query(query, (self.current_student["id"], lesson_id), "commit")
-
-            # Get the newly created record
-            query = (
-                "SELECT * FROM lesson_records WHERE student_id = ? AND lesson_id = ?"
-            )
-            lesson_record = self.execute_query(
-                query, (self.current_student["id"], lesson_id), "one"
-            )
-            self.current_lesson_record = dict(lesson_record)
+            # Browsing writes nothing; ensure_lesson_record creates it on the first save
+            self.current_lesson_record = None
             self.print_success(
                 f"Selected lesson: {self.current_lesson['title']} (Status: New session)"
             )
 
+        # Next is usually the block list or the lesson details
+        loads = [(self.blocks_for_lesson, lesson_id), (self.lesson_materials, lesson_id)]
+        if self.current_lesson_record:
+            loads.append((self.block_records_for, self.current_lesson_record["id"]))
+        self.prefetch(*loads)
         return True
 
     def display_lesson_details(self):
@@ -1045,24 +2060,30 @@ class ESLTeacherCLI:
             self.print_error("No lesson selected. Please select a lesson first.")
             return
 
-        self.print_header(
-            f"LESSON {self.current_lesson['lesson_number']}: {self.current_lesson['title']}"
-        )
+        lesson = self.current_lesson
+
+        def load(task):
+            # Usually already prefetched by select_lesson
+            return self.lesson_materials(lesson["id"])
 
-        # Get grammar rules
-        query = "SELECT * FROM grammar_rules WHERE lesson_id = ?"
-        grammar_rules = self.execute_query(query, (self.current_lesson["id"],))
+        def show(task):
+            if task.detached:
+                # The cache is warm now, so the next request for the details is instant
+                self.print_success(
+                    f"Details of lesson {lesson['lesson_number']} are loaded; "
+                    "choose 7 to view them."
+                )
+            else:
+                self.render_lesson_details(lesson, *task.result)
 
-        # Get vocabulary
-        query = "SELECT * FROM vocabulary WHERE lesson_id = ?"
-        vocabulary = self.execute_query(query, (self.current_lesson["id"],))
+        self.run_task(f"Load lesson {lesson['lesson_number']} details", load, on_done=show)
 
-        # Get resources
-        query = "SELECT * FROM resources WHERE lesson_id = ?"
-        resources = self.execute_query(query, (self.current_lesson["id"],))
+    def render_lesson_details(self, lesson, grammar_rules, vocabulary, resources):
+        """Print a lesson's context, focus, grammar rules, vocabulary and resources."""
+        self.print_header(f"LESSON {lesson['lesson_number']}: {lesson['title']}")
 
         # Display lesson info in rich panels
-        context = self.current_lesson["context"] or "No context provided."
+        context = lesson["context"] or "No context provided."
         context_panel = Panel(
             context,
             title=f"[bold {self.theme['primary']}]📝 CONTEXT[/bold {self.theme['primary']}]",
@@ -1074,7 +2095,7 @@ class ESLTeacherCLI:
         self.console.print(context_panel)
 
         grammar_focus = (
-            self.current_lesson["grammar_focus"] or "No grammar focus specified."
+            lesson["grammar_focus"] or "No grammar focus specified."
         )
         grammar_panel = Panel(
             grammar_focus,
@@ -1087,7 +2108,7 @@ class ESLTeacherCLI:
         self.console.print(grammar_panel)
 
         vocab_focus = (
-            self.current_lesson["vocabulary_focus"] or "No vocabulary focus specified."
+            lesson["vocabulary_focus"] or "No vocabulary focus specified."
         )
         vocab_panel = Panel(
             vocab_focus,
@@ -1185,17 +2206,12 @@ class ESLTeacherCLI:
             f"BLOCKS FOR LESSON {self.current_lesson['lesson_number']}: {self.current_lesson['title'].upper()}"
         )
 
-        query = """
-        SELECT b.id, b.block_number, b.title, b.activity_type,
-            CASE WHEN br.id IS NOT NULL THEN 'Completed' ELSE 'Not Started' END as status
-        FROM blocks b
-        LEFT JOIN block_records br ON b.id = br.block_id AND br.lesson_record_id = ?
-        WHERE b.lesson_id = ?
-        ORDER BY b.block_number
-        """
-        blocks = self.execute_query(
-            query, (self.current_lesson_record["id"], self.current_lesson["id"])
-        )
+        # Both usually prefetched by select_lesson
+        records = self.current_block_records()
+        blocks = [
+            dict(block, status="Completed" if block["id"] in records else "Not Started")
+            for block in self.blocks_for_lesson(self.current_lesson["id"])
+        ]
 
         if not blocks:
             self.console.print(
@@ -1261,8 +2277,7 @@ class ESLTeacherCLI:
 
     def select_block(self, block_id):
         """Select a block to work with"""
-        query = "SELECT * FROM blocks WHERE id = ?"
-        block = self.execute_query(query, (block_id,), "one")
+        block = self.curriculum_cache.row(self.connection, "blocks", block_id)
 
         if not block:
             self.print_error(f"No block found with ID {block_id}")
@@ -1270,28 +2285,12 @@ class ESLTeacherCLI:
 
         self.current_block = dict(block)
 
-        # Check if there's an existing block record
-        query = """
-        SELECT * FROM block_records 
-        WHERE lesson_record_id = ? AND block_id = ?
-        """
-        block_record = self.execute_query(
-            query, (self.current_lesson_record["id"], block_id), "one"
-        )
-
-        if not block_record:
-            # Create a new block_record
-            query = """
-            INSERT INTO block_records (lesson_record_id, block_id, created_at)
-            VALUES (?, ?, datetime('now'))
-            """
-            self.execute_query(
-                query, (self.current_lesson_record["id"], block_id), "commit"
-            )
-
         self.print_success(
             f"Selected block: {self.current_block['title']} (Block {self.current_block['block_number']})"
         )
+        # Next is almost always the block details
+        if self.current_lesson_record:
+            self.prefetch((self.block_records_for, self.current_lesson_record["id"]))
         return True
 
     def display_block_details(self):
@@ -1305,14 +2304,9 @@ class ESLTeacherCLI:
                 f"BLOCK {self.current_block['block_number']}: {self.current_block['title']}"
             )
 
-            query = """
-            SELECT * FROM block_records
-            WHERE lesson_record_id = ? AND block_id = ?
-            """
-            block_record = self.execute_query(
-                query,
-                (self.current_lesson_record["id"], self.current_block["id"]),
-                "one",
+            # Usually prefetched by select_block. A block without notes has no record yet.
+            block_record = self.current_block_records().get(
+                self.current_block["id"], self.EMPTY_BLOCK_RECORD
             )
 
             # Display activity type with icon
@@ -1497,93 +2491,224 @@ class ESLTeacherCLI:
             self.print_footer()
 
     def update_block_notes(
-        self, student_speech_notes=None, teacher_notes=None, student_questions=None
+        self,
+        student_speech_notes=None,
+        teacher_notes=None,
+        student_questions=None,
+        lesson_record_id=None,
+        block_id=None,
     ):
-        """Update notes for the current block"""
-        if not self.current_block:
-            self.print_error("No block selected. Please select a block first.")
-            return False
-
-        query = """
-        SELECT * FROM block_records
-        WHERE lesson_record_id = ? AND block_id = ?
         """
-        block_record = self.execute_query(
-            query, (self.current_lesson_record["id"], self.current_block["id"]), "one"
-        )
-
-        if not block_record:
-            self.print_error("Block record not found. Unable to update notes.")
-            return False
-
-        # Prepare update fields
-        update_parts = []
-        params = []
+        Update notes for the current block, or for the given lesson record and block.
 
-        if student_speech_notes is not None:
-            update_parts.append("student_speech_notes = ?")
-            params.append(student_speech_notes)
+        lesson_record_id and block_id let results of background tasks be saved
+        to the block they were made for after the teacher has moved on.
 
-        if teacher_notes is not None:
-            update_parts.append("teacher_notes = ?")
-            params.append(teacher_notes)
-
-        if student_questions is not None:
-            update_parts.append("student_questions = ?")
-            params.append(student_questions)
-
-        if not update_parts:
+        Edits are saved to the note journal and reach block_records with its
+        next flush. Either way they only apply to the version of the block
+        record that was shown: if its modified_at has changed since, the
+        journal holds them back for handle_note_conflicts, and a direct save
+        writes nothing and returns False.
+        """
+        if block_id is None:
+            if not self.current_block:
+                self.print_error("No block selected. Please select a block first.")
+                return False
+            block_id = self.current_block["id"]
+
+        # Collect the fields to save
+        fields = {
+            name: value
+            for name, value in (
+                ("student_speech_notes", student_speech_notes),
+                ("teacher_notes", teacher_notes),
+                ("student_questions", student_questions),
+            )
+            if value is not None
+        }
+        if not fields:
             self.print_error("No updates provided.")
             return False
 
-        # Add modified timestamp
-        update_parts.append("modified_at = datetime('now')")
+        if lesson_record_id is None:
+            # The lesson record is only created once something is saved
+            lesson_record = self.ensure_lesson_record()
+            if not lesson_record:
+                return False
+            lesson_record_id = lesson_record["id"]
+
+        # Loaded once per lesson and kept current by the write-through below,
+        # so an edit costs no reads
+        block_record = self.block_records_for(lesson_record_id).get(block_id)
+
+        if self.journal:
+            try:
+                # On local disk at once; the journal writes it to block_records in batches
+                self.journal.record(
+                    lesson_record_id,
+                    block_id,
+                    fields,
+                    block_record["modified_at"] if block_record else None,
+                    existed=bool(block_record and block_record["id"]),
+                )
+            except OSError as e:
+                self.print_error(f"Could not write to the note journal, saving directly: {e}")
+            else:
+                self.session_cache.write_through(
+                    self.connection,
+                    "block_records",
+                    lesson_record_id,
+                    lambda records: None
+                    if records is None
+                    else self.journal.overlay(lesson_record_id, records),
+                )
+                self.print_success("Notes updated successfully.")
+                return True
+
+        if block_record and block_record["id"]:
+            # Optimistic check: only update the version this screen has shown
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            query = f"""
+            UPDATE block_records
+            SET {assignments}, modified_at = {MODIFIED_AT_NOW}
+            WHERE id = ? AND modified_at IS ?
+            RETURNING *
+            """
+            params = [*fields.values(), block_record["id"], block_record["modified_at"]]
+        else:
+            columns = ", ".join(fields)
+            placeholders = ", ".join("?" for _ in fields)
+            query = f"""
+            INSERT INTO block_records (lesson_record_id, block_id, {columns}, modified_at)
+            VALUES (?, ?, {placeholders}, {MODIFIED_AT_NOW})
+            ON CONFLICT(lesson_record_id, block_id) DO NOTHING
+            RETURNING *
+            """
+            params = [lesson_record_id, block_id, *fields.values()]
 
-        # Complete the parameters
-        params.extend([self.current_lesson_record["id"], self.current_block["id"]])
+        def write_through(rows):
+            def update(records):
+                if records is None or not rows:
+                    # Not cached, or stale: the next lookup reloads
+                    return None
+                return {**records, block_id: dict(rows[0])}
 
-        query = f"""
-        UPDATE block_records
-        SET {", ".join(update_parts)}
-        WHERE lesson_record_id = ? AND block_id = ?
-        """
+            return "block_records", lesson_record_id, update
 
-        self.execute_query(query, params, "commit")
+        rows = self.execute_query(query, params, "returning", write_through=write_through)
+        if not rows:
+            self.print_error(
+                "These notes were changed elsewhere since they were shown. "
+                "Nothing was saved; please review the latest version and try again."
+            )
+            return False
         self.print_success("Notes updated successfully.")
         return True
 
     def complete_lesson(self, score=None, feedback=None):
-        """Mark the current lesson as completed"""
+        """Mark the current lesson as completed, creating its record if needed"""
         if not self.current_lesson:
             self.print_error("No lesson selected. Please select a lesson first.")
             return False
 
-        update_parts = ["completion_date = date('now')"]
-        params = []
+        # The end of the lesson is a good moment to get its notes into the database
+        self.flush_notes()
 
-        if score is not None:
-            update_parts.append("score = ?")
-            params.append(score)
-
-        if feedback is not None:
-            update_parts.append("feedback = ?")
-            params.append(feedback)
-
-        # Complete the parameters
-        params.append(self.current_lesson_record["id"])
-
-        query = f"""
-        UPDATE lesson_records
-        SET {", ".join(update_parts)}
-        WHERE id = ?
+        # Score and feedback left out keep their earlier values
+        query = """
+        INSERT INTO lesson_records (student_id, lesson_id, completion_date, score, feedback)
+        VALUES (?, ?, date('now'), ?, ?)
+        ON CONFLICT(student_id, lesson_id) DO UPDATE
+        SET completion_date = excluded.completion_date,
+            score = coalesce(excluded.score, score),
+            feedback = coalesce(excluded.feedback, feedback)
+        RETURNING *
         """
-
-        self.execute_query(query, params, "commit")
+        rows = self.execute_query(
+            query,
+            (self.current_student["id"], self.current_lesson["id"], score, feedback),
+            "returning",
+        )
+        self.current_lesson_record = dict(rows[0])
         self.print_success(
             f"Lesson '{self.current_lesson['title']}' marked as completed."
         )
         return True
 
+    def review_flashcards(self, item_type=None):
+        """
+        Flashcard review of the current student's due vocabulary and grammar.
+
+        Cards come from esl_review, most overdue first. Each answer is graded
+        and reschedules the card.
+        """
+        if not self.current_student:
+            self.print_error("No student selected. Please select a student first.")
+            return 0
+
+        student_id = self.current_student["id"]
+        try:
+            cards = esl_review.due_items(self.connection, student_id, item_type)
+            due, queued = esl_review.review_counts(self.connection, student_id)
+        except sqlite3.Error as e:
+            self.print_error(f"Could not load review cards: {e}")
+            return 0
+
+        self.print_header("FLASHCARD REVIEW")
+        if not cards:
+            self.print_success(
+                f"Nothing due for {self.current_student['name']} "
+                f"({queued} cards in the queue)."
+            )
+            return 0
+
+        self.console.print(
+            f"{due} cards due, reviewing {len(cards)}. Enter 'q' to stop.",
+            style=self.theme["secondary"],
+        )
+        grades = "  ".join(
+            f"[{grade}] {label}" for grade, label in esl_review.GRADES.items()
+        )
+        reviewed = 0
+        for number, card in enumerate(cards, 1):
+            kind = "Word" if card["item_type"] == "vocabulary" else "Grammar rule"
+            self.console.print(
+                Panel(
+                    escape(card["prompt"] or "(deleted item)"),
+                    title=f"{kind} {number}/{len(cards)}",
+                    border_style=self.theme["primary"],
+                    box=ROUNDED,
+                )
+            )
+            if input("Press Enter to show the answer, or 'q' to stop: ").strip().lower() == "q":
+                break
+            answer = "\n".join(
+                escape(text)
+                for text in (card["answer"], card["example"] and f"Example: {card['example']}")
+                if text
+            )
+            self.console.print(
+                Panel(
+                    answer or "(no definition or example)",
+                    border_style=self.theme["secondary"],
+                    box=ROUNDED,
+                )
+            )
+            grade = input(f"{grades}  [q] Stop: ").strip().lower()
+            while grade != "q" and not (grade.isdigit() and int(grade) in esl_review.GRADES):
+                grade = input("Enter a grade from 0 to 3, or 'q': ").strip().lower()
+            if grade == "q":
+                break
+            try:
+                esl_review.record_review(self.connection, card["id"], int(grade))
+            except sqlite3.Error as e:
+                self.print_error(f"Could not save the review: {e}")
+                break
+            reviewed += 1
+
+        self.print_success(f"Reviewed {reviewed} card(s).")
+        return reviewed
+
     def display_menu(self):
         """Display the main menu with rich formatting"""
         self.print_header("MAIN MENU")
@@ -1619,6 +2744,13 @@ class ESLTeacherCLI:
             ("17", "🤖 Gemini ESL Assistant", True),  # New Gemini option
             ("18", "🎨 Change Theme", True),  # Add this line
             ("19", "➕ Manage Students", True),  # New option for adding students
+            (
+                "20",
+                "🧠 Batch Generate Teacher Notes",
+                self.current_lesson is not None,
+            ),
+            ("21", "⏳ Background Tasks", bool(self.tasks.active())),
+            ("22", "🃏 Review Flashcards", self.current_student is not None),
             ("0", "🚪 Exit", True),
         ]
 
@@ -1658,10 +2790,16 @@ class ESLTeacherCLI:
                 "4. Search in /assets", style=f"bold {self.theme['primary']}"
             )
             self.console.print(
-                "5. Back to Main Menu", style=f"bold {self.theme['primary']}"
+                "5. Search Curriculum", style=f"bold {self.theme['primary']}"
+            )
+            self.console.print(
+                "6. Search Session Notes", style=f"bold {self.theme['primary']}"
+            )
+            self.console.print(
+                "7. Back to Main Menu", style=f"bold {self.theme['primary']}"
             )
 
-            choice = input("\nChoose an option (1-5): ").strip()
+            choice = input("\nChoose an option (1-7): ").strip()
 
             if choice == "1":
                 self.google_search("Google Search")
@@ -1672,6 +2810,10 @@ class ESLTeacherCLI:
             elif choice == "4":
                 self.search_local_assets()
             elif choice == "5":
+                self.search_curriculum()
+            elif choice == "6":
+                self.search_session_notes()
+            elif choice == "7":
                 break  # Return to the main menu
             else:
                 self.print_error("Invalid choice. Try again!")
@@ -1690,7 +2832,7 @@ class ESLTeacherCLI:
 
         try:
             # Initialize the model
-            model = genai.GenerativeModel("gemini-1.5-flash")
+            model = esl_gemini.create_model(self.gemini_backend)
 
             # Context based on current selection
             context = self.get_current_context()
@@ -1706,19 +2848,18 @@ class ESLTeacherCLI:
                 )
             )
 
-            if context:
+            # Resume a saved session or start a new one. History is bounded either way.
+            history = self.choose_chat_session(model)
+            if history.preamble:
                 self.console.print(
                     Panel(
-                        context,
+                        history.preamble,
                         box=ROUNDED,
                         border_style=self.theme["primary"],
                         title="Current Context",
                     )
                 )
 
-            # Start chat session
-            chat = model.start_chat(history=[])
-
             while True:
                 user_input = prompt(
                     f"\n[ESL Assistant] What would you like help with? > "
@@ -1727,6 +2868,13 @@ class ESLTeacherCLI:
                 if user_input.lower() in ["exit", "quit", "back"]:
                     break
 
+                if self.gemini_stream:
+                    stream = history.stream_reply(model, user_input)
+                    self.render_stream(stream, "Gemini's Response")
+                    if stream.completed:
+                        self.save_chat_session(history)
+                    continue
+
                 with Progress(
                     SpinnerColumn(),
                     TextColumn(
@@ -1737,18 +2885,13 @@ class ESLTeacherCLI:
                     task = progress.add_task(
                         f"[{self.theme['primary']}]Generating response...", total=None
                     )
-
-                    if context and not chat.history:  # First message, add context
-                        full_prompt = f"{context}\n\nTeacher's question: {user_input}"
-                    else:
-                        full_prompt = user_input
-
-                    response = chat.send_message(full_prompt)
+                    response_text = history.reply(model, user_input)
+                self.save_chat_session(history)
 
                 # Display the response
                 self.console.print(
                     Panel(
-                        response.text,
+                        response_text,
                         box=ROUNDED,
                         border_style=self.theme["success"],
                         title="Gemini's Response",
@@ -1760,6 +2903,71 @@ class ESLTeacherCLI:
 
         input("\nPress Enter to return to main menu...")
 
+    def choose_chat_session(self, model):
+        """
+        Offer to resume one of the current student's recent assistant sessions.
+
+        Returns:
+            esl_chat.ChatHistory: The resumed session, or a new one whose
+            preamble is the current context.
+        """
+        summarizer = esl_chat.model_summarizer(model, cache=self.gemini_cache)
+        student_id = self.current_student["id"] if self.current_student else None
+        sessions = esl_chat.recent_sessions(self.connection, student_id)
+        if sessions:
+            table = Table(
+                show_header=True,
+                header_style=f"bold {self.theme['primary']}",
+                title="Recent Assistant Sessions",
+                box=ROUNDED,
+                border_style=self.theme["primary"],
+            )
+            table.add_column("ID", justify="right")
+            table.add_column("Title")
+            table.add_column("Turns", justify="right")
+            table.add_column("Last Used")
+            for session in sessions:
+                table.add_row(
+                    str(session["id"]),
+                    escape(session["title"] or ""),
+                    str(max(session["saved_turns"], session["summarized_turns"])),
+                    str(session["updated_at"]),
+                )
+            self.console.print(table)
+            choice = input("Resume session ID (or press Enter for a new session): ")
+            if choice.strip().isdigit():
+                history = esl_chat.load_session(
+                    self.connection, int(choice), summarizer=summarizer
+                )
+                if history:
+                    return history
+                self.print_error("Session not found. Starting a new one.")
+
+        context = self.get_current_context()
+        return esl_chat.ChatHistory(
+            preamble="" if context == "No context available." else context,
+            summarizer=summarizer,
+        )
+
+    def save_chat_session(self, history):
+        """Persist the assistant session after a turn, titled after the selection."""
+        snapshot = self.get_context_snapshot()
+        title = " / ".join(
+            str(snapshot[level][field])
+            for level, field in (("student", "name"), ("lesson", "title"))
+            if snapshot[level]
+        )
+        try:
+            esl_chat.save_session(
+                self.connection,
+                history,
+                student_id=snapshot["student"]["id"] if snapshot["student"] else None,
+                lesson_id=snapshot["lesson"]["id"] if snapshot["lesson"] else None,
+                title=title or "General",
+            )
+        except sqlite3.Error as e:
+            self.print_error(f"Could not save the assistant session: {e}")
+
     def run_cli(self):
         """Run the interactive CLI loop"""
         parser = argparse.ArgumentParser(description="ESL Teacher CLI Tool")
@@ -1774,19 +2982,56 @@ class ESLTeacherCLI:
             default="default",
             help="Choose a theme (default, dark, etc.)",
         )
+        parser.add_argument(
+            "--no-gemini-cache",
+            action="store_true",
+            help="Always call Gemini instead of reusing cached responses",
+        )
+        parser.add_argument(
+            "--no-stream",
+            action="store_true",
+            help="Wait for complete Gemini responses instead of streaming them",
+        )
+        parser.add_argument(
+            "--gemini-backend",
+            choices=esl_gemini.BACKENDS,
+            help="Use 'stub' for offline testing (default: gemini, or $ESL_GEMINI_BACKEND)",
+        )
+        parser.add_argument(
+            "--no-prefetch",
+            action="store_true",
+            help="Don't load the likely next screen's data in the background",
+        )
+        parser.add_argument(
+            "--notes-journal",
+            help="File note edits are saved to before the database "
+            "(default: under ~/.esl_teacher/journal)",
+        )
+        parser.add_argument(
+            "--startup-profile",
+            action="store_true",
+            help="Print an import and init time breakdown under the first menu",
+        )
         args = parser.parse_args()
 
         # Initialize the CLI with the chosen theme
-        cli = ESLTeacherCLI(theme=args.theme)
+        started = time.perf_counter()
+        cli = ESLTeacherCLI(
+            theme=args.theme,
+            gemini_cache=not args.no_gemini_cache,
+            gemini_backend=args.gemini_backend,
+            gemini_stream=not args.no_stream,
+            prefetch=not args.no_prefetch,
+            journal_path=args.notes_journal,
+        )
+        cli.startup_timings.append(("Create ESLTeacherCLI", time.perf_counter() - started))
 
-        if not cli.connect_db():
+        # Splash screen; its loading bar opens the database and primes the caches
+        if not cli.display_splash_screen():
             cli.print_error("Failed to connect to the database. Exiting...")
             sys.exit(1)
 
         try:
-            # Display splash screen
-            cli.display_splash_screen()
-            time.sleep(1)  # Pause for effect
 
             # Initialize with command line arguments if provided
             if args.student:
@@ -1796,8 +3041,20 @@ class ESLTeacherCLI:
                     if args.lesson:
                         cli.select_lesson(args.lesson)
 
+            first_menu = True
             while True:
+                started = time.perf_counter()
                 cli.display_menu()
+                if first_menu:
+                    first_menu = False
+                    cli.startup_timings.append(
+                        ("Render first menu", time.perf_counter() - started)
+                    )
+                    if args.startup_profile:
+                        cli.print_startup_profile()
+                # Results of Gemini requests and other tasks left running in the background
+                cli.handle_finished_tasks()
+                cli.handle_note_conflicts()
                 choice = input("\nEnter your choice: ")
 
                 if choice == "0":
@@ -1873,6 +3130,25 @@ class ESLTeacherCLI:
                             f"- {theme_name}", style=self.theme["secondary"]
                         )
 
+                elif choice == "20" and cli.current_lesson:
+                    scope = (
+                        input("Generate notes for the lesson, unit or course? [lesson]: ")
+                        .strip()
+                        .lower()
+                        or "lesson"
+                    )
+                    cli.batch_generate_teacher_notes(scope)
+                elif choice == "21":
+                    cli.show_background_tasks()
+                elif choice == "22" and cli.current_student:
+                    kind = (
+                        input("Review [v]ocabulary, [g]rammar or [b]oth? [b]: ")
+                        .strip()
+                        .lower()
+                    )
+                    cli.review_flashcards(
+                        {"v": "vocabulary", "g": "grammar"}.get(kind[:1])
+                    )
                 elif choice == "19":  # New option for adding students
                     cli.manage_students()
                     # Prompt the user to select a theme
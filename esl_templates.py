@@ -0,0 +1,348 @@
+"""
+Compiled Markdown templates for homework_master.
+
+A template is an ordered list of sections. Each section is plain text with
+str.format-style {fields}, compiled once into literal and field parts and
+rendered into a list buffer that is joined at the end. Section options:
+
+- scope: "lesson" sections only use lesson data (vocabulary, grammar rules,
+  blocks, resources), so their rendered text is the same for every student
+  and is cached per lesson. "student" sections are rendered every time.
+- items: name of a list in the context. The section is skipped when the list
+  is empty; otherwise "text" is rendered once, "item" for each entry and
+  then "footer".
+- variants: item texts chosen by the lowercased value of variant_field,
+  e.g. a different practice recommendation per activity type.
+- when: skip the section unless this field is set.
+
+A line starting with "?" is dropped when one of its fields is empty, for
+optional lines such as examples.
+
+The built-in "default" template reproduces the standard homework layout.
+JSON files in HOMEWORK_TEMPLATE_DIR add or replace templates: a file named
+course_<id>.json is used for that course's students, any other name can be
+chosen explicitly. Print a template to start from with:
+    python esl_templates.py [name]
+"""
+
+import hashlib
+import json
+import logging
+import os
+import string
+import sys
+import threading
+
+HOMEWORK_TEMPLATE_DIR = "homework_templates"
+DEFAULT_TEMPLATE = "default"
+
+_FORMATTER = string.Formatter()
+
+DEFAULT_HOMEWORK_SECTIONS = [
+    {
+        "name": "title",
+        "scope": "student",
+        "text": "# 📚 Personalized Homework for {student_name}\n\n"
+        "**Course:** {course_name}\n"
+        "**Lesson:** {lesson_title} (Unit {unit_number}: {unit_title})\n"
+        "**Date:** {date}\n\n",
+    },
+    {
+        "name": "overview",
+        "when": "context",
+        "text": "## 🎯 Lesson Overview\n{context}\n\n",
+    },
+    {
+        "name": "feedback",
+        "scope": "student",
+        "when": "feedback",
+        "text": "## 📝 Feedback from Your Last Class\n{feedback}\n\n",
+    },
+    {
+        "name": "speech_notes",
+        "scope": "student",
+        "items": "speech_notes",
+        "text": "## 🗣️ Your Speaking Notes\n",
+        "item": "### Activity: {block_title}\n{student_speech_notes}\n\n"
+        "**Practice recommendation:** Review the topic and prepare questions for the next class.\n\n",
+        "variant_field": "activity_type",
+        "variants": {
+            "speaking": "### Activity: {block_title}\n{student_speech_notes}\n\n"
+            "**Practice recommendation:** Record yourself speaking about this topic for 3-5 minutes and listen for areas to improve.\n\n",
+            "writing": "### Activity: {block_title}\n{student_speech_notes}\n\n"
+            "**Practice recommendation:** Write a short paragraph expanding on this topic.\n\n",
+            "reading": "### Activity: {block_title}\n{student_speech_notes}\n\n"
+            "**Practice recommendation:** Read additional materials on this topic and summarize them.\n\n",
+            "listening": "### Activity: {block_title}\n{student_speech_notes}\n\n"
+            "**Practice recommendation:** Listen to a related audio resource and take notes.\n\n",
+        },
+    },
+    {
+        "name": "vocabulary",
+        "items": "vocabulary",
+        "text": "## 📘 Vocabulary Review\n"
+        "Practice using these words and phrases from our lesson:\n\n",
+        "item": "- **{word_or_phrase}**: {definition}\n?  Example: *{example_usage}*\n",
+        "footer": "\n",
+    },
+    {
+        "name": "review_words",
+        "scope": "student",
+        "items": "review_words",
+        "text": "?{vocabulary_heading}\n"
+        "Time to revisit these words from earlier lessons:\n\n",
+        "item": "- **{prompt}**: {answer}\n?  Example: *{example}*\n",
+        "footer": "\n",
+    },
+    {
+        "name": "grammar",
+        "items": "grammar_rules",
+        "text": "## 📖 Grammar Practice\n"
+        "Based on our focus on {grammar_focus}, practice these rules:\n\n",
+        "item": "- **Rule**: {rule}\n?  Example: *{example}*\n",
+        "footer": "\nCreate 3-5 original sentences using these grammar rules.\n\n",
+    },
+    {
+        "name": "blocks",
+        "items": "blocks",
+        "text": "## 📋 Structured Activities\n",
+        "item": "### 🏡 {title} ({activity_type})\n{description}\n\n**Task:** {content}\n\n",
+    },
+    {
+        "name": "resources",
+        "items": "resources",
+        "text": "## 🔗 Additional Resources\n"
+        "Use these resources to further practice what we've learned:\n\n",
+        "item": "- **{description}** ({resource_type}): {url_or_path}\n",
+        "footer": "\n",
+    },
+    {
+        "name": "general",
+        "text": "## ✅ General Practice\n"
+        "1. Review the vocabulary and grammar points from this lesson.\n"
+        "2. Practice using new vocabulary in conversations or writing.\n"
+        "3. Complete any exercises from your workbook related to this material.\n"
+        "4. Prepare questions about anything you find challenging for our next class.\n\n",
+    },
+]
+
+
+class TemplateError(ValueError):
+    """A template file is malformed or refers to a field the context doesn't have."""
+
+
+class _Text:
+    """Section text compiled into (optional, positional format string, fields) lines."""
+
+    def __init__(self, text):
+        text = text or ""
+        lines = text.splitlines(keepends=True)
+        if any(line.startswith("?") for line in lines):
+            self.lines = [
+                _compile_line(line[1:], True) if line.startswith("?") else _compile_line(line)
+                for line in lines
+            ]
+        else:
+            # Nothing to drop, so the whole text is one format call
+            self.lines = [_compile_line(text)]
+
+    def render(self, values, out, entry=None):
+        """Append the text to out. Fields are looked up in entry first, if given."""
+        for optional, fmt, fields in self.lines:
+            if not fields:
+                out.append(fmt)
+                continue
+            if entry is None:
+                line_values = [values[field] for field in fields]
+            else:
+                line_values = [
+                    entry[field] if field in entry else values[field] for field in fields
+                ]
+            if optional and not all(line_values):
+                continue
+            out.append(fmt.format(*line_values))
+
+
+def _compile_line(text, optional=False):
+    """Return (optional, positional format string, field names) for a piece of text."""
+    pieces = []
+    fields = []
+    try:
+        for literal, field, spec, _ in _FORMATTER.parse(text):
+            pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is not None:
+                pieces.append(f"{{{len(fields)}{':' + spec if spec else ''}}}")
+                fields.append(field)
+    except ValueError as e:
+        raise TemplateError(f"Bad template text {text!r}: {e}") from None
+    return optional, "".join(pieces), tuple(fields)
+
+
+class Section:
+    """One compiled section of a template; see the module docstring for the options."""
+
+    def __init__(
+        self,
+        name,
+        scope="lesson",
+        text="",
+        items=None,
+        item="",
+        footer="",
+        variant_field=None,
+        variants=None,
+        when=None,
+    ):
+        if scope not in ("lesson", "student"):
+            raise TemplateError(f"Section {name}: scope must be 'lesson' or 'student'")
+        self.name = name
+        self.scope = scope
+        self.items = items
+        self.when = when
+        self.variant_field = variant_field
+        self.text = _Text(text)
+        self.item = _Text(item)
+        self.footer = _Text(footer)
+        self.variants = {key.lower(): _Text(value) for key, value in (variants or {}).items()}
+
+    def render(self, context, out):
+        """Append the section's text for a context (a mapping of fields) to out."""
+        try:
+            if self.when and not context.get(self.when):
+                return
+            if self.items is None:
+                self.text.render(context, out)
+                return
+            entries = context.get(self.items)
+            if not entries:
+                return
+            self.text.render(context, out)
+            for entry in entries:
+                item = self.item
+                if self.variants:
+                    item = self.variants.get(
+                        str(entry.get(self.variant_field) or "").lower(), item
+                    )
+                item.render(context, out, entry)
+            self.footer.render(context, out)
+        except KeyError as e:
+            raise TemplateError(f"Section {self.name}: unknown field {e}") from None
+
+
+class Template:
+    """A named, compiled homework layout."""
+
+    def __init__(self, name, sections):
+        """
+        Compile a template.
+
+        Args:
+            name (str): Template name, also the key of its cached fragments.
+            sections (list[dict]): Section options, in output order.
+        """
+        self.name = name
+        # Identifies the layout, so outputs can tell when the template changed
+        self.digest = hashlib.sha256(
+            json.dumps(sections, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        try:
+            self.sections = [Section(**section) for section in sections]
+        except TypeError as e:
+            raise TemplateError(f"Template {name}: {e}") from None
+
+    def render(self, lesson_context, student_context, fragments=None):
+        """
+        Render the template.
+
+        Args:
+            lesson_context (dict): Lesson fields and item lists.
+            student_context (dict): Student fields and item lists. Lesson
+                fields are visible to student sections too.
+            fragments (dict, optional): Per-lesson cache of rendered lesson
+                sections. Pass the same dict for every student of a lesson.
+
+        Returns:
+            str: The rendered Markdown.
+        """
+        cached = fragments.setdefault(self.name, {}) if fragments is not None else {}
+        combined = None
+        out = []
+        for section in self.sections:
+            if section.scope == "student":
+                if combined is None:
+                    combined = {**lesson_context, **student_context}
+                section.render(combined, out)
+                continue
+            text = cached.get(section.name)
+            if text is None:
+                buffer = []
+                section.render(lesson_context, buffer)
+                text = cached[section.name] = "".join(buffer)
+            out.append(text)
+        return "".join(out)
+
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+def load_templates(template_dir=HOMEWORK_TEMPLATE_DIR):
+    """
+    Compile the built-in template and the JSON templates in template_dir.
+
+    A file that can't be read or compiled is logged and skipped.
+
+    Returns:
+        dict: Template name -> Template.
+    """
+    templates = {DEFAULT_TEMPLATE: Template(DEFAULT_TEMPLATE, DEFAULT_HOMEWORK_SECTIONS)}
+    if os.path.isdir(template_dir):
+        for file_name in sorted(os.listdir(template_dir)):
+            name, extension = os.path.splitext(file_name)
+            if extension != ".json":
+                continue
+            path = os.path.join(template_dir, file_name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    templates[name] = Template(name, json.load(f)["sections"])
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Skipping homework template {path}: {e}")
+    return templates
+
+
+def get_template(name=None, course_id=None):
+    """
+    Return a compiled template, loading the templates on first use.
+
+    Args:
+        name (str, optional): Template name. Takes precedence over course_id.
+        course_id (int, optional): Use course_<id> if that template exists.
+
+    Returns:
+        Template: The template asked for, or the default one.
+    """
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                _templates = load_templates()
+    if name is None and course_id is not None:
+        name = f"course_{course_id}"
+    return _templates.get(name) or _templates[DEFAULT_TEMPLATE]
+
+
+def reload_templates():
+    """Forget the compiled templates, so edited files are read on next use."""
+    global _templates
+    with _templates_lock:
+        _templates = None
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TEMPLATE
+    if name == DEFAULT_TEMPLATE:
+        print(json.dumps({"sections": DEFAULT_HOMEWORK_SECTIONS}, indent=2, ensure_ascii=False))
+    else:
+        path = os.path.join(HOMEWORK_TEMPLATE_DIR, f"{name}.json")
+        with open(path, encoding="utf-8") as f:
+            print(f.read())
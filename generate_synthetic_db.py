@@ -0,0 +1,366 @@
+"""
+Synthetic ESL database generator.
+
+Creates a new SQLite file with the same schema as esl.db and fills it with
+configurable volumes of courses, units, lessons, blocks, students and session
+records. Text fields get realistic lengths. The result is used by
+benchmark_hot_paths.py to see how the CLI behaves at production scale.
+
+Usage:
+    python generate_synthetic_db.py --output synthetic.db --students 50000 \
+        --lessons 5000 --block-records 2000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from esl_db import get_connection
+
+# Tables copied from the template database, in foreign-key order
+SCHEMA_TABLES = [
+    "courses",
+    "units",
+    "enrolled_students",
+    "lessons",
+    "blocks",
+    "vocabulary",
+    "grammar_rules",
+    "assessments",
+    "resources",
+    "lesson_records",
+    "block_records",
+]
+
+WORDS = (
+    "student teacher lesson practice speaking listening reading writing grammar "
+    "vocabulary present perfect past simple future continuous phrasal verbs "
+    "pronunciation question answer conversation travel airport hotel restaurant "
+    "family friends weekend hobby music film weather city neighbourhood work "
+    "meeting email interview describe compare explain agree disagree opinion "
+    "because although however therefore usually sometimes never always already "
+    "yet just still the a an to of and in on at with for from about very quite"
+).split()
+
+ACTIVITY_TYPES = ["Speaking", "Listening", "Reading", "Writing", "Game", "Quiz"]
+RESOURCE_TYPES = ["Video", "Article", "Worksheet", "Audio", "Website"]
+LEVELS = ["A1", "A2", "B1", "B2", "C1"]
+
+
+def sentence(rng, min_words, max_words):
+    """Return a random sentence of between min_words and max_words words."""
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng, min_chars, max_chars):
+    """Return random text roughly between min_chars and max_chars long."""
+    target = rng.randint(min_chars, max_chars)
+    parts = []
+    length = 0
+    while length < target:
+        s = sentence(rng, 6, 16)
+        parts.append(s)
+        length += len(s) + 1
+    return " ".join(parts)
+
+
+def maybe(rng, probability, value_func):
+    """Return value_func() with the given probability, otherwise None."""
+    return value_func() if rng.random() < probability else None
+
+
+def create_schema(conn, template_path):
+    """Create the ESL tables in conn using the CREATE statements of the template database."""
+    template = sqlite3.connect(template_path)
+    try:
+        for table in SCHEMA_TABLES:
+            row = template.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table,),
+            ).fetchone()
+            if not row:
+                raise RuntimeError(f"Table {table} not found in {template_path}")
+            conn.execute(row[0])
+    finally:
+        template.close()
+    conn.commit()
+
+
+def generate(conn, args, rng):
+    """Fill every table with synthetic rows according to the requested volumes."""
+    units_total = args.courses * args.units_per_course
+    lessons_per_unit = max(1, args.lessons // units_total)
+    today = date.today()
+
+    conn.executemany(
+        """
+        INSERT INTO courses (id, name, duration, focus, themes, grammar_overview, vocabulary_overview)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (
+                c,
+                f"{rng.choice(LEVELS)} {sentence(rng, 2, 4)[:-1]} {c}",
+                f"{rng.randint(8, 24)} weeks",
+                sentence(rng, 4, 8),
+                sentence(rng, 6, 12),
+                paragraph(rng, 150, 400),
+                paragraph(rng, 150, 400),
+            )
+            for c in range(1, args.courses + 1)
+        ),
+    )
+
+    unit_rows = []
+    for c in range(1, args.courses + 1):
+        for n in range(1, args.units_per_course + 1):
+            unit_rows.append(
+                (len(unit_rows) + 1, c, n, sentence(rng, 3, 6), paragraph(rng, 80, 250))
+            )
+    conn.executemany(
+        "INSERT INTO units (id, course_id, unit_number, title, description) VALUES (?, ?, ?, ?, ?)",
+        unit_rows,
+    )
+
+    # lessons_by_course maps course_id -> [(lesson_id, [block_id, ...]), ...]
+    lessons_by_course = {c: [] for c in range(1, args.courses + 1)}
+    lesson_rows = []
+    block_rows = []
+    for unit_id, course_id, _, _, _ in unit_rows:
+        for n in range(1, lessons_per_unit + 1):
+            lesson_id = len(lesson_rows) + 1
+            lesson_rows.append(
+                (
+                    lesson_id,
+                    unit_id,
+                    n,
+                    sentence(rng, 3, 7),
+                    paragraph(rng, 200, 600),
+                    sentence(rng, 3, 8),
+                    sentence(rng, 3, 8),
+                )
+            )
+            block_ids = []
+            for b in range(1, args.blocks_per_lesson + 1):
+                block_id = len(block_rows) + 1
+                block_ids.append(block_id)
+                block_rows.append(
+                    (
+                        block_id,
+                        lesson_id,
+                        b,
+                        sentence(rng, 2, 5),
+                        paragraph(rng, 80, 250),
+                        rng.choice(ACTIVITY_TYPES),
+                        paragraph(rng, 300, 900),
+                    )
+                )
+            lessons_by_course[course_id].append((lesson_id, block_ids))
+
+    conn.executemany(
+        """
+        INSERT INTO lessons (id, unit_id, lesson_number, title, context, grammar_focus, vocabulary_focus)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        lesson_rows,
+    )
+    conn.executemany(
+        """
+        INSERT INTO blocks (id, lesson_id, block_number, title, description, activity_type, content)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        block_rows,
+    )
+
+    conn.executemany(
+        "INSERT INTO vocabulary (lesson_id, word_or_phrase, definition, example_usage) VALUES (?, ?, ?, ?)",
+        (
+            (
+                lesson[0],
+                " ".join(rng.choices(WORDS, k=rng.randint(1, 3))),
+                sentence(rng, 5, 14),
+                maybe(rng, 0.8, lambda: sentence(rng, 6, 14)),
+            )
+            for lesson in lesson_rows
+            for _ in range(args.vocabulary_per_lesson)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO grammar_rules (lesson_id, rule, example) VALUES (?, ?, ?)",
+        (
+            (lesson[0], sentence(rng, 8, 20), maybe(rng, 0.8, lambda: sentence(rng, 6, 12)))
+            for lesson in lesson_rows
+            for _ in range(args.grammar_per_lesson)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO resources (lesson_id, resource_type, description, url_or_path) VALUES (?, ?, ?, ?)",
+        (
+            (
+                lesson[0],
+                rng.choice(RESOURCE_TYPES),
+                sentence(rng, 4, 10),
+                f"https://example.com/resources/{lesson[0]}/{r}",
+            )
+            for lesson in lesson_rows
+            for r in range(args.resources_per_lesson)
+        ),
+    )
+    conn.commit()
+    print(
+        f"Curriculum: {args.courses} courses, {len(unit_rows)} units, "
+        f"{len(lesson_rows)} lessons, {len(block_rows)} blocks"
+    )
+
+    conn.executemany(
+        "INSERT INTO enrolled_students (id, name, email, enrollment_date, course_id) VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                s,
+                f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()}",
+                f"student{s}@example.com",
+                (today - timedelta(days=rng.randint(0, 730))).isoformat(),
+                rng.randint(1, args.courses),
+            )
+            for s in range(1, args.students + 1)
+        ),
+    )
+    conn.commit()
+    print(f"Students: {args.students}")
+
+    # Spread block records over students, each taking lessons from their own course
+    student_courses = conn.execute("SELECT id, course_id FROM enrolled_students").fetchall()
+    lesson_record_id = 0
+    block_record_count = 0
+    lesson_record_batch = []
+    block_record_batch = []
+
+    def flush():
+        conn.executemany(
+            """
+            INSERT INTO lesson_records (id, student_id, lesson_id, completion_date, score, feedback)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            lesson_record_batch,
+        )
+        conn.executemany(
+            """
+            INSERT INTO block_records (lesson_record_id, block_id, student_speech_notes,
+                                       teacher_notes, student_questions, created_at, modified_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            block_record_batch,
+        )
+        conn.commit()
+        lesson_record_batch.clear()
+        block_record_batch.clear()
+
+    for student_id, course_id in student_courses:
+        if block_record_count >= args.block_records:
+            break
+        course_lessons = lessons_by_course[course_id]
+        taken = min(len(course_lessons), max(1, args.lessons_per_student))
+        # sample() never repeats a lesson, so (student_id, lesson_id) stays unique
+        for lesson_id, block_ids in rng.sample(course_lessons, taken):
+            if block_record_count >= args.block_records:
+                break
+            lesson_record_id += 1
+            completed = today - timedelta(days=rng.randint(0, 365))
+            lesson_record_batch.append(
+                (
+                    lesson_record_id,
+                    student_id,
+                    lesson_id,
+                    maybe(rng, 0.85, completed.isoformat),
+                    maybe(rng, 0.7, lambda: rng.randint(40, 100)),
+                    maybe(rng, 0.6, lambda: paragraph(rng, 60, 300)),
+                )
+            )
+            created = f"{completed.isoformat()} {rng.randint(8, 20):02d}:{rng.randint(0, 59):02d}:00"
+            for block_id in block_ids:
+                block_record_batch.append(
+                    (
+                        lesson_record_id,
+                        block_id,
+                        maybe(rng, args.notes_fill, lambda: paragraph(rng, 60, 400)),
+                        maybe(rng, args.notes_fill, lambda: paragraph(rng, 100, 300)),
+                        maybe(rng, args.notes_fill / 2, lambda: sentence(rng, 5, 15)),
+                        created,
+                        maybe(rng, 0.5, lambda: created),
+                    )
+                )
+                block_record_count += 1
+            if len(block_record_batch) >= 50000:
+                flush()
+                print(f"  {block_record_count:,} block records...", end="\r")
+
+    flush()
+    print(f"Session records: {lesson_record_id:,} lesson records, {block_record_count:,} block records")
+    if block_record_count < args.block_records:
+        print(
+            "⚠️ Every student has used their --lessons-per-student quota; "
+            "raise it or --students to reach the requested block records."
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large synthetic ESL database")
+    parser.add_argument("--output", default="synthetic.db", help="Database file to create")
+    parser.add_argument("--template", default="esl.db", help="Database whose schema is copied")
+    parser.add_argument("--courses", type=int, default=20)
+    parser.add_argument("--units-per-course", type=int, default=10)
+    parser.add_argument("--lessons", type=int, default=5000, help="Approximate total lessons")
+    parser.add_argument("--blocks-per-lesson", type=int, default=4)
+    parser.add_argument("--vocabulary-per-lesson", type=int, default=3)
+    parser.add_argument("--grammar-per-lesson", type=int, default=2)
+    parser.add_argument("--resources-per-lesson", type=int, default=3)
+    parser.add_argument("--students", type=int, default=50000)
+    parser.add_argument("--block-records", type=int, default=2000000)
+    parser.add_argument(
+        "--lessons-per-student",
+        type=int,
+        default=10,
+        help="Lesson records created per student (capped by the course size)",
+    )
+    parser.add_argument(
+        "--notes-fill",
+        type=float,
+        default=0.6,
+        help="Probability that each note field of a block record is filled",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Overwrite the output file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            print(f"❌ {args.output} already exists. Use --force to overwrite it.")
+            sys.exit(1)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+
+    start = time.perf_counter()
+    rng = random.Random(args.seed)
+
+    # Bulk load through a plain connection with no indexes, then let the shared
+    # data-access layer run the migrations so the indexes are built once at the end.
+    conn = sqlite3.connect(args.output)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    create_schema(conn, args.template)
+    generate(conn, args, rng)
+    conn.close()
+
+    print("Building indexes...")
+    get_connection(args.output)
+    print(f"✅ Created {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
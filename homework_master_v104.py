@@ -1,21 +1,40 @@
+import argparse
 import sqlite3
 import time
 import datetime
+import itertools
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
-from rich.progress import Progress
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, TimeElapsedColumn
 from rich.prompt import Prompt, Confirm
 from rich.table import Table
 from rich.text import Text
 from rich import box
 from rich.align import Align
 from rich.columns import Columns
+from esl_db import DEFAULT_DB_PATH, curriculum_cache_for, database_for, get_database
+from esl_tasks import CANCELLED, FAILED, TaskCancelled, TaskExecutor, follow
+import esl_search
+import esl_review
+import esl_templates
+import esl_manifest
 
 # Initialize Rich console
 console = Console()
 
+HOMEWORK_DIR = "homeworks"
+
+# Batches smaller than this are rendered in-process; starting workers would cost more
+BATCH_POOL_MIN_JOBS = 64
+# Keeps each IN (...) list well under SQLite's bound-parameter limit
+BATCH_QUERY_CHUNK = 500
+# Vocabulary from earlier lessons that is due, added to each homework
+HOMEWORK_REVIEW_LIMIT = 10
+
 
 def clear_screen():
     """Clear the terminal screen based on OS."""
@@ -43,12 +62,10 @@ def confirm_and_continue():
     Prompt.ask("[cyan]Press Enter to continue[/cyan]", default="")
 
 
-def connect_to_db():
-    """Connect to the ESL database."""
+def connect_to_db(db_path=DEFAULT_DB_PATH):
+    """Connect to the ESL database through the shared data-access layer."""
     try:
-        conn = sqlite3.connect("esl.db")
-        conn.row_factory = sqlite3.Row  # Enable column access by name
-        return conn
+        return get_database(db_path).connection()
     except sqlite3.Error as e:
         console.print(f"[bold red]Database connection error: {e}[/bold red]")
         exit(1)
@@ -70,171 +87,403 @@ def display_header():
     console.print("\n")
 
 
-def export_student_records(conn):
-    """Export student records to a Markdown file."""
-    transition_screen("Export Student Records")
-    student_id = Prompt.ask("Enter the student ID", console=console)
+# Report rows for one student, in the order the report is written. Block records
+# are LEFT JOINed so blocks the student hasn't worked on still appear.
+STUDENT_REPORT_QUERY = """
+SELECT
+    c.id AS course_id,
+    c.name AS course_name,
+    u.id AS unit_id,
+    u.title AS unit_title,
+    l.id AS lesson_id,
+    l.title AS lesson_title,
+    lr.feedback,
+    b.id AS block_id,
+    b.block_number,
+    b.title AS block_title,
+    b.description AS block_description,
+    br.student_speech_notes,
+    br.teacher_notes,
+    br.student_questions,
+    br.created_at,
+    br.modified_at
+FROM enrolled_students e
+JOIN courses c ON c.id = e.course_id
+JOIN lesson_records lr ON lr.student_id = e.id
+JOIN lessons l ON l.id = lr.lesson_id
+JOIN units u ON u.id = l.unit_id AND u.course_id = c.id
+JOIN blocks b ON b.lesson_id = l.id
+LEFT JOIN block_records br ON br.block_id = b.id AND br.lesson_record_id = lr.id
+WHERE e.id = :student_id
+ORDER BY u.unit_number, u.id, l.lesson_number, l.id, lr.id, b.block_number, b.id, br.id
+"""
+
+# The report rows of a list of students (:ids, a JSON array within [:low, :high])
+# in one pass, grouped by student. Same columns and per-student order as
+# STUDENT_REPORT_QUERY.
+COHORT_REPORT_QUERY = """
+SELECT
+    e.id AS student_id,
+    e.name AS student_name,
+    c.id AS course_id,
+    c.name AS course_name,
+    u.id AS unit_id,
+    u.title AS unit_title,
+    l.id AS lesson_id,
+    l.title AS lesson_title,
+    lr.feedback,
+    b.id AS block_id,
+    b.block_number,
+    b.title AS block_title,
+    b.description AS block_description,
+    br.student_speech_notes,
+    br.teacher_notes,
+    br.student_questions,
+    br.created_at,
+    br.modified_at
+FROM enrolled_students e
+JOIN courses c ON c.id = e.course_id
+JOIN lesson_records lr ON lr.student_id = e.id
+JOIN lessons l ON l.id = lr.lesson_id
+JOIN units u ON u.id = l.unit_id AND u.course_id = c.id
+JOIN blocks b ON b.lesson_id = l.id
+LEFT JOIN block_records br ON br.block_id = b.id AND br.lesson_record_id = lr.id
+WHERE e.id BETWEEN :low AND :high
+  AND e.id IN (SELECT value FROM json_each(:ids))
+  AND (:course_id IS NULL OR e.course_id = :course_id)
+ORDER BY e.id, u.unit_number, u.id, l.lesson_number, l.id, lr.id, b.block_number, b.id, br.id
+"""
+
+# Bytes buffered before report text is written to disk
+REPORT_WRITE_BUFFER = 1 << 16
+
+# Cohorts smaller than this are exported in-process
+REPORT_POOL_MIN_STUDENTS = 200
+
+REPORTS_DIR = "reports"
+# Part of every report's input hash; bump it when write_student_report's
+# layout changes so the next export rewrites reports whose data didn't change
+REPORT_FORMAT_VERSION = 1
+
+
+def report_manifest_key(student_id):
+    """Key of a student's report in reports/manifest.json."""
+    return f"student_{student_id}"
+
+
+# The report columns shared by STUDENT_REPORT_QUERY and COHORT_REPORT_QUERY
+REPORT_COLUMNS = (
+    "course_id",
+    "course_name",
+    "unit_id",
+    "unit_title",
+    "lesson_id",
+    "lesson_title",
+    "feedback",
+    "block_id",
+    "block_number",
+    "block_title",
+    "block_description",
+    "student_speech_notes",
+    "teacher_notes",
+    "student_questions",
+    "created_at",
+    "modified_at",
+)
+
+
+def shared_report_names(conn):
+    """Student names used by more than one student; their reports get the ID in the name."""
+    return frozenset(
+        row["name"]
+        for row in conn.execute(
+            "SELECT name FROM enrolled_students GROUP BY name HAVING COUNT(*) > 1"
+        )
+    )
 
-    # First, get student name
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM enrolled_students WHERE id = ?", (student_id,))
-        student_result = cursor.fetchone()
-        if not student_result:
-            console.print(f"⚠️ Student with ID {student_id} not found")
-            return
-        student_name = student_result["name"]
-    except sqlite3.Error as e:
-        console.print(f"❌ Error retrieving student name: {e}")
-        return
 
-    query = f"""
-    WITH student_courses AS (
-        SELECT e.id AS student_id, c.id AS course_id, c.name AS course_name
+def report_name_part(student_id, student_name, shared_names):
+    """Name a student's report file is built from; students sharing a name would collide."""
+    return f"{student_name} {student_id}" if student_name in shared_names else student_name
+
+
+def report_signatures(conn, shared_names, student_id=None, course_id=None):
+    """
+    Cheap stand-ins for the input of students' reports, without reading their records.
+
+    A signature covers the student's records_version and their course's
+    curriculum_version (bumped by triggers on every change to the student's
+    lesson and block records and to the course's curriculum, see
+    esl_migrations), plus the name, file name and course. When it matches the
+    manifest, the report can be kept without querying or rendering it.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        shared_names (frozenset): From shared_report_names.
+        student_id (int, optional): Only this student.
+        course_id (int, optional): Only this course's students.
+
+    Returns:
+        dict: student_id -> hex digest.
+    """
+    rows = conn.execute(
+        """
+        SELECT e.id, e.name, e.course_id,
+               coalesce(sp.records_version, 0) AS records_version,
+               coalesce(cs.curriculum_version, 0) AS curriculum_version
         FROM enrolled_students e
-        JOIN courses c ON e.course_id = c.id
-        WHERE e.id = {student_id}
-    ),
-    student_lessons AS (
-        SELECT lr.lesson_id, lr.id AS lesson_record_id, u.course_id, u.id AS unit_id, u.title AS unit_title, 
-               l.id AS lesson_id, l.title AS lesson_title, lr.feedback
-        FROM lesson_records lr
-        JOIN lessons l ON lr.lesson_id = l.id
-        JOIN units u ON l.unit_id = u.id
-        WHERE lr.student_id = {student_id}
+        LEFT JOIN student_progress sp ON sp.student_id = e.id
+        LEFT JOIN course_stats cs ON cs.course_id = e.course_id
+        WHERE (:student_id IS NULL OR e.id = :student_id)
+          AND (:course_id IS NULL OR e.course_id = :course_id)
+        """,
+        {"student_id": student_id, "course_id": course_id},
+    )
+    return {
+        row["id"]: esl_manifest.content_hash(
+            REPORT_FORMAT_VERSION,
+            row["name"],
+            report_name_part(row["id"], row["name"], shared_names),
+            row["course_id"],
+            row["records_version"],
+            row["curriculum_version"],
+        )
+        for row in rows
+    }
+
+
+def _report_unchanged(entry, signature):
+    """True if a manifest entry was written from this signature and its file still exists."""
+    return (
+        entry is not None
+        and entry.get("signature") == signature
+        and os.path.exists(entry["path"])
     )
-    SELECT 
-        sc.course_id, 
-        sc.course_name,
-        sl.unit_id, 
-        sl.unit_title, 
-        sl.lesson_id, 
-        sl.lesson_title, 
-        sl.feedback, 
-        b.id AS block_id, 
-        b.block_number, 
-        b.title AS block_title, 
-        b.description AS block_description, 
-        br.student_speech_notes, 
-        br.teacher_notes, 
-        br.student_questions, 
-        br.created_at, 
-        br.modified_at
-    FROM student_courses sc
-    JOIN student_lessons sl ON sc.course_id = sl.course_id
-    JOIN blocks b ON sl.lesson_id = b.lesson_id
-    LEFT JOIN block_records br ON br.block_id = b.id AND br.lesson_record_id = sl.lesson_record_id
-    WHERE sc.student_id = {student_id};
+
+
+class _HashedReportRows:
     """
+    Passes report rows through unchanged, hashing them and counting lessons on the way.
 
-    try:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        rows = cursor.fetchall()
+    Lets a report be written and hashed in the same pass over the cursor.
+    """
 
-        if not rows:
-            console.print(f"⚠️ No records found for student ID {student_id}")
-            return
+    def __init__(self, rows, student_id, student_name):
+        self._rows = rows
+        self._hasher = esl_manifest.RowHasher(REPORT_FORMAT_VERSION, student_id, student_name)
+        self.first_row = None
+        self.lessons = 0
 
-        courses = {}
-        for row in rows:
-            (
-                course_id,
-                course_name,
-                unit_id,
-                unit_title,
-                lesson_id,
-                lesson_title,
-                feedback,
-                block_id,
-                block_number,
-                block_title,
-                block_description,
-                student_speech_notes,
-                teacher_notes,
-                student_questions,
-                created_at,
-                modified_at,
-            ) = row
-
-            if course_id not in courses:
-                courses[course_id] = {"name": course_name, "units": {}}
-
-            if unit_id not in courses[course_id]["units"]:
-                courses[course_id]["units"][unit_id] = {
-                    "title": unit_title,
-                    "lessons": {},
-                }
+    def __iter__(self):
+        lesson_id = None
+        for row in self._rows:
+            if self.first_row is None:
+                self.first_row = row
+            # Rows are sorted by lesson, so each lesson is one run of rows
+            if row["lesson_id"] != lesson_id:
+                lesson_id = row["lesson_id"]
+                self.lessons += 1
+            self._hasher.update(row[column] for column in REPORT_COLUMNS)
+            yield row
 
-            if lesson_id not in courses[course_id]["units"][unit_id]["lessons"]:
-                courses[course_id]["units"][unit_id]["lessons"][lesson_id] = {
-                    "title": lesson_title,
-                    "feedback": feedback,
-                    "blocks": [],
-                }
+    def hexdigest(self):
+        return self._hasher.hexdigest()
 
-            courses[course_id]["units"][unit_id]["lessons"][lesson_id]["blocks"].append(
-                {
-                    "block_id": block_id,
-                    "block_number": block_number,
-                    "title": block_title,
-                    "description": block_description,
-                    "student_speech_notes": student_speech_notes,
-                    "teacher_notes": teacher_notes,
-                    "student_questions": student_questions,
-                    "created_at": created_at,
-                    "modified_at": modified_at,
-                }
-            )
 
-        # Create a nice filename similar to homework save logic
-        date_str = datetime.datetime.now().strftime("%Y%m%d")
-        safe_filename = f"{student_name.replace(' ', '_')}_records_{date_str}.md"
+def student_report_path(student_name, date_str=None):
+    """Return the path export_student_records writes a student's report to."""
+    date_str = date_str or datetime.datetime.now().strftime("%Y%m%d")
+    safe_filename = f"{student_name.replace(' ', '_')}_records_{date_str}.md"
+    return os.path.join(REPORTS_DIR, safe_filename)
+
 
-        # Ensure the 'reports' directory exists
-        if not os.path.exists("reports"):
-            os.makedirs("reports")
+def write_student_report(md, student_id, student_name, rows):
+    """
+    Write one student's Markdown report from rows in STUDENT_REPORT_QUERY order.
+
+    Rows are grouped on the fly: a heading is written whenever the course,
+    unit or lesson changes. Only the current row is held in memory, so the
+    cost stays flat however long the student's history is.
+
+    Args:
+        md: Text file (or any object with write()) to write to.
+        student_id (int): Student ID, for the title.
+        student_name (str): Student name, for the title.
+        rows (iterable): Report rows for this student, sorted.
 
-        # Define the full path for the file
-        file_path = os.path.join("reports", safe_filename)
+    Returns:
+        int: Number of rows written.
+    """
+    md.write(
+        f"# Student {student_id} ({student_name}) Records\n\n"
+        f"*Report generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}*\n\n"
+    )
 
-        with open(file_path, "w", encoding="utf-8") as md:
-            md.write(f"# Student {student_id} ({student_name}) Records\n\n")
+    course_id = unit_id = lesson_id = None
+    count = 0
+    for row in rows:
+        count += 1
+        if row["course_id"] != course_id:
+            course_id = row["course_id"]
+            unit_id = lesson_id = None
+            md.write(f"## Course: {row['course_name']}\n\n")
+        if row["unit_id"] != unit_id:
+            unit_id = row["unit_id"]
+            lesson_id = None
+            md.write(f"### Unit: {row['unit_title']}\n\n")
+        if row["lesson_id"] != lesson_id:
+            lesson_id = row["lesson_id"]
             md.write(
-                f"*Report generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}*\n\n"
+                f"#### Lesson: {row['lesson_title']}\n\n"
+                f"**Feedback:** {row['feedback'] if row['feedback'] else 'No feedback available'}\n\n"
+                "##### Blocks:\n"
             )
 
-            for course in courses.values():
-                md.write(f"## Course: {course['name']}\n\n")
-
-                for unit in course["units"].values():
-                    md.write(f"### Unit: {unit['title']}\n\n")
-
-                    for lesson in unit["lessons"].values():
-                        md.write(f"#### Lesson: {lesson['title']}\n\n")
-                        md.write(
-                            f"**Feedback:** {lesson['feedback'] if lesson['feedback'] else 'No feedback available'}\n\n"
-                        )
-
-                        md.write("##### Blocks:\n")
-                        for block in lesson["blocks"]:
-                            md.write(
-                                f"- **Block {block['block_number']}: {block['title']}**\n"
-                            )
-                            md.write(f"  - *Description:* {block['description']}\n")
-                            md.write(
-                                f"  - *Student Speech Notes:* {block['student_speech_notes'] if block['student_speech_notes'] else 'None'}\n"
-                            )
-                            md.write(
-                                f"  - *Teacher Notes:* {block['teacher_notes'] if block['teacher_notes'] else 'None'}\n"
-                            )
-                            md.write(
-                                f"  - *Student Questions:* {block['student_questions'] if block['student_questions'] else 'None'}\n"
-                            )
-                            md.write(f"  - *Created At:* {block['created_at']}\n")
-                            md.write(
-                                f"  - *Modified At:* {block['modified_at'] if block['modified_at'] else 'N/A'}\n\n"
-                            )
+        md.write(
+            f"- **Block {row['block_number']}: {row['block_title']}**\n"
+            f"  - *Description:* {row['block_description']}\n"
+            f"  - *Student Speech Notes:* {row['student_speech_notes'] if row['student_speech_notes'] else 'None'}\n"
+            f"  - *Teacher Notes:* {row['teacher_notes'] if row['teacher_notes'] else 'None'}\n"
+            f"  - *Student Questions:* {row['student_questions'] if row['student_questions'] else 'None'}\n"
+            f"  - *Created At:* {row['created_at']}\n"
+            f"  - *Modified At:* {row['modified_at'] if row['modified_at'] else 'N/A'}\n\n"
+        )
+    return count
+
+
+def write_report_if_changed(
+    file_path, student_id, student_name, rows, previous=None, force=False
+):
+    """
+    Write a student's report through a temporary file, keeping the old one if unchanged.
+
+    The rows are hashed while the report is written, so memory stays flat as
+    in write_student_report. If the hash matches previous and that report
+    still exists, the temporary file is deleted and the old report kept;
+    otherwise it replaces file_path. Callers skip students whose signature
+    (see report_signatures) is unchanged before getting here, so this only
+    catches changes that turn out not to alter the report.
+
+    Args:
+        file_path (str): Where a changed report goes.
+        student_id (int): Student ID.
+        student_name (str): Student name, for the title and the hash.
+        rows (iterable): Report rows for this student, sorted.
+        previous (dict, optional): The report's manifest entry ({"hash", "path"}).
+        force (bool, optional): Replace the report even if unchanged.
+
+    Returns:
+        dict: path, hash, unchanged, rows, lessons and course_name
+        (None if there were no rows).
+    """
+    temp_path = f"{file_path}.tmp"
+    report_rows = _HashedReportRows(rows, student_id, student_name)
+    try:
+        with open(temp_path, "w", encoding="utf-8", buffering=REPORT_WRITE_BUFFER) as md:
+            count = write_student_report(md, student_id, student_name, report_rows)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    input_hash = report_rows.hexdigest()
+    unchanged = (
+        not force
+        and previous is not None
+        and previous["hash"] == input_hash
+        and os.path.exists(previous["path"])
+    )
+    if unchanged:
+        os.remove(temp_path)
+        file_path = previous["path"]
+    else:
+        os.replace(temp_path, file_path)
+    first_row = report_rows.first_row
+    return {
+        "path": file_path,
+        "hash": input_hash,
+        "unchanged": unchanged,
+        "rows": count,
+        "lessons": report_rows.lessons,
+        "course_name": first_row["course_name"] if first_row else None,
+    }
+
+
+def export_student_records(conn, student_id=None, force=False):
+    """
+    Export student records to a Markdown file, prompting for the student if not given.
+
+    Unless force is set, a report whose signature (see report_signatures)
+    matches its entry in reports/manifest.json is kept without querying the
+    records. Otherwise the rows are hashed while the report is written to a
+    temporary file, and the old report is still kept if the hash matches.
+
+    Returns:
+        str or None: Path of the report, or None if nothing was exported.
+    """
+    if student_id is None:
+        transition_screen("Export Student Records")
+        student_id = Prompt.ask("Enter the student ID", console=console)
+
+    # First, get student name
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name FROM enrolled_students WHERE id = ?", (student_id,))
+        student_result = cursor.fetchone()
+        if not student_result:
+            console.print(f"⚠️ Student with ID {student_id} not found")
+            return None
+        student_id, student_name = student_result["id"], student_result["name"]
+    except sqlite3.Error as e:
+        console.print(f"❌ Error retrieving student name: {e}")
+        return None
+
+    try:
+        shared_names = shared_report_names(conn)
+        signature = report_signatures(conn, shared_names, student_id=student_id)[student_id]
+        manifest = esl_manifest.Manifest(REPORTS_DIR)
+        key = report_manifest_key(student_id)
+        entry = manifest.get(key)
+        report = None
+        if force or not _report_unchanged(entry, signature):
+            rows = conn.execute(STUDENT_REPORT_QUERY, {"student_id": student_id})
+            first_row = rows.fetchone()
+            if first_row is None:
+                console.print(f"⚠️ No records found for student ID {student_id}")
+                return None
+
+            # Ensure the 'reports' directory exists
+            os.makedirs(REPORTS_DIR, exist_ok=True)
+            report = write_report_if_changed(
+                student_report_path(report_name_part(student_id, student_name, shared_names)),
+                student_id,
+                student_name,
+                itertools.chain([first_row], rows),
+                previous=entry,
+                force=force,
+            )
+            manifest.record(
+                key,
+                report["hash"],
+                report["path"],
+                signature=signature,
+                student_name=student_name,
+                course_name=report["course_name"],
+                lessons=report["lessons"],
+                rows=report["rows"],
+            )
+            manifest.save()
+
+        if report is None or report["unchanged"]:
+            file_path = report["path"] if report else entry["path"]
+            console.print(
+                Panel(
+                    f"ℹ️ No changes since the last export: {file_path}",
+                    style="bold green",
+                    box=box.ROUNDED,
+                )
+            )
+            return file_path
+        file_path = report["path"]
 
         console.print(
             Panel(
@@ -243,11 +492,221 @@ def export_student_records(conn):
                 box=box.ROUNDED,
             )
         )
+        return file_path
 
-    except sqlite3.Error as e:
+    except (sqlite3.Error, OSError) as e:
         console.print(
             Panel(f"❌ An error occurred: {e}", style="bold red", box=box.ROUNDED)
         )
+        return None
+
+
+def _export_report_range(
+    db_path, student_ids, course_id, date_str, shared_names, known=None, force=False
+):
+    """
+    Write the reports of a sorted list of students, in one query.
+
+    Runs in a worker process for large cohorts, so it opens its own connection
+    and returns what it wrote instead of printing. A report whose rows hash
+    to its entry in known, and whose file still exists, is kept as it is
+    (see write_report_if_changed).
+
+    Args:
+        student_ids (list[int]): The students, in ID order.
+        known (dict, optional): Manifest entries of these students' reports,
+            by report_manifest_key.
+        force (bool, optional): Rewrite every report.
+
+    Returns:
+        list[dict]: One entry per report, with student_id, student_name,
+        course_name, lessons, rows, path, hash and unchanged.
+    """
+    known = known or {}
+    conn = get_database(db_path).connection()
+    rows = conn.execute(
+        COHORT_REPORT_QUERY,
+        {
+            "low": student_ids[0],
+            "high": student_ids[-1],
+            "ids": json.dumps(student_ids),
+            "course_id": course_id,
+        },
+    )
+    written = []
+    for student_id, student_rows in itertools.groupby(
+        rows, key=lambda row: row["student_id"]
+    ):
+        first_row = next(student_rows)
+        student_name = first_row["student_name"]
+        report = write_report_if_changed(
+            student_report_path(
+                report_name_part(student_id, student_name, shared_names), date_str
+            ),
+            student_id,
+            student_name,
+            itertools.chain([first_row], student_rows),
+            previous=known.get(report_manifest_key(student_id)),
+            force=force,
+        )
+        written.append({"student_id": student_id, "student_name": student_name, **report})
+    return written
+
+
+def export_all_student_records(
+    conn, course_id=None, workers=None, progress=None, cancelled=None, force=False
+):
+    """
+    Export a report for every student (or every student of a course) in one pass.
+
+    Lesson and block records are read once, ordered by student, and fanned out
+    to one report file per student in reports/. Large cohorts are split into
+    contiguous student-ID ranges, each exported by a worker process with its
+    own query. An index file listing every report is written last.
+
+    Students whose signature (see report_signatures) matches their entry in
+    reports/manifest.json keep their report without being queried, so a
+    repeated export only reads and writes the students whose records or
+    curriculum changed.
+
+    Args:
+        conn (sqlite3.Connection): Connection opened through esl_db.
+        course_id (int, optional): Only this course's students.
+        workers (int, optional): Worker processes. Defaults to the CPU count;
+            1 exports in this process.
+        progress (callable, optional): Called as progress(done, total) with
+            the number of students handled so far.
+        cancelled (callable, optional): Checked after each range of students;
+            once it returns True, ranges not started yet are dropped and
+            TaskCancelled is raised. Reports already written are kept.
+        force (bool, optional): Rewrite every report.
+
+    Returns:
+        dict: "reports" (list of per-student entries, see
+        _export_report_range), "changed" (number of reports written),
+        "index" (path of the index file) and "seconds".
+    """
+    started = time.perf_counter()
+    database = database_for(conn)
+    db_path = database.db_path if database else DEFAULT_DB_PATH
+
+    student_ids = [
+        row["id"]
+        for row in conn.execute(
+            """
+            SELECT id FROM enrolled_students
+            WHERE (:course_id IS NULL OR course_id = :course_id)
+            ORDER BY id
+            """,
+            {"course_id": course_id},
+        )
+    ]
+    shared_names = shared_report_names(conn)
+    signatures = report_signatures(conn, shared_names, course_id=course_id)
+    date_str = datetime.datetime.now().strftime("%Y%m%d")
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    manifest = esl_manifest.Manifest(REPORTS_DIR)
+
+    reports = []
+    stale_ids = []
+    for student_id in student_ids:
+        entry = manifest.get(report_manifest_key(student_id))
+        if not force and _report_unchanged(entry, signatures.get(student_id)):
+            reports.append(
+                {
+                    "student_id": student_id,
+                    "student_name": entry["student_name"],
+                    "course_name": entry["course_name"],
+                    "lessons": entry["lessons"],
+                    "rows": entry["rows"],
+                    "path": entry["path"],
+                    "hash": entry["hash"],
+                    "unchanged": True,
+                }
+            )
+        else:
+            stale_ids.append(student_id)
+    done = len(reports)
+    if progress:
+        progress(done, len(student_ids))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(stale_ids) < REPORT_POOL_MIN_STUDENTS:
+        ranges = [stale_ids] if stale_ids else []
+    else:
+        # A few ranges per worker keeps the pool busy when some students have more history
+        size = -(-len(stale_ids) // (workers * 4))
+        ranges = [stale_ids[i : i + size] for i in range(0, len(stale_ids), size)]
+
+    tasks = []
+    for ids in ranges:
+        keys = (report_manifest_key(student_id) for student_id in ids)
+        known = {key: manifest.entries[key] for key in keys if key in manifest.entries}
+        tasks.append((db_path, ids, course_id, date_str, shared_names, known, force))
+    exported = []
+    try:
+        if len(tasks) <= 1:
+            for task, ids in zip(tasks, ranges):
+                exported.extend(_export_report_range(*task))
+                done += len(ids)
+                if progress:
+                    progress(done, len(student_ids))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_export_report_range, *task) for task in tasks]
+                for ids, future in zip(ranges, futures):
+                    if cancelled and cancelled():
+                        # Ranges already running finish; the rest never start
+                        executor.shutdown(wait=True, cancel_futures=True)
+                        raise TaskCancelled("export cancelled")
+                    exported.extend(future.result())
+                    done += len(ids)
+                    if progress:
+                        progress(done, len(student_ids))
+    finally:
+        # Also after a cancel, so the reports written so far aren't redone.
+        # Reports kept by their hash get the new signature too.
+        for report in exported:
+            manifest.record(
+                report_manifest_key(report["student_id"]),
+                report["hash"],
+                report["path"],
+                signature=signatures.get(report["student_id"]),
+                student_name=report["student_name"],
+                course_name=report["course_name"],
+                lessons=report["lessons"],
+                rows=report["rows"],
+            )
+        manifest.save()
+    reports.extend(exported)
+    reports.sort(key=lambda report: report["student_id"])
+
+    index_path = os.path.join(REPORTS_DIR, f"index_{date_str}.md")
+    with open(index_path, "w", encoding="utf-8", buffering=REPORT_WRITE_BUFFER) as md:
+        md.write("# Student Records Index\n\n")
+        md.write(
+            f"*Report generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}*\n\n"
+        )
+        changed = sum(not report["unchanged"] for report in reports)
+        md.write(
+            f"{len(reports)} of {len(student_ids)} students have records; "
+            f"{changed} reports changed since the last export.\n\n"
+        )
+        md.write("| ID | Student | Course | Lessons | Block entries | Report |\n")
+        md.write("|---|---|---|---|---|---|\n")
+        for report in reports:
+            file_name = os.path.basename(report["path"])
+            md.write(
+                f"| {report['student_id']} | {report['student_name']} | {report['course_name']} "
+                f"| {report['lessons']} | {report['rows']} | [{file_name}]({file_name}) |\n"
+            )
+
+    return {
+        "reports": reports,
+        "changed": changed,
+        "index": index_path,
+        "seconds": time.perf_counter() - started,
+    }
 
 
 def get_student_info(conn, student_id):
@@ -324,8 +783,9 @@ def display_student_info(student_info):
 
 
 def get_lesson_info(conn, lesson_id):
-    """Get comprehensive lesson information by ID."""
-    try:
+    """Get comprehensive lesson information by ID, through the shared curriculum cache."""
+
+    def load_lesson_info():
         cursor = conn.cursor()
 
         # Get lesson details
@@ -344,13 +804,6 @@ def get_lesson_info(conn, lesson_id):
         lesson = cursor.fetchone()
 
         if not lesson:
-            console.print(
-                Panel(
-                    f"No lesson found with ID {lesson_id}",
-                    style="bold red",
-                    box=box.ROUNDED,
-                )
-            )
             return None
 
         # Get vocabulary for the lesson
@@ -404,7 +857,23 @@ def get_lesson_info(conn, lesson_id):
             "grammar_rules": [dict(g) for g in grammar_rules],
             "blocks": [dict(b) for b in blocks],
             "resources": [dict(r) for r in resources],
+            # Rendered lesson sections (see generate_homework); dropped with the entry
+            "fragments": {},
         }
+
+    try:
+        lesson_info = curriculum_cache_for(conn).get(
+            conn, "lesson_info", int(lesson_id), load_lesson_info
+        )
+        if not lesson_info:
+            console.print(
+                Panel(
+                    f"No lesson found with ID {lesson_id}",
+                    style="bold red",
+                    box=box.ROUNDED,
+                )
+            )
+        return lesson_info
     except sqlite3.Error as e:
         console.print(
             Panel(
@@ -492,6 +961,7 @@ def get_student_lesson_record(conn, student_id, lesson_id):
                 FROM block_records br
                 JOIN blocks b ON br.block_id = b.id
                 WHERE br.lesson_record_id = ?
+                ORDER BY br.id
                 """,
                 (record["id"],),
             )
@@ -572,113 +1042,183 @@ def display_student_lesson_record(lesson_record):
         )
 
 
-def generate_homework(student_info, lesson_info, lesson_record):
-    """Generate a personalized homework assignment based on lesson and student progress."""
-    student = student_info["student"]
+def generate_homework(
+    student_info, lesson_info, lesson_record, review_items=None, template=None
+):
+    """
+    Generate a personalized homework assignment based on lesson and student progress.
+
+    The layout comes from esl_templates: the named template, else the one for
+    the student's course, else the default. Lesson sections are rendered once
+    per lesson_info and kept in lesson_info["fragments"], so only the
+    student's own sections are rendered for the next student.
+
+    review_items are the student's due vocabulary from esl_review.due_items;
+    the ones from other lessons are added to the Vocabulary Review section.
+    """
     course = student_info["course"]
     lesson = lesson_info["lesson"]
+    record = lesson_record["record"] if lesson_record else {}
+
+    lesson_context = {
+        **lesson,
+        "lesson_title": lesson["title"],
+        "vocabulary": lesson_info["vocabulary"],
+        "grammar_rules": lesson_info["grammar_rules"],
+        "blocks": lesson_info["blocks"],
+        "resources": lesson_info["resources"],
+    }
+    student_context = {
+        "student_name": student_info["student"]["name"],
+        "course_name": course["name"],
+        "date": datetime.datetime.now().strftime("%Y-%m-%d"),
+        "feedback": record.get("feedback"),
+        "speech_notes": [
+            block
+            for block in (lesson_record or {}).get("block_records") or []
+            if block["student_speech_notes"]
+        ],
+        "review_words": [
+            item for item in review_items or [] if item["lesson_id"] != lesson["id"]
+        ],
+        # The review list opens the section itself when the lesson has no words
+        "vocabulary_heading": "" if lesson_info["vocabulary"] else "## 📘 Vocabulary Review",
+    }
+    homework_template = esl_templates.get_template(template, course_id=course["id"])
+    return homework_template.render(
+        lesson_context, student_context, lesson_info.setdefault("fragments", {})
+    )
 
-    # Build the homework content
-    homework = f"# 📚 Personalized Homework for {student['name']}\n\n"
-    homework += f"**Course:** {course['name']}\n"
-    homework += f"**Lesson:** {lesson['title']} (Unit {lesson['unit_number']}: {lesson['unit_title']})\n"
-    homework += f"**Date:** {datetime.datetime.now().strftime('%Y-%m-%d')}\n\n"
-
-    # Include lesson context
-    if lesson["context"]:
-        homework += f"## 🎯 Lesson Overview\n{lesson['context']}\n\n"
-
-    # Include feedback if available
-    if lesson_record and lesson_record["record"].get("feedback"):
-        homework += f"## 📝 Feedback from Your Last Class\n{lesson_record['record']['feedback']}\n\n"
-
-    # Include student speech notes if available
-    if lesson_record and lesson_record.get("block_records"):
-        homework += "## 🗣️ Your Speaking Notes\n"
-        for block in lesson_record["block_records"]:
-            if block["student_speech_notes"]:
-                homework += f"### Activity: {block['block_title']}\n"
-                homework += f"{block['student_speech_notes']}\n\n"
-
-                # Add dynamic practice recommendations based on activity type
-                activity_type = block["activity_type"].lower()
-                if activity_type == "speaking":
-                    homework += "**Practice recommendation:** Record yourself speaking about this topic for 3-5 minutes and listen for areas to improve.\n\n"
-                elif activity_type == "writing":
-                    homework += "**Practice recommendation:** Write a short paragraph expanding on this topic.\n\n"
-                elif activity_type == "reading":
-                    homework += "**Practice recommendation:** Read additional materials on this topic and summarize them.\n\n"
-                elif activity_type == "listening":
-                    homework += "**Practice recommendation:** Listen to a related audio resource and take notes.\n\n"
-                else:
-                    homework += "**Practice recommendation:** Review the topic and prepare questions for the next class.\n\n"
-
-    # Vocabulary review
-    if lesson_info["vocabulary"]:
-        homework += "## 📘 Vocabulary Review\n"
-        homework += "Practice using these words and phrases from our lesson:\n\n"
-        for item in lesson_info["vocabulary"]:
-            homework += f"- **{item['word_or_phrase']}**: {item['definition']}\n"
-            if item["example_usage"]:
-                homework += f"  Example: *{item['example_usage']}*\n"
-        homework += "\n"
-
-    # Grammar practice
-    if lesson_info["grammar_rules"]:
-        homework += "## 📖 Grammar Practice\n"
-        homework += f"Based on our focus on {lesson['grammar_focus']}, practice these rules:\n\n"
-        for rule in lesson_info["grammar_rules"]:
-            homework += f"- **Rule**: {rule['rule']}\n"
-            if rule["example"]:
-                homework += f"  Example: *{rule['example']}*\n"
-        homework += "\nCreate 3-5 original sentences using these grammar rules.\n\n"
-
-    # Structured activities based on blocks
-    if lesson_info["blocks"]:
-        homework += "## 📋 Structured Activities\n"
-        for block in lesson_info["blocks"]:
-            homework += f"### 🏡 {block['title']} ({block['activity_type']})\n"
-            homework += f"{block['description']}\n\n"
-            homework += f"**Task:** {block['content']}\n\n"
-
-    # Additional resources
-    if lesson_info["resources"]:
-        homework += "## 🔗 Additional Resources\n"
-        homework += "Use these resources to further practice what we've learned:\n\n"
-        for resource in lesson_info["resources"]:
-            homework += f"- **{resource['description']}** ({resource['resource_type']}): {resource['url_or_path']}\n"
-        homework += "\n"
-
-    # General practice suggestions
-    homework += "## ✅ General Practice\n"
-    homework += "1. Review the vocabulary and grammar points from this lesson.\n"
-    homework += "2. Practice using new vocabulary in conversations or writing.\n"
-    homework += (
-        "3. Complete any exercises from your workbook related to this material.\n"
+
+def lesson_input_hash(lesson_info):
+    """Hash of the lesson data a homework is rendered from."""
+    return esl_manifest.content_hash(
+        {key: value for key, value in lesson_info.items() if key != "fragments"}
     )
-    homework += "4. Prepare questions about anything you find challenging for our next class.\n\n"
 
-    return homework
 
+def homework_input_hash(
+    student_info, lesson_info, lesson_record, review_items=None, lesson_hash=None
+):
+    """
+    Hash of everything generate_homework renders from, for the homework manifest.
+
+    The date printed in the homework is left out, so an unchanged homework
+    isn't rewritten just because a day has passed. Pass lesson_hash
+    (from lesson_input_hash) when hashing many homeworks of one lesson.
+    """
+    template = esl_templates.get_template(course_id=student_info["course"]["id"])
+    return esl_manifest.content_hash(
+        template.digest,
+        lesson_hash or lesson_input_hash(lesson_info),
+        student_info,
+        lesson_record,
+        [
+            (item["lesson_id"], item["prompt"], item["answer"], item["example"])
+            for item in review_items or []
+        ],
+    )
 
-def save_homework(homework, student_name, lesson_title):
-    """Save the homework to a text file in the 'homeworks' folder."""
-    # Create a safe filename
+
+def homework_file_path(student_name, lesson_title, student_id=None, lesson_id=None):
+    """
+    Return the path save_homework uses for a student's homework on a lesson.
+
+    student_id and lesson_id, when given, are added to the name, for
+    students or lessons whose name alone is not unique (see
+    homework_name_collisions).
+    """
+    if student_id is not None:
+        student_name = f"{student_name} {student_id}"
+    if lesson_id is not None:
+        lesson_title = f"{lesson_title} {lesson_id}"
     safe_filename = (
         f"{student_name.replace(' ', '_')}_{lesson_title.replace(' ', '_')}_homework.md"
     )
+    return os.path.join(HOMEWORK_DIR, safe_filename)
+
 
+def homework_name_collisions(conn):
+    """
+    Return the student names and lesson titles shared by more than one row.
+
+    Homework files of these students and lessons get the ID in their name,
+    so two of them never write the same file.
+
+    Returns:
+        tuple[frozenset, frozenset]: Shared student names, shared lesson titles.
+    """
+    shared_names = frozenset(
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT name FROM enrolled_students
+            WHERE replace(name, ' ', '_') IN (
+                SELECT replace(name, ' ', '_') FROM enrolled_students
+                GROUP BY 1 HAVING COUNT(*) > 1
+            )
+            """
+        )
+    )
+    shared_titles = frozenset(
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT title FROM lessons
+            WHERE replace(title, ' ', '_') IN (
+                SELECT replace(title, ' ', '_') FROM lessons
+                GROUP BY 1 HAVING COUNT(*) > 1
+            )
+            """
+        )
+    )
+    return shared_names, shared_titles
+
+
+def homework_path_for(student_info, lesson_info, collisions):
+    """Return a homework's file path, with IDs where the names collide."""
+    shared_names, shared_titles = collisions
+    student, lesson = student_info["student"], lesson_info["lesson"]
+    return homework_file_path(
+        student["name"],
+        lesson["title"],
+        student["id"] if student["name"] in shared_names else None,
+        lesson["id"] if lesson["title"] in shared_titles else None,
+    )
+
+
+def save_homework(homework, student_name, lesson_title, input_hash=None, file_path=None):
+    """
+    Save the homework to a text file in the 'homeworks' folder.
+
+    With input_hash (from homework_input_hash), the save is recorded in the
+    homework manifest, and a homework saved earlier from the same input is
+    not written again. file_path (e.g. from homework_path_for) overrides the
+    path built from the names.
+    """
     # Ensure the 'homeworks' directory exists
-    if not os.path.exists("homeworks"):
-        os.makedirs("homeworks")
+    os.makedirs(HOMEWORK_DIR, exist_ok=True)
 
     # Define the full path for the file
-    file_path = os.path.join("homeworks", safe_filename)
+    file_path = file_path or homework_file_path(student_name, lesson_title)
 
     # Fixed code
     try:
+        manifest = esl_manifest.Manifest(HOMEWORK_DIR) if input_hash else None
+        if manifest and manifest.unchanged(file_path, input_hash):
+            console.print(
+                Panel(
+                    f"Homework unchanged since it was saved to {file_path}",
+                    style="bold green",
+                    box=box.ROUNDED,
+                )
+            )
+            return file_path
         with open(file_path, "w", encoding="utf-8") as file:
             file.write(homework)
+        if manifest:
+            manifest.record(file_path, input_hash, file_path)
+            manifest.save()
         console.print(
             Panel(f"Homework saved to {file_path}", style="bold green", box=box.ROUNDED)
         )
@@ -691,6 +1231,372 @@ def save_homework(homework, student_name, lesson_title):
         return None
 
 
+def _chunks(values, size=BATCH_QUERY_CHUNK):
+    """Yield successive slices of a list, for IN (...) queries."""
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def select_homework_targets(
+    conn,
+    course_id=None,
+    unit_id=None,
+    lesson_id=None,
+    student_ids=None,
+    completed_on=None,
+    recorded_only=False,
+):
+    """
+    Work out which (student, lesson) pairs a batch should produce homework for.
+
+    Students are only paired with lessons from their own course. The scope
+    arguments narrow the lessons; student_ids narrows the students.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        course_id (int, optional): Every lesson of this course.
+        unit_id (int, optional): Every lesson of this unit.
+        lesson_id (int, optional): Just this lesson.
+        student_ids (list[int], optional): Only these students.
+        completed_on (str, optional): Only lessons the student completed on
+            this date (YYYY-MM-DD). Implies recorded_only.
+        recorded_only (bool, optional): Only pairs that have a lesson record.
+
+    Returns:
+        list[tuple[int, int]]: (student_id, lesson_id) pairs, ordered by
+        student name and then by unit and lesson number.
+    """
+    conditions = []
+    params = []
+    if course_id is not None:
+        conditions.append("u.course_id = ?")
+        params.append(course_id)
+    if unit_id is not None:
+        conditions.append("l.unit_id = ?")
+        params.append(unit_id)
+    if lesson_id is not None:
+        conditions.append("l.id = ?")
+        params.append(lesson_id)
+    if student_ids:
+        conditions.append(f"s.id IN ({', '.join('?' for _ in student_ids)})")
+        params.extend(student_ids)
+    if completed_on:
+        conditions.append("date(lr.completion_date) = ?")
+        params.append(completed_on)
+    if completed_on or recorded_only:
+        conditions.append("lr.id IS NOT NULL")
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = conn.execute(
+        f"""
+        SELECT DISTINCT s.id AS student_id, l.id AS lesson_id,
+               s.name, u.unit_number, l.lesson_number
+        FROM enrolled_students s
+        JOIN units u ON u.course_id = s.course_id
+        JOIN lessons l ON l.unit_id = u.id
+        LEFT JOIN lesson_records lr ON lr.student_id = s.id AND lr.lesson_id = l.id
+        {where}
+        ORDER BY s.name, s.id, u.unit_number, l.lesson_number
+        """,
+        params,
+    ).fetchall()
+    return [(row["student_id"], row["lesson_id"]) for row in rows]
+
+
+def load_homework_batch(conn, targets):
+    """
+    Load everything generate_homework needs for many (student, lesson) pairs.
+
+    Uses a handful of IN (...) queries per table instead of the three lookups
+    per pair the interactive flow makes. The returned structures have the
+    same shape as get_student_info, get_lesson_info and
+    get_student_lesson_record.
+
+    Returns:
+        tuple[dict, dict, dict]: student infos by student id, lesson infos by
+        lesson id, and lesson records by (student_id, lesson_id).
+    """
+    student_ids = sorted({student_id for student_id, _ in targets})
+    lesson_ids = sorted({lesson_id for _, lesson_id in targets})
+    wanted = set(targets)
+
+    students = {}
+    for chunk in _chunks(student_ids):
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(
+            f"""
+            SELECT s.id, s.name, s.email, s.course_id,
+                   c.name AS course_name, c.focus AS course_focus
+            FROM enrolled_students s
+            LEFT JOIN courses c ON c.id = s.course_id
+            WHERE s.id IN ({placeholders})
+            """,
+            chunk,
+        ):
+            students[row["id"]] = {
+                "student": {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "email": row["email"],
+                    "course_id": row["course_id"],
+                },
+                "course": (
+                    {
+                        "id": row["course_id"],
+                        "name": row["course_name"],
+                        "focus": row["course_focus"],
+                    }
+                    if row["course_name"] is not None
+                    else None
+                ),
+            }
+
+    lessons = {}
+    for chunk in _chunks(lesson_ids):
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(
+            f"""
+            SELECT l.id, l.title, l.grammar_focus, l.vocabulary_focus, l.context,
+                   u.unit_number, u.title as unit_title,
+                   c.id as course_id, c.name as course_name
+            FROM lessons l
+            JOIN units u ON l.unit_id = u.id
+            JOIN courses c ON u.course_id = c.id
+            WHERE l.id IN ({placeholders})
+            """,
+            chunk,
+        ):
+            lessons[row["id"]] = {
+                "lesson": dict(row),
+                "vocabulary": [],
+                "grammar_rules": [],
+                "blocks": [],
+                "resources": [],
+                "fragments": {},
+            }
+        for key, query in (
+            (
+                "vocabulary",
+                "SELECT lesson_id, word_or_phrase, definition, example_usage FROM vocabulary",
+            ),
+            ("grammar_rules", "SELECT lesson_id, rule, example FROM grammar_rules"),
+            (
+                "blocks",
+                "SELECT lesson_id, id, title, description, activity_type, content FROM blocks",
+            ),
+            (
+                "resources",
+                "SELECT lesson_id, resource_type, description, url_or_path FROM resources",
+            ),
+        ):
+            order = "block_number" if key == "blocks" else "id"
+            for row in conn.execute(
+                f"{query} WHERE lesson_id IN ({placeholders}) ORDER BY lesson_id, {order}",
+                chunk,
+            ):
+                if row["lesson_id"] in lessons:
+                    item = dict(row)
+                    del item["lesson_id"]
+                    lessons[row["lesson_id"]][key].append(item)
+
+    records = {}
+    record_keys = {}
+    for chunk in _chunks(student_ids):
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(
+            f"""
+            SELECT id, student_id, lesson_id, completion_date, score, feedback
+            FROM lesson_records
+            WHERE student_id IN ({placeholders})
+            ORDER BY id
+            """,
+            chunk,
+        ):
+            key = (row["student_id"], row["lesson_id"])
+            if key in wanted and key not in records:
+                records[key] = {
+                    "record": {
+                        "id": row["id"],
+                        "completion_date": row["completion_date"],
+                        "score": row["score"],
+                        "feedback": row["feedback"],
+                    },
+                    "block_records": [],
+                }
+                record_keys[row["id"]] = key
+
+    record_ids = sorted(record_keys)
+    for chunk in _chunks(record_ids):
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(
+            f"""
+            SELECT br.lesson_record_id, br.id, br.student_speech_notes, br.teacher_notes,
+                   br.student_questions, b.title as block_title, b.activity_type
+            FROM block_records br
+            JOIN blocks b ON br.block_id = b.id
+            WHERE br.lesson_record_id IN ({placeholders})
+            ORDER BY br.id
+            """,
+            chunk,
+        ):
+            item = dict(row)
+            del item["lesson_record_id"]
+            records[record_keys[row["lesson_record_id"]]]["block_records"].append(item)
+
+    return students, lessons, records
+
+
+# Lesson infos for the current batch, installed once per worker process
+_batch_lessons = {}
+
+
+def _init_batch_worker(lessons):
+    """ProcessPoolExecutor initializer: keep the batch's lesson infos in the worker."""
+    global _batch_lessons
+    _batch_lessons = lessons
+
+
+def _render_batch_homework(job):
+    """
+    Render and write one homework in a batch.
+
+    Runs in a worker process, so it reports problems in its return value
+    instead of printing.
+
+    Returns:
+        tuple: (student_id, lesson_id, file path or None, error message or None)
+    """
+    student_info, lesson_id, lesson_record, review_items, file_path = job
+    try:
+        homework = generate_homework(
+            student_info, _batch_lessons[lesson_id], lesson_record, review_items
+        )
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write(homework)
+        return student_info["student"]["id"], lesson_id, file_path, None
+    except Exception as e:
+        return student_info["student"]["id"], lesson_id, None, str(e)
+
+
+def generate_homework_batch(conn, targets, workers=None, progress=None, force=False):
+    """
+    Generate and save homework for many (student, lesson) pairs.
+
+    Data is loaded in bulk, then the homeworks are rendered and written in a
+    process pool. Files go to the same place save_homework would put them.
+    A homework whose input hash matches homeworks/manifest.json and whose
+    file still exists is skipped, so re-running a batch only renders what
+    changed.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        targets (list[tuple[int, int]]): (student_id, lesson_id) pairs, e.g.
+            from select_homework_targets.
+        workers (int, optional): Worker processes. Defaults to the CPU count;
+            1 renders in this process.
+        progress (callable, optional): Called as progress(done, total) after
+            each homework is written.
+        force (bool, optional): Regenerate every homework.
+
+    Returns:
+        dict: "saved" (list of file paths), "unchanged" (list of file paths
+        skipped), "failed" (list of (student_id, lesson_id, error)) and
+        "seconds".
+    """
+    started = time.perf_counter()
+    students, lessons, records = load_homework_batch(conn, targets)
+    review = esl_review.due_items_for_students(
+        conn, list(students), item_type="vocabulary", limit=HOMEWORK_REVIEW_LIMIT
+    )
+
+    manifest = esl_manifest.Manifest(HOMEWORK_DIR)
+    collisions = homework_name_collisions(conn)
+    lesson_hashes = {}
+    input_hashes = {}
+    unchanged = []
+    jobs = []
+    failed = []
+    for student_id, lesson_id in targets:
+        student_info = students.get(student_id)
+        lesson_info = lessons.get(lesson_id)
+        if not student_info or not student_info["course"] or not lesson_info:
+            failed.append((student_id, lesson_id, "Student, course or lesson not found"))
+            continue
+        # Workers writing one path at once would lose a homework
+        file_path = homework_path_for(student_info, lesson_info, collisions)
+        if lesson_id not in lesson_hashes:
+            lesson_hashes[lesson_id] = lesson_input_hash(lesson_info)
+        lesson_record = records.get((student_id, lesson_id))
+        review_items = review.get(student_id)
+        input_hash = homework_input_hash(
+            student_info, lesson_info, lesson_record, review_items, lesson_hashes[lesson_id]
+        )
+        if not force and manifest.unchanged(file_path, input_hash):
+            unchanged.append(file_path)
+            continue
+        input_hashes[file_path] = input_hash
+        jobs.append((student_info, lesson_id, lesson_record, review_items, file_path))
+
+    os.makedirs(HOMEWORK_DIR, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    saved = []
+    if progress:
+        # Unchanged homeworks are already done
+        progress(0, len(jobs))
+
+    if workers == 1 or len(jobs) < BATCH_POOL_MIN_JOBS:
+        _init_batch_worker(lessons)
+        results = map(_render_batch_homework, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(lessons,),
+        )
+        chunksize = max(1, len(jobs) // (workers * 8))
+        results = executor.map(_render_batch_homework, jobs, chunksize=chunksize)
+
+    try:
+        for done, (student_id, lesson_id, file_path, error) in enumerate(results, 1):
+            if error:
+                failed.append((student_id, lesson_id, error))
+            else:
+                saved.append(file_path)
+                manifest.record(file_path, input_hashes[file_path], file_path)
+            if progress:
+                progress(done, len(jobs))
+    finally:
+        if executor:
+            executor.shutdown()
+        _init_batch_worker({})
+        manifest.save()
+
+    return {
+        "saved": saved,
+        "unchanged": unchanged,
+        "failed": failed,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def regenerate_all(conn, workers=None, force=False):
+    """
+    Bring every report and every recorded lesson's homework up to date.
+
+    Meant for a scheduled (e.g. nightly) run: thanks to the manifests only
+    the artifacts whose input changed are written.
+
+    Returns:
+        dict: "reports" (export_all_student_records result) and "homework"
+        (generate_homework_batch result).
+    """
+    reports = export_all_student_records(conn, workers=workers, force=force)
+    targets = select_homework_targets(conn, recorded_only=True)
+    homework = generate_homework_batch(conn, targets, workers=workers, force=force)
+    return {"reports": reports, "homework": homework}
+
+
 def display_homework_preview(homework):
     """Display a formatted preview of the homework."""
     # Create a shortened version for preview
@@ -717,7 +1623,9 @@ def display_homework_preview(homework):
     )
 
 
-def display_homework_actions(homework, student_info, lesson_info):
+def display_homework_actions(
+    homework, student_info, lesson_info, input_hash=None, file_path=None
+):
     """Display action menu for homework."""
     actions = [
         ("Save to file", "Save the homework to a markdown file"),
@@ -747,7 +1655,11 @@ def display_homework_actions(homework, student_info, lesson_info):
     if choice == "1":
         # Line 745 - Fixed
         save_homework(
-            homework, student_info["student"]["name"], lesson_info["lesson"]["title"]
+            homework,
+            student_info["student"]["name"],
+            lesson_info["lesson"]["title"],
+            input_hash,
+            file_path,
         )
         return True
     elif choice == "2":
@@ -779,18 +1691,9 @@ def display_homework_actions(homework, student_info, lesson_info):
 
 
 def search_students(conn, search_term):
-    """Search for students by name or email."""
+    """Search for students by name or email using the student search index."""
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT id, name, email, course_id
-            FROM enrolled_students
-            WHERE name LIKE ? OR email LIKE ?
-            """,
-            (f"%{search_term}%", f"%{search_term}%"),
-        )
-        students = cursor.fetchall()
+        students = esl_search.search_students(conn, search_term)
 
         if not students:
             console.print(
@@ -798,7 +1701,7 @@ def search_students(conn, search_term):
             )
             return None
 
-        return [dict(s) for s in students]
+        return students
     except sqlite3.Error as e:
         console.print(
             Panel(f"Error searching students: {e}", style="bold red", box=box.ROUNDED)
@@ -859,20 +1762,9 @@ def display_search_results(students, conn):
 
 
 def search_lessons(conn, search_term):
-    """Search for lessons by title or unit."""
+    """Search lessons by their titles, context, blocks, vocabulary and grammar, best match first."""
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT les.id, les.title, u.unit_number, u.title as unit_title, c.name as course_name
-            FROM lessons les
-            JOIN units u ON les.unit_id = u.id
-            JOIN courses c ON u.course_id = c.id
-            WHERE les.title LIKE ? OR u.title LIKE ?
-            """,
-            (f"%{search_term}%", f"%{search_term}%"),
-        )
-        lessons = cursor.fetchall()
+        lessons = esl_search.search_lessons(conn, search_term)
 
         if not lessons:
             console.print(
@@ -880,7 +1772,7 @@ def search_lessons(conn, search_term):
             )
             return None
 
-        return [dict(lesson) for lesson in lessons]
+        return lessons
     except sqlite3.Error as e:
         console.print(
             Panel(f"Error searching lessons: {e}", style="bold red", box=box.ROUNDED)
@@ -898,6 +1790,7 @@ def display_lesson_search_results(lessons):
     results_table.add_column("Lesson Title", style="white")
     results_table.add_column("Unit", style="white")
     results_table.add_column("Course", style="white")
+    results_table.add_column("Match", style="white", max_width=40)
 
     for lesson in lessons:
         results_table.add_row(
@@ -905,6 +1798,8 @@ def display_lesson_search_results(lessons):
             lesson["title"],
             f"{lesson['unit_number']}: {lesson['unit_title']}",
             lesson["course_name"],
+            f"[cyan]{lesson['matched_in']}:[/cyan] "
+            + esl_search.highlight_markup(lesson["snippet"]),
         )
 
     console.print(
@@ -948,7 +1843,9 @@ def display_main_menu():
         ("Generate Homework", "Create personalized homework for a student"),
         ("Export Student Records", "Export student data to Markdown"),
         ("Search Students", "Find and view student information"),
-        ("Search Lessons", "Find and view lesson information"),
+        ("Search Lessons", "Full-text search of lessons and their content"),
+        ("Batch Homework", "Generate homework for a course, unit, lesson or student list"),
+        ("Export All Records", "Export every student's records, with an index"),
         ("Exit", "Exit the application"),
     ]
 
@@ -965,8 +1862,8 @@ def display_main_menu():
     )
 
 
-def main():
-    conn = connect_to_db()
+def main(db_path=DEFAULT_DB_PATH):
+    conn = connect_to_db(db_path)
     clear_screen()
     display_header()
 
@@ -974,7 +1871,7 @@ def main():
         # Display the main menu
         display_main_menu()
         choice = Prompt.ask(
-            "Choose an option", choices=["1", "2", "3", "4", "5"], default="1"
+            "Choose an option", choices=["1", "2", "3", "4", "5", "6", "7"], default="1"
         )
 
         if choice == "1":
@@ -995,10 +1892,20 @@ def main():
             transition_screen("Lesson Search")
             search_lessons_flow(conn)
         elif choice == "5":
+            # Batch Homework
+            transition_screen("Batch Homework Generation")
+            batch_homework_flow(conn)
+            confirm_and_continue()
+        elif choice == "6":
+            # Export All Records
+            transition_screen("Export All Student Records")
+            export_all_records_flow(conn)
+            confirm_and_continue()
+        elif choice == "7":
             # Exit
             break
 
-    conn.close()
+    get_database(DEFAULT_DB_PATH).close()
     transition_screen("Session Complete")
     console.print(
         Panel(
@@ -1048,7 +1955,9 @@ def generate_homework_flow(conn):
         )
 
         if choice.lower() == "search":
-            search_term = Prompt.ask("Enter lesson title or unit to search")
+            search_term = Prompt.ask(
+                "Enter words to search lessons, activities, vocabulary or grammar"
+            )
             lessons = search_lessons(conn, search_term)
             lesson_id = display_lesson_search_results(lessons)
             if lesson_id:
@@ -1097,23 +2006,189 @@ def generate_homework_flow(conn):
         "[progress.percentage]{task.percentage:>3.0f}%",
         console=console,
     ) as progress:
-        task = progress.add_task("[cyan]Generating personalized homework...", total=100)
-    # Line 1097 - Fixed
-    for _ in range(100):
+        task = progress.add_task("[cyan]Generating personalized homework...", total=1)
+        review_items = esl_review.due_items(
+            conn, student_id, item_type="vocabulary", limit=HOMEWORK_REVIEW_LIMIT
+        )
+        try:
+            homework = generate_homework(
+                student_info, lesson_info, lesson_record, review_items
+            )
+        except esl_templates.TemplateError as e:
+            console.print(
+                Panel(
+                    f"Error in homework template: {e}",
+                    style="bold red",
+                    box=box.ROUNDED,
+                )
+            )
+            return
         progress.update(task, advance=1)
-        time.sleep(0.01)  # Simulate work being done
-
-    homework = generate_homework(student_info, lesson_info, lesson_record)
 
     # Display preview and action menu
     transition_screen("Homework Management")
     display_homework_preview(homework)
 
     # Loop for actions
-    while display_homework_actions(homework, student_info, lesson_info):
+    input_hash = homework_input_hash(student_info, lesson_info, lesson_record, review_items)
+    file_path = homework_path_for(student_info, lesson_info, homework_name_collisions(conn))
+    while display_homework_actions(
+        homework, student_info, lesson_info, input_hash, file_path
+    ):
         display_homework_preview(homework)
 
 
+def batch_homework_flow(conn):
+    """Flow for generating homework for many students at once."""
+    scope = Prompt.ask(
+        "Generate homework for a",
+        choices=["course", "unit", "lesson", "students"],
+        default="lesson",
+        console=console,
+    )
+    criteria = {}
+    if scope == "students":
+        raw_ids = Prompt.ask("Enter student IDs separated by commas", console=console)
+        criteria["student_ids"] = [
+            int(part) for part in raw_ids.replace(" ", "").split(",") if part.isdigit()
+        ]
+        if not criteria["student_ids"]:
+            console.print(Panel("No valid student IDs given", style="yellow", box=box.ROUNDED))
+            return
+    else:
+        scope_id = Prompt.ask(f"Enter the {scope} ID", console=console)
+        if not scope_id.isdigit():
+            console.print(Panel(f"Invalid {scope} ID", style="bold red", box=box.ROUNDED))
+            return
+        criteria[f"{scope}_id"] = int(scope_id)
+
+    completed_on = Prompt.ask(
+        "Only lessons completed on date (YYYY-MM-DD, Enter for any)",
+        default="",
+        console=console,
+    ).strip()
+    if completed_on:
+        criteria["completed_on"] = completed_on
+    else:
+        criteria["recorded_only"] = Confirm.ask(
+            "Only lessons the students have a record for?", default=True, console=console
+        )
+
+    try:
+        targets = select_homework_targets(conn, **criteria)
+    except sqlite3.Error as e:
+        console.print(Panel(f"Error selecting students: {e}", style="bold red", box=box.ROUNDED))
+        return
+
+    if not targets:
+        console.print(Panel("Nothing matches that selection", style="yellow", box=box.ROUNDED))
+        return
+    student_count = len({student_id for student_id, _ in targets})
+    if not Confirm.ask(
+        f"Generate {len(targets)} homeworks for {student_count} students?",
+        default=True,
+        console=console,
+    ):
+        return
+
+    with Progress(
+        "[progress.description]{task.description}",
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+        console=console,
+    ) as progress:
+        task = progress.add_task("[cyan]Generating homework...", total=len(targets))
+        try:
+            result = generate_homework_batch(
+                conn,
+                targets,
+                progress=lambda done, total: progress.update(
+                    task, completed=done, total=total
+                ),
+            )
+        except sqlite3.Error as e:
+            console.print(
+                Panel(f"Error loading homework data: {e}", style="bold red", box=box.ROUNDED)
+            )
+            return
+
+    summary = Table(box=box.ROUNDED, border_style="green", show_header=False)
+    summary.add_column("Field", style="cyan")
+    summary.add_column("Value", style="white")
+    summary.add_row("Saved", str(len(result["saved"])))
+    summary.add_row("Unchanged", str(len(result["unchanged"])))
+    summary.add_row("Failed", str(len(result["failed"])))
+    summary.add_row("Folder", os.path.abspath(HOMEWORK_DIR))
+    summary.add_row("Time", f"{result['seconds']:.2f} s")
+    console.print(
+        Panel(summary, title="Batch Homework", border_style="green", box=box.ROUNDED)
+    )
+    for student_id, lesson_id, error in result["failed"][:10]:
+        console.print(f"[red]Student {student_id}, lesson {lesson_id}: {error}[/red]")
+
+
+def export_all_records_flow(conn):
+    """Flow for exporting every student's records at once."""
+    course_choice = Prompt.ask(
+        "Enter a course ID to limit the export (Enter for all students)",
+        default="",
+        console=console,
+    ).strip()
+    if course_choice and not course_choice.isdigit():
+        console.print(Panel("Invalid course ID", style="bold red", box=box.ROUNDED))
+        return
+    course_id = int(course_choice) if course_choice else None
+
+    database = database_for(conn)
+    db_path = database.db_path if database else DEFAULT_DB_PATH
+
+    def export(task):
+        # The task's thread needs its own connection to the same file
+        return export_all_student_records(
+            get_database(db_path).connection(),
+            course_id=course_id,
+            progress=lambda done, total: task.update(completed=done, total=total),
+            cancelled=lambda: task.cancelled,
+        )
+
+    # Run on a worker thread so Ctrl-C can cancel cleanly between student ranges
+    executor = TaskExecutor(max_workers=1)
+    task = executor.submit("[cyan]Exporting student records...", export)
+    if not follow(task, console):
+        task.cancel()
+        console.print("Cancelling export…", style="yellow")
+        task.wait()
+    executor.shutdown(cancel=False)
+
+    if task.status == CANCELLED:
+        console.print(
+            Panel(
+                "Export cancelled; reports already written were kept.",
+                style="bold yellow",
+                box=box.ROUNDED,
+            )
+        )
+        return
+    if task.status == FAILED:
+        console.print(
+            Panel(f"❌ An error occurred: {task.error}", style="bold red", box=box.ROUNDED)
+        )
+        return
+    result = task.result
+
+    console.print(
+        Panel(
+            f"✅ Exported {len(result['reports'])} reports in {result['seconds']:.2f} s "
+            f"({result['changed']} changed, "
+            f"{len(result['reports']) - result['changed']} unchanged)\n"
+            f"Index: {result['index']}",
+            style="bold green",
+            box=box.ROUNDED,
+        )
+    )
+
+
 def search_students_flow(conn):
     """Flow for searching students."""
     search_term = Prompt.ask("Enter student name or email to search")
@@ -1129,7 +2204,9 @@ def search_students_flow(conn):
 
 def search_lessons_flow(conn):
     """Flow for searching lessons."""
-    search_term = Prompt.ask("Enter lesson title or unit to search")
+    search_term = Prompt.ask(
+        "Enter words to search lessons, activities, vocabulary or grammar"
+    )
     lessons = search_lessons(conn, search_term)
     lesson_id = display_lesson_search_results(lessons)
     if lesson_id:
@@ -1141,4 +2218,32 @@ def search_lessons_flow(conn):
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="ESL Homework Generator")
+    parser.add_argument(
+        "--regenerate",
+        action="store_true",
+        help="Update changed reports and homework without the menu, then exit",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --regenerate, rewrite everything even if unchanged",
+    )
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the SQLite database")
+    args = parser.parse_args()
+    if args.force and not args.regenerate:
+        parser.error("--force only applies to --regenerate")
+
+    if args.regenerate:
+        result = regenerate_all(connect_to_db(args.db), force=args.force)
+        reports, homework = result["reports"], result["homework"]
+        console.print(
+            f"Reports: {reports['changed']} written, "
+            f"{len(reports['reports']) - reports['changed']} unchanged "
+            f"({reports['seconds']:.2f} s)\n"
+            f"Homework: {len(homework['saved'])} written, "
+            f"{len(homework['unchanged'])} unchanged, {len(homework['failed'])} failed "
+            f"({homework['seconds']:.2f} s)"
+        )
+    else:
+        main(args.db)
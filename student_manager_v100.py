@@ -11,6 +11,8 @@ import textwrap
 import re
 import logging
 import time
+from esl_db import get_database
+import esl_analytics
 
 # Configure logging
 logging.basicConfig(filename="student_manager.log", level=logging.ERROR)
@@ -50,6 +52,8 @@ MENU_OPTIONS = {
     "7": "List Available Courses",
     "8": "List Students by Course",
     "9": "Help",
+    "10": "Remove Empty Session Records",
+    "11": "Cohort Analytics",
     "0": "Exit",
 }
 
@@ -69,8 +73,7 @@ class StudentManager:
         """
         self.db_path = db_path
         self.theme = theme  # Store the selected theme
-        self.conn = None
-        self.cursor = None
+        self._database = None  # Set by connect_db; see conn and cursor
         self.console = Console()  # Initialize the Rich console
 
         try:
@@ -95,14 +98,29 @@ class StudentManager:
                 style=COLOR_SCHEMES["error"],
             )
             sys.exit(1)
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor = self.conn.cursor()
+        self._database = get_database(self.db_path)
+        self._database.connection()
+
+    @property
+    def conn(self):
+        """
+        The calling thread's connection, or None when not connected.
+
+        Each thread gets its own connection from esl_db, so the methods below
+        can be called from background tasks as well as from the menu loop.
+        """
+        return self._database.connection() if self._database else None
+
+    @property
+    def cursor(self):
+        """The calling thread's cursor, or None when not connected."""
+        return self._database.cursor() if self._database else None
 
     def close_db(self):
         """Close the database connection."""
-        if self.conn:
-            self.conn.close()
+        if self._database:
+            self._database.close()
+            self._database = None
             console.print("👋 Database connection closed", style=COLOR_SCHEMES["info"])
 
     def validate_email(self, email):
@@ -327,27 +345,29 @@ class StudentManager:
             Union[Panel, str]: A Rich Panel object if progress data is found, otherwise a string message.
         """
         try:
-            # First check if student exists
-            self.cursor.execute(
-                "SELECT name FROM enrolled_students WHERE id = ?", (student_id,)
-            )
-            student = self.cursor.fetchone()
-            if not student:
-                return f"❌ Student with ID {student_id} does not exist"
-
-            # Get student's course information
+            # Student, course and totals in one lookup; the counts are kept
+            # current by triggers (see esl_migrations, migration 6)
             self.cursor.execute(
                 """
-                SELECT c.name as course_name, c.id as course_id
+                SELECT s.name, c.name as course_name,
+                       coalesce(sp.completed_count, 0) as completed_count,
+                       sp.score_sum, sp.score_count,
+                       coalesce(cs.lesson_count, 0) as total_lessons
                 FROM enrolled_students s
                 JOIN courses c ON s.course_id = c.id
+                LEFT JOIN student_progress sp ON sp.student_id = s.id
+                LEFT JOIN course_stats cs ON cs.course_id = s.course_id
                 WHERE s.id = ?
                 """,
                 (student_id,),
             )
-            course = self.cursor.fetchone()
+            student = self.cursor.fetchone()
+            if not student:
+                return f"❌ Student with ID {student_id} does not exist"
+            completed = student["completed_count"]
+            total_lessons = student["total_lessons"]
 
-            # Get completed lessons
+            # Only the 5 most recent lessons are shown
             self.cursor.execute(
                 """
                 SELECT lr.id, l.id as lesson_id, l.title, u.title as unit_title, u.unit_number, lr.completion_date, lr.score, lr.feedback
@@ -356,45 +376,37 @@ class StudentManager:
                 JOIN units u ON l.unit_id = u.id
                 WHERE lr.student_id = ?
                 ORDER BY lr.completion_date DESC
+                LIMIT 5
                 """,
                 (student_id,),
             )
             lessons = self.cursor.fetchall()
 
-            # Get total lessons in student's course
-            self.cursor.execute(
-                """
-                SELECT COUNT(*) as total_lessons
-                FROM lessons l
-                JOIN units u ON l.unit_id = u.id
-                WHERE u.course_id = ?
-                """,
-                (course["course_id"],),
-            )
-            total_lessons = self.cursor.fetchone()["total_lessons"]
-
             # Build Rich report
             report = Panel(
                 Text.from_markup(
                     f"📊 Progress Report for: {student['name']}\n"
-                    f"🎓 Course: {course['course_name']}\n"
-                    f"✅ Completed Lessons: {len(lessons)} of {total_lessons} ({int(len(lessons) / total_lessons * 100 if total_lessons else 0)}%)\n"
+                    f"🎓 Course: {student['course_name']}\n"
+                    f"✅ Completed Lessons: {completed} of {total_lessons} ({int(completed / total_lessons * 100 if total_lessons else 0)}%)\n"
                 ),
                 title="Student Progress",
                 border_style=COLOR_SCHEMES[theme]["success"],  # Use the selected theme
             )
 
             if lessons:
-                # Calculate average score if there are scores available
-                scores = [l["score"] for l in lessons if l["score"] is not None]
-                avg_score = sum(scores) / len(scores) if scores else None
+                # Average over every scored lesson, not just the ones shown
+                avg_score = (
+                    student["score_sum"] / student["score_count"]
+                    if student["score_count"]
+                    else None
+                )
 
                 if avg_score is not None:
                     report = Panel(
                         Text.from_markup(
                             f"📊 Progress Report for: {student['name']}\n"
-                            f"🎓 Course: {course['course_name']}\n"
-                            f"✅ Completed Lessons: {len(lessons)} of {total_lessons} ({int(len(lessons) / total_lessons * 100 if total_lessons else 0)}%)\n"
+                            f"🎓 Course: {student['course_name']}\n"
+                            f"✅ Completed Lessons: {completed} of {total_lessons} ({int(completed / total_lessons * 100 if total_lessons else 0)}%)\n"
                             f"📈 Average Score: {avg_score:.1f}%\n"
                         ),
                         title="Student Progress",
@@ -430,7 +442,7 @@ class StudentManager:
                     "Feedback", style=COLOR_SCHEMES[theme]["secondary"]
                 )
 
-                for l in lessons[:5]:  # Show only the 5 most recent
+                for l in lessons:
                     lesson_table.add_row(
                         str(l["lesson_id"]),  # Add lesson ID
                         str(l["unit_number"]),  # Add unit number
@@ -492,6 +504,177 @@ class StudentManager:
             logging.error(f"Error recording lesson completion: {e}")
             return f"❌ Error: {e}"
 
+    def remove_empty_session_records(self, keep_lesson_record_ids=()):
+        """
+        Delete session records that hold nothing.
+
+        Older versions of the teacher CLI created a lesson record when a lesson
+        was opened and a block record when a block was opened. Block records
+        without notes are removed first, then lesson records with no
+        completion, score, feedback or remaining block records. Empty strings
+        count as missing, as the record forms store them.
+
+        Args:
+            keep_lesson_record_ids (iterable, optional): Lesson records to keep
+                even if empty, e.g. those with note edits still waiting in the
+                teacher CLI's journal.
+        """
+        keep = sorted(set(keep_lesson_record_ids))
+        keep_condition = (
+            f"AND id NOT IN ({', '.join('?' for _ in keep)})" if keep else ""
+        )
+        try:
+            self.cursor.execute(
+                """
+                DELETE FROM block_records
+                WHERE coalesce(student_speech_notes, '') = ''
+                  AND coalesce(teacher_notes, '') = ''
+                  AND coalesce(student_questions, '') = ''
+                """
+            )
+            block_count = self.cursor.rowcount
+            self.cursor.execute(
+                f"""
+                DELETE FROM lesson_records
+                WHERE coalesce(completion_date, '') = ''
+                  AND coalesce(score, '') = ''
+                  AND coalesce(feedback, '') = ''
+                  AND NOT EXISTS (
+                      SELECT 1 FROM block_records br
+                      WHERE br.lesson_record_id = lesson_records.id
+                  )
+                  {keep_condition}
+                """,
+                keep,
+            )
+            lesson_count = self.cursor.rowcount
+            self.conn.commit()
+            return (
+                f"✅ Removed {lesson_count} empty lesson records "
+                f"and {block_count} empty block records."
+            )
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logging.error(f"Error removing empty session records: {e}")
+            return f"❌ Error: {e}"
+
+    def cohort_analytics(self, course_id=None, theme="default"):
+        """
+        Print the cohort analytics dashboard: school summary, courses, declining
+        students and the hardest lessons.
+
+        Args:
+            course_id (int, optional): Only this course. Defaults to the whole school.
+            theme (str, optional): The theme to use for styling. Defaults to "default".
+
+        Returns:
+            Union[dict, str]: The esl_analytics report, or an error message.
+        """
+        try:
+            report = esl_analytics.cohort_report(self.conn, course_id=course_id)
+        except esl_analytics.AnalyticsUnavailable as e:
+            return f"❌ {e}"
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Error computing cohort analytics: {e}")
+            return f"❌ Error: {e}"
+
+        colors = COLOR_SCHEMES[theme]
+        summary = report["summary"]
+        percentiles = summary["percentiles"]
+        self.console.print(
+            Panel(
+                Text.from_markup(
+                    f"👥 Students: {summary['students']}\n"
+                    f"✅ Lessons completed: {summary['lessons_completed']} "
+                    f"of {summary['lesson_records']} recorded\n"
+                    f"📈 Mean score: {summary['mean_score'] if summary['mean_score'] is not None else 'N/A'}"
+                    f" (P10 {percentiles['10']} · median {percentiles['50']} · P90 {percentiles['90']})\n"
+                    f"📉 Declining students: {summary['declining_students']}\n"
+                    f"⏱️ Computed in {summary['load_ms'] + summary['compute_ms']:.1f} ms"
+                ),
+                title="Cohort Analytics"
+                + (f" — Course {course_id}" if course_id else " — Whole School"),
+                border_style=colors["success"],
+            )
+        )
+
+        course_table = Table(title="Courses", border_style=colors["primary"])
+        for column in ("Course", "Students", "Completed", "Mean", "P25", "Median", "P75", "Declining"):
+            course_table.add_column(column, style=colors["secondary"], justify="right")
+        for c in report["courses"]:
+            course_table.add_row(
+                str(c["course_id"]),
+                str(c["students"]),
+                str(c["lessons_completed"]),
+                _score(c["mean_score"]),
+                _score(c["percentiles"]["25"]),
+                _score(c["percentiles"]["50"]),
+                _score(c["percentiles"]["75"]),
+                str(c["declining_students"]),
+            )
+        self.console.print(course_table)
+
+        declining = [s for s in report["students"] if s["declining"]]
+        if declining:
+            student_table = Table(
+                title=f"Declining Students (last {summary['window']} scores vs the {summary['window']} before)",
+                border_style=colors["warning"],
+            )
+            student_table.add_column("ID", style=colors["secondary"], justify="right")
+            student_table.add_column("Name", style=colors["secondary"])
+            student_table.add_column("Course", style=colors["secondary"], justify="right")
+            student_table.add_column("Mean", style=colors["secondary"], justify="right")
+            student_table.add_column("Before", style=colors["secondary"], justify="right")
+            student_table.add_column("Recent", style=colors["secondary"], justify="right")
+            student_table.add_column("Last Activity", style=colors["secondary"])
+            for s in sorted(
+                declining,
+                key=lambda s: s["rolling_average"] - s["previous_rolling_average"],
+            )[:10]:
+                student_table.add_row(
+                    str(s["student_id"]),
+                    s["name"],
+                    str(s["course_id"]),
+                    _score(s["mean_score"]),
+                    _score(s["previous_rolling_average"]),
+                    _score(s["rolling_average"]),
+                    s["last_activity"] or "N/A",
+                )
+            self.console.print(student_table)
+
+        lesson_table = Table(title="Hardest Lessons", border_style=colors["primary"])
+        lesson_table.add_column("Lesson ID", style=colors["secondary"], justify="right")
+        lesson_table.add_column("Lesson", style=colors["secondary"])
+        lesson_table.add_column("Completion", style=colors["secondary"], justify="right")
+        lesson_table.add_column("Mean", style=colors["secondary"], justify="right")
+        lesson_table.add_column("Difficulty", style=colors["secondary"], justify="right")
+        for l in [l for l in report["lessons"] if l["difficulty"] is not None][:10]:
+            lesson_table.add_row(
+                str(l["lesson_id"]),
+                textwrap.shorten(l["title"], width=40),
+                f"{l['completion_rate']:.0%}",
+                _score(l["mean_score"]),
+                f"{l['difficulty']:.2f}",
+            )
+        self.console.print(lesson_table)
+        return report
+
+    def export_cohort_analytics(self, report):
+        """Save a cohort analytics report as JSON in reports/."""
+        try:
+            os.makedirs("reports", exist_ok=True)
+            scope = report["summary"]["course_id"] or "all"
+            path = os.path.join(
+                "reports",
+                f"cohort_analytics_{scope}_{datetime.now().strftime('%Y%m%d')}.json",
+            )
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(esl_analytics.to_json(report))
+            return f"✅ Analytics saved to {path}"
+        except OSError as e:
+            logging.error(f"Error saving cohort analytics: {e}")
+            return f"❌ Error: {e}"
+
     def list_available_courses(self, theme="default"):
         """
         List all available courses in the database.
@@ -505,10 +688,11 @@ class StudentManager:
         try:
             self.cursor.execute(
                 """
-                SELECT c.id, c.name, c.focus, c.duration, 
-                    (SELECT COUNT(*) FROM units WHERE course_id = c.id) as unit_count,
-                    (SELECT COUNT(*) FROM enrolled_students WHERE course_id = c.id) as student_count
+                SELECT c.id, c.name, c.focus, c.duration,
+                    coalesce(cs.unit_count, 0) as unit_count,
+                    coalesce(cs.student_count, 0) as student_count
                 FROM courses c
+                LEFT JOIN course_stats cs ON cs.course_id = c.id
                 ORDER BY c.name
                 """
             )
@@ -698,6 +882,11 @@ def get_score_input(manager, prompt="📊 Score (0-100, optional): "):
         print("❌ Score must be a number between 0 and 100")
 
 
+def _score(value):
+    """Format a score for analytics tables."""
+    return "N/A" if value is None else f"{value:.1f}"
+
+
 def print_help():
     """Display help information."""
     help_text = """
@@ -712,6 +901,10 @@ def print_help():
     7️⃣  List Available Courses: View all available courses.
     8️⃣  List Students by Course: View students enrolled in a specific course.
     9️⃣  Help: Display this help information.
+    🔟  Remove Empty Session Records: Delete lesson and block records with no
+        notes, score, feedback or completion.
+    1️⃣1️⃣ Cohort Analytics: Score distributions, declining students and the
+        hardest lessons, for the school or one course (needs numpy).
     0️⃣  Exit: Exit the application.
     """
     print(help_text)
@@ -892,6 +1085,26 @@ def main():
             # Display help
             print_help()
 
+        elif choice == "10":
+            # Clean up records left by browsing in older versions
+            print("\n🧹 Removing empty session records...")
+            print(manager.remove_empty_session_records())
+            input("\nPress Enter to continue...")
+
+        elif choice == "11":
+            # Cohort analytics for the whole school or one course
+            print(manager.list_available_courses())
+            course_input = get_input(
+                "🔢 Course ID (optional, Enter for the whole school): ", required=False
+            )
+            course_id = int(course_input) if course_input and course_input.isdigit() else None
+            report = manager.cohort_analytics(course_id)
+            if isinstance(report, str):
+                print(f"\n{report}")
+            elif get_input("💾 Save as JSON? (y/n): ", required=False).lower() == "y":
+                print(manager.export_cohort_analytics(report))
+            input("\nPress Enter to continue...")
+
         elif choice == "0":
             # Exit
             manager.close_db()
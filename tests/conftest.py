@@ -0,0 +1,17 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture
+def sample_db(tmp_path, monkeypatch):
+    """Path of a fresh copy of the sample esl.db, with the working directory set to tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    db_path = str(tmp_path / "esl.db")
+    shutil.copy(os.path.join(REPO_DIR, "esl.db"), db_path)
+    return db_path
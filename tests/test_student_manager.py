@@ -0,0 +1,59 @@
+from student_manager_v100 import StudentManager
+
+
+def _new_lesson_record(conn, score, completion_date, feedback=""):
+    """Insert a lesson record for a (student, lesson) pair that has none yet."""
+    student_id, lesson_id = conn.execute(
+        """
+        SELECT s.id, l.id FROM enrolled_students s, lessons l
+        WHERE NOT EXISTS (
+            SELECT 1 FROM lesson_records lr
+            WHERE lr.student_id = s.id AND lr.lesson_id = l.id
+        )
+        LIMIT 1
+        """
+    ).fetchone()
+    with conn:
+        return conn.execute(
+            """
+            INSERT INTO lesson_records (student_id, lesson_id, score, completion_date, feedback)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING id
+            """,
+            (student_id, lesson_id, score, completion_date, feedback),
+        ).fetchone()[0]
+
+
+def _exists(conn, lesson_record_id):
+    return conn.execute(
+        "SELECT 1 FROM lesson_records WHERE id = ?", (lesson_record_id,)
+    ).fetchone() is not None
+
+
+def test_remove_empty_session_records_treats_empty_strings_as_missing(sample_db):
+    manager = StudentManager(db_path=sample_db)
+    conn = manager.conn
+    empty_strings = _new_lesson_record(conn, "", "")
+    nulls = _new_lesson_record(conn, None, None)
+    scored = _new_lesson_record(conn, 80, "")
+    completed = _new_lesson_record(conn, "", "2024-05-01")
+
+    result = manager.remove_empty_session_records()
+
+    assert result.startswith("✅")
+    assert not _exists(conn, empty_strings)
+    assert not _exists(conn, nulls)
+    assert _exists(conn, scored)
+    assert _exists(conn, completed)
+
+
+def test_remove_empty_session_records_keeps_requested_records(sample_db):
+    manager = StudentManager(db_path=sample_db)
+    conn = manager.conn
+    pending = _new_lesson_record(conn, "", "")
+    other = _new_lesson_record(conn, "", "")
+
+    manager.remove_empty_session_records(keep_lesson_record_ids=[pending])
+
+    assert _exists(conn, pending)
+    assert not _exists(conn, other)